@@ -95,6 +95,12 @@ def parse_arguments():
     typecheck_parser.add_argument('input', help='The zkay source file', metavar='<zkay_file>').completer = FilesCompleter(zkay_files)
     typecheck_parser.add_argument('--solc-version', help=solc_version_help, metavar='<cfg_val>')
 
+    # 'stats' parser
+    msg = 'Statically estimate constraint counts, key sizes and proving times of all circuits (without compiling them).'
+    stats_parser = subparsers.add_parser('stats', parents=[config_parser], help=msg, formatter_class=ShowSuppressedInHelpFormatter)
+    stats_parser.add_argument('input', help='The zkay source file', metavar='<zkay_file>').completer = FilesCompleter(zkay_files)
+    stats_parser.add_argument('--solc-version', help=solc_version_help, metavar='<cfg_val>')
+
     # 'solify' parser
     msg = 'Output solidity code which corresponds to zkay code with all privacy features and comments removed, ' \
           'useful in conjunction with analysis tools which operate on solidity code.)'
@@ -138,6 +144,23 @@ def parse_arguments():
                                           formatter_class=ShowSuppressedInHelpFormatter)
     connect_parser.add_argument('address', help='Blockchain address of deployed contract', metavar='<address>')
 
+    # 'serve' parser
+    serve_parser = subparsers.add_parser('serve', parents=[config_parser],
+                                         help='Serve compiled zkay contracts via a local JSON-RPC interface.',
+                                         formatter_class=ShowSuppressedInHelpFormatter)
+    msg = 'Directories with the compilation output of the contracts which should be served.'
+    serve_parser.add_argument('input', nargs='+', help=msg, metavar='<zkay_compilation_output_dir>').completer = DirectoriesCompleter()
+    serve_parser.add_argument('--host', default='localhost', help='Interface to listen on. Default: localhost', metavar='<host>')
+    serve_parser.add_argument('--port', type=int, default=8550, help='Port to listen on. Default: 8550', metavar='<port>')
+    msg = 'Maximum number of requests which are processed concurrently. Default: 8'
+    serve_parser.add_argument('--max-concurrent-requests', type=int, default=8, help=msg, metavar='<count>')
+    msg = 'Access token which clients must send in an "Authorization: Bearer <token>" header. ' \
+          'Default: random token, which is printed on startup'
+    serve_parser.add_argument('--token', help=msg, metavar='<token>')
+    msg = 'Only allow transactions on behalf of this account (can be specified multiple times). Default: all accounts'
+    serve_parser.add_argument('--user', action='append', dest='users', help=msg, metavar='<address>')
+    serve_parser.add_argument('--log', action='store_true', help='enable logging')
+
     # Common deploy libs parameters
     deploy_libs_parser = argparse.ArgumentParser(add_help=False)
     msg = 'Address of the account to use for deploying the library contracts. ' \
@@ -236,6 +259,33 @@ def main():
             except Exception as e:
                 with fail_print():
                     print(f"ERROR: Deployment failed\n{e}")
+    elif a.cmd == 'serve':
+        from zkay.transaction.server import ZkayServer
+
+        # Enable logging
+        if a.log:
+            log_file = my_logging.get_log_file(filename='transactions_server', include_timestamp=True, label=None)
+            my_logging.prepare_logger(log_file)
+
+        for contract_dir in a.input:
+            if not Path(contract_dir).is_dir():
+                with fail_print():
+                    print(f'Error: \'{contract_dir}\' is not a directory')
+                exit(1)
+        try:
+            server = ZkayServer([str(Path(d).absolute()) for d in a.input], a.max_concurrent_requests,
+                                token=a.token, users=a.users)
+            server.warm_up()
+        except Exception as e:
+            with fail_print():
+                print(f'ERROR: failed to load contracts\n{e}')
+            exit(14)
+        if a.token is None:
+            print(f'Access token: {server.token}')
+        try:
+            server.serve_forever(a.host, a.port)
+        except KeyboardInterrupt:
+            pass
     else:
         # Solc version override
         if hasattr(a, 'solc_version') and a.solc_version is not None:
@@ -264,6 +314,23 @@ def main():
                 with fail_print():
                     print(f'{e}')
                 exit(3)
+        elif a.cmd == 'stats':
+            print(f'Estimating circuit costs for file {input_path.name}:')
+
+            code = read_file(str(input_path))
+            try:
+                costs = frontend.estimate_circuit_costs(code)
+            except ZkayCompilerError as e:
+                with fail_print():
+                    print(f'{e}')
+                exit(3)
+
+            header = ['Circuit', 'Constraints', 'Public inputs', 'Proving key', 'Verification key', 'Proving time']
+            rows = [[name, f'{c.constraints:,}', str(c.public_inputs), f'{c.proving_key_size / (1024 * 1024):.1f} MiB',
+                     f'{c.verification_key_size / 1024:.1f} KiB', f'{c.proving_time:.1f} s'] for name, c in costs.items()]
+            widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+            for row in [header] + rows:
+                print('  '.join(val.ljust(w) if i == 0 else val.rjust(w) for i, (val, w) in enumerate(zip(row, widths))))
         elif a.cmd == 'solify':
             was_unit_test = cfg.is_unit_test
             cfg._is_unit_test = True  # Suppress other output
@@ -4,9 +4,11 @@ This package deals with zkay compilation.
 ==========
 Submodules
 ==========
+* :py:mod:`.deployment_artifacts`: Precompiled contract bytecode/abi bundle used for deployment and integrity checks.
 * :py:mod:`.library_contracts`: Stores strings which contain pki and library contract solidity code
 * :py:mod:`.manifest` Defines the entries of the zkay manifest file which stores compilation metadata.
 * :py:mod:`.offchain_compiler` Offchain simulation code generator.
+* :py:mod:`.stage_cache`: Content-addressed on-disk cache for intermediate compilation results.
 
 ===========
 Subpackages
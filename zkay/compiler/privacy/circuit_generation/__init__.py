@@ -6,6 +6,10 @@ Submodules
 ==========
 * :py:mod:`.circuit_helper`:     Helper class to construct high-level abstract proof circuits
 * :py:mod:`.circuit_constraints` Defines the different types of abstract circuit statements
+* :py:mod:`.circuit_optimizer`   Constraint-level optimizations on abstract proof circuits (constant folding, cse, dead code elimination)
+* :py:mod:`.circuit_cost`        Static estimation of constraint counts, key sizes and proving times of abstract proof circuits
+* :py:mod:`.circuit_fingerprint` Computes backend independent fingerprints of abstract proof circuits to detect unchanged circuits
+* :py:mod:`.key_store`           Global content-addressed store for generated prover and verification keys
 * :py:mod:`.circuit_generator`   Compiles abstract proof circuits generated by circuit_helper into concrete proof circuits and generates verification contracts
 
 ===========
@@ -1,19 +1,21 @@
 """Circuit Generator implementation for the jsnark backend"""
 
 import os
-from typing import List, Optional, Union, Tuple
+from typing import List, Optional, Union, Tuple, Dict
 
 import zkay.jsnark_interface.jsnark_interface as jsnark
 import zkay.jsnark_interface.libsnark_interface as libsnark
 from zkay.compiler.privacy.circuit_generation.circuit_constraints import CircComment, CircIndentBlock, \
     CircGuardModification, CircCall, CircSymmEncConstraint
-from zkay.compiler.privacy.circuit_generation.circuit_generator import CircuitGenerator
+from zkay.compiler.privacy.circuit_generation.circuit_fingerprint import get_function_fingerprint
+from zkay.compiler.privacy.circuit_generation.circuit_generator import CircuitGenerator, CircuitJob
 from zkay.compiler.privacy.circuit_generation.circuit_helper import CircuitHelper, CircuitStatement, \
     CircVarDecl, CircEqConstraint, CircEncConstraint, HybridArgumentIdf
+from zkay.compiler.privacy.circuit_generation.name_factory import group_by_io_offset, packed_uint_bitwidth
 from zkay.compiler.privacy.proving_scheme.backends.gm17 import ProvingSchemeGm17
 from zkay.compiler.privacy.proving_scheme.backends.groth16 import ProvingSchemeGroth16
 from zkay.compiler.privacy.proving_scheme.proving_scheme import VerifyingKey, G2Point, G1Point, ProvingScheme
-from zkay.config import cfg, zk_print
+from zkay.config import cfg
 from zkay.utils.helpers import hash_file, hash_string
 from zkay.zkay_ast.ast import FunctionCallExpr, BuiltinFunction, IdentifierExpr, BooleanLiteralExpr, \
     IndexExpr, NumberLiteralExpr, MemberAccessExpr, TypeName, indent, PrimitiveCastExpr, EnumDefinition, Expression
@@ -153,23 +155,103 @@ def add_function_circuit_arguments(circuit: CircuitHelper):
     for sec_input in circuit.sec_idfs:
         input_init_stmts.append(f'addS("{sec_input.name}", {sec_input.t.size_in_uints}, {_get_t(sec_input.t)});')
 
-    for pub_input in circuit.input_idfs:
-        if pub_input.t == TypeName.key_type():
+    for offset, pub_inputs in group_by_io_offset(circuit.input_idfs):
+        pub_input = pub_inputs[0]
+        if pub_input.packed_bit_offset is not None:
+            input_init_stmts += _add_packed_io('addIn', f'{cfg.zk_in_name}{offset}_packed', pub_inputs)
+        elif pub_input.t == TypeName.key_type():
             input_init_stmts.append(f'addK("{pub_input.name}", {pub_input.t.size_in_uints});')
         else:
             input_init_stmts.append(f'addIn("{pub_input.name}", {pub_input.t.size_in_uints}, {_get_t(pub_input.t)});')
 
-    for pub_output in circuit.output_idfs:
-        input_init_stmts.append(f'addOut("{pub_output.name}", {pub_output.t.size_in_uints}, {_get_t(pub_output.t)});')
+    for offset, pub_outputs in group_by_io_offset(circuit.output_idfs):
+        pub_output = pub_outputs[0]
+        if pub_output.packed_bit_offset is not None:
+            input_init_stmts += _add_packed_io('addOut', f'{cfg.zk_out_name}{offset}_packed', pub_outputs)
+        else:
+            input_init_stmts.append(f'addOut("{pub_output.name}", {pub_output.t.size_in_uints}, {_get_t(pub_output.t)});')
 
     return input_init_stmts
 
 
+def _add_packed_io(add_fct: str, packed_name: str, idfs: List[HybridArgumentIdf]) -> List[str]:
+    """Generate java code which adds a packed public circuit argument and extracts the values of idfs from its bits."""
+    stmts = [f'{add_fct}("{packed_name}", 1, ZkUint({packed_uint_bitwidth}));']
+    for idf in idfs:
+        wire = f'get("{packed_name}")'
+        if idf.packed_bit_offset > 0:
+            wire = f'o_({wire}, ">>", {idf.packed_bit_offset})'
+        if idf.t.elem_bitwidth == 1:
+            wire = f'o_(o_(cast({wire}, ZkUint(8)), \'&\', val(1, ZkUint(8))), "==", val(1, ZkUint(8)))'
+        else:
+            wire = f'cast({wire}, {_get_t(idf.t)})'
+        stmts.append(f'decl("{idf.name}", {wire});')
+    return stmts
+
+
 class JsnarkGenerator(CircuitGenerator):
+    keygen_base_memory = 256 * 1024 * 1024
+    """Estimated memory usage of libsnark key generation, which does not depend on the circuit size (in bytes)"""
+
+    keygen_memory_per_wire = 2 * 1024
+    """Estimated memory usage of libsnark key generation per circuit wire (in bytes)"""
+
     def __init__(self, circuits: List[CircuitHelper], proving_scheme: ProvingScheme, output_dir: str):
-        super().__init__(circuits, proving_scheme, output_dir, False)
+        super().__init__(circuits, proving_scheme, output_dir, True)
+        self._function_fingerprints: Dict[CircuitHelper, str] = {}
+
+    def _get_circuit_fingerprint(self, circuit: CircuitHelper) -> str:
+        """
+        Return a fingerprint which covers everything the generated java code of circuit depends on.
+
+        The fingerprints of all (transitively) called functions are computed only once per generator.
+        """
+        parts = [cfg.zkay_version, jsnark.circuit_builder_jar_hash, jsnark.circuit_template_hash, cfg.proving_scheme,
+                 cfg.jsnark_circuit_classname, cfg.crypto_backend, str(cfg.key_bits), circuit.get_verification_contract_name(),
+                 str(circuit.in_size_trans), str(circuit.out_size_trans), str(circuit.priv_in_size_trans),
+                 str(cfg.should_use_hash(circuit)), str(cfg.opt_pack_circuit_io)]
+        for fct in list(circuit.transitively_called_functions.keys()) + [circuit.fct]:
+            target_circuit = self.circuits[fct]
+            if target_circuit not in self._function_fingerprints:
+                self._function_fingerprints[target_circuit] = get_function_fingerprint(target_circuit)
+            parts += [fct.name, self._function_fingerprints[target_circuit]]
+        return hash_string('\n'.join(parts).encode('utf-8')).hex()
 
-    def _generate_zkcircuit(self, import_keys: bool, circuit: CircuitHelper) -> bool:
+    def _is_circuit_unchanged(self, circuit: CircuitHelper) -> bool:
+        # Skips java code generation, java compilation and jsnark circuit compilation if the fingerprint did not change
+        output_dir = self._get_circuit_output_dir(circuit)
+        fingerprint_file = os.path.join(output_dir, f'{cfg.jsnark_circuit_classname}.fingerprint')
+        if not os.path.exists(fingerprint_file) or not os.path.exists(os.path.join(output_dir, 'circuit.arith')):
+            return False
+        with open(fingerprint_file) as f:
+            return f.read() == self._get_circuit_fingerprint(circuit)
+
+    def _generate_zkcircuits(self, import_keys: bool, circuits: List[CircuitHelper]) -> List[bool]:
+        modified = super()._generate_zkcircuits(import_keys, circuits)
+        for circuit in circuits:
+            fingerprint_file = os.path.join(self._get_circuit_output_dir(circuit), f'{cfg.jsnark_circuit_classname}.fingerprint')
+            with open(fingerprint_file, 'w') as f:
+                f.write(self._get_circuit_fingerprint(circuit))
+        return modified
+
+    def _compile_circuits(self, jobs: List[CircuitJob]):
+        # Compile all circuits in a single batch (avoids starting separate javac and java processes for every circuit)
+        max_jvms = 1 if cfg.is_unit_test else self.p_count
+        jsnark.compile_circuits([(job.output_dir, job.code) for job in jobs], max_jvms)
+        for job in jobs:
+            self._write_circuit_digest(job)
+
+    @staticmethod
+    def _compile_circuit(job: CircuitJob):
+        jsnark.compile_circuit(job.output_dir, job.code)
+        JsnarkGenerator._write_circuit_digest(job)
+
+    @staticmethod
+    def _write_circuit_digest(job: CircuitJob):
+        with open(os.path.join(job.output_dir, f'{cfg.jsnark_circuit_classname}.hash'), 'w') as f:
+            f.write(job.digest)
+
+    def _get_circuit_job(self, import_keys: bool, circuit: CircuitHelper) -> Optional[CircuitJob]:
         # Create output directory
         output_dir = self._get_circuit_output_dir(circuit)
         if not os.path.exists(output_dir):
@@ -206,19 +288,28 @@ class JsnarkGenerator(CircuitGenerator):
             oldhash = ''
 
         # Invoke jsnark compilation if either the jsnark-wrapper or the current circuit was modified (based on hash comparison)
-        if oldhash != digest or not os.path.exists(os.path.join(output_dir, 'circuit.arith')):
-            if not import_keys:
-                # Remove old keys
-                for f in self._get_vk_and_pk_paths(circuit):
-                    if os.path.exists(f):
-                        os.remove(f)
-            jsnark.compile_circuit(output_dir, code)
-            with open(hashfile, 'w') as f:
-                f.write(digest)
-            return True
-        else:
-            zk_print(f'Circuit \'{circuit.get_verification_contract_name()}\' not modified, skipping compilation')
-            return False
+        if oldhash == digest and os.path.exists(os.path.join(output_dir, 'circuit.arith')):
+            return None
+
+        if not import_keys:
+            # Remove old keys
+            for f in self._get_vk_and_pk_paths(circuit):
+                if os.path.exists(f):
+                    os.remove(f)
+        for f in [hashfile, os.path.join(output_dir, f'{cfg.jsnark_circuit_classname}.fingerprint')]:
+            if os.path.exists(f):
+                os.remove(f)
+        return CircuitJob(output_dir, code, digest)
+
+    def _get_circuit_digest(self, circuit: CircuitHelper) -> Optional[str]:
+        # Keys only depend on the arithmetic circuit
+        return hash_file(os.path.join(self._get_circuit_output_dir(circuit), 'circuit.arith')).hex()
+
+    def _estimate_keygen_memory(self, circuit: CircuitHelper) -> int:
+        wire_count = jsnark.get_circuit_wire_count(self._get_circuit_output_dir(circuit))
+        if wire_count is None:
+            return super()._estimate_keygen_memory(circuit)
+        return self.keygen_base_memory + wire_count * self.keygen_memory_per_wire
 
     def _generate_keys(self, circuit: CircuitHelper):
         # Invoke the custom libsnark interface to generate keys
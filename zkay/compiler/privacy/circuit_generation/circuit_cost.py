@@ -0,0 +1,212 @@
+"""
+This module statically estimates the cost of abstract proof circuits.
+
+The estimate is computed from the circuit statements (CircuitHelper.phi) without generating or compiling any backend code.
+The number of constraints of every operation is modelled after the corresponding jsnark gadgets (e.g. operations on
+types with less than 256 bits require a bit decomposition of the result to truncate it, comparisons require a bit
+decomposition of the difference). Encryption gadget costs depend on cfg.crypto_backend, and public input hashing
+(see cfg.should_use_hash) adds the cost of the sha256 gadget.
+
+Key sizes and proving time are derived from the constraint count using per-proving scheme factors.
+All values are approximations, which are intended for comparing circuits and for capacity planning.
+"""
+
+import math
+from typing import Dict, NamedTuple
+
+from zkay.compiler.privacy.circuit_generation.circuit_constraints import CircuitStatement, CircComment, CircIndentBlock, \
+    CircCall, CircVarDecl, CircEqConstraint, CircEncConstraint, CircSymmEncConstraint, CircGuardModification
+from zkay.compiler.privacy.circuit_generation.circuit_helper import CircuitHelper
+from zkay.compiler.privacy.circuit_generation.name_factory import group_by_io_offset, packed_uint_bitwidth
+from zkay.config import cfg
+from zkay.zkay_ast.ast import Expression, FunctionCallExpr, BuiltinFunction, PrimitiveCastExpr, TypeName, \
+    ConstructorOrFunctionDefinition
+
+# Bitwidth of the field elements of the bn128 curve which is used by all proving schemes
+field_bits = 254
+
+enc_constraint_costs = {
+    'dummy': 2,
+    'rsa-pkcs1.5': 100000,
+    'rsa-oaep': 165000,
+    'ecdh-aes': 30000,
+    'ecdh-chaskey': 9000,
+}
+"""Estimated number of constraints of a single encryption or decryption check (by crypto backend)"""
+
+key_derivation_cost = 3000
+"""Estimated number of constraints to derive a shared key with ecdh (for symmetric crypto backends)"""
+
+sha256_block_cost = 25600
+"""Estimated number of constraints of one sha256 compression function evaluation"""
+
+proving_key_bytes_per_constraint = {
+    'groth16': 320,
+    'gm17': 448,
+}
+"""Estimated proving key size per constraint (in bytes)"""
+
+proving_time_per_constraint = {
+    'groth16': 12e-6,
+    'gm17': 20e-6,
+}
+"""Estimated single-threaded proving time per constraint (in seconds)"""
+
+proving_base_time = 1.0
+"""Estimated proving time which does not depend on the circuit size (in seconds)"""
+
+# Uncompressed sizes of bn128 group elements in bytes
+_g1_size, _g2_size = 64, 128
+
+
+class CircuitCost(NamedTuple):
+    """Estimated cost of a circuit."""
+
+    constraints: int
+    """Number of constraints"""
+
+    public_inputs: int
+    """Number of public inputs of the verifier"""
+
+    proving_key_size: int
+    """Size of the proving key (in bytes)"""
+
+    verification_key_size: int
+    """Size of the verification key (in bytes)"""
+
+    proving_time: float
+    """Time required to generate a proof (in seconds)"""
+
+
+def estimate_circuit_cost(circuit: CircuitHelper, circuits: Dict[ConstructorOrFunctionDefinition, CircuitHelper]) -> CircuitCost:
+    """
+    Estimate the cost of the circuit which proves the function of circuit.
+
+    :param circuit: the circuit to estimate
+    :param circuits: circuit helpers of all functions (the statements of called functions are part of the circuit)
+    :return: the estimated cost
+    """
+    constraints = _CostEstimator(circuits).get_function_cost(circuit)
+
+    pub_arg_size = circuit.in_size_trans + circuit.out_size_trans
+    if cfg.should_use_hash(circuit):
+        # All public arguments are hashed inside the circuit, the verifier only receives the digest
+        blocks = int(math.ceil((pub_arg_size * 256 + 65) / 512))
+        constraints += blocks * sha256_block_cost
+        public_inputs = 1
+    else:
+        public_inputs = pub_arg_size
+
+    if cfg.proving_scheme == 'groth16':
+        vk_size = _g1_size + 3 * _g2_size + (public_inputs + 1) * _g1_size
+    else:
+        vk_size = 2 * _g1_size + 3 * _g2_size + (public_inputs + 1) * _g1_size
+    pk_size = constraints * proving_key_bytes_per_constraint[cfg.proving_scheme]
+    proving_time = proving_base_time + constraints * proving_time_per_constraint[cfg.proving_scheme]
+    return CircuitCost(constraints, public_inputs, pk_size, vk_size, proving_time)
+
+
+class _CostEstimator:
+    def __init__(self, circuits: Dict[ConstructorOrFunctionDefinition, CircuitHelper]):
+        self.circuits = circuits
+        self.function_costs: Dict[CircuitHelper, int] = {}
+
+    def get_function_cost(self, circuit: CircuitHelper) -> int:
+        """Return the number of constraints of the statements and arguments of a single function (including called functions)."""
+        if circuit not in self.function_costs:
+            cost = 0
+            for idf in circuit.sec_idfs:
+                # Typed arguments are range checked
+                cost += _range_check_cost(idf.t)
+            for _, idfs in group_by_io_offset(circuit.input_idfs) + group_by_io_offset(circuit.output_idfs):
+                if idfs[0].packed_bit_offset is not None:
+                    # Packed arguments are unpacked using a single bit decomposition
+                    cost += packed_uint_bitwidth
+                else:
+                    cost += _range_check_cost(idfs[0].t)
+            cost += sum(self.get_stmt_cost(stmt) for stmt in circuit.phi)
+            self.function_costs[circuit] = cost
+        return self.function_costs[circuit]
+
+    def get_stmt_cost(self, stmt: CircuitStatement) -> int:
+        if isinstance(stmt, CircIndentBlock):
+            return sum(self.get_stmt_cost(s) for s in stmt.statements)
+        elif isinstance(stmt, CircCall):
+            return self.get_function_cost(self.circuits[stmt.fct])
+        elif isinstance(stmt, CircVarDecl):
+            return self.get_expr_cost(stmt.expr)
+        elif isinstance(stmt, CircEqConstraint):
+            # One constraint per field element + one to combine with the guard condition
+            return stmt.tgt.t.size_in_uints + 1
+        elif isinstance(stmt, CircEncConstraint):
+            return enc_constraint_costs[cfg.crypto_backend]
+        elif isinstance(stmt, CircSymmEncConstraint):
+            return key_derivation_cost + enc_constraint_costs[cfg.crypto_backend]
+        elif isinstance(stmt, CircGuardModification):
+            return 0 if stmt.new_cond is None else 1
+        else:
+            assert isinstance(stmt, CircComment)
+            return 0
+
+    def get_expr_cost(self, expr: Expression) -> int:
+        cost = sum(self.get_expr_cost(child) for child in expr.children() if isinstance(child, Expression))
+        if isinstance(expr, FunctionCallExpr) and isinstance(expr.func, BuiltinFunction):
+            cost += _op_cost(expr.func, _get_operand_type(expr))
+        elif isinstance(expr, PrimitiveCastExpr):
+            from_t = expr.expr.annotated_type.type_name
+            if expr.elem_type.is_boolean:
+                cost += 2
+            elif _bits(expr.elem_type) < _bits(from_t):
+                # Truncation requires a bit decomposition of the source value
+                cost += _bits(from_t)
+        return cost
+
+
+def _get_operand_type(expr: FunctionCallExpr) -> TypeName:
+    """Return the type in which the operation expr is performed (the first non-literal argument type, or the result type)."""
+    for arg in expr.args[1:] if expr.func.is_ite() else expr.args:
+        if arg.annotated_type is not None and not arg.annotated_type.type_name.is_literal:
+            return arg.annotated_type.type_name
+    return expr.annotated_type.type_name
+
+
+def _bits(t: TypeName) -> int:
+    """Return the number of bits which need to be decomposed to represent a value of type t."""
+    if t is None or not t.is_primitive_type() or t.is_literal:
+        return field_bits
+    return min(t.elem_bitwidth, field_bits)
+
+
+def _range_check_cost(t: TypeName) -> int:
+    if t.is_primitive_type() and not t.is_literal and t.elem_bitwidth < 256:
+        return t.elem_bitwidth
+    return 0
+
+
+def _op_cost(func: BuiltinFunction, t: TypeName) -> int:
+    """Return the number of constraints of the builtin operation func with operand type t."""
+    n = _bits(t)
+    is_field = n == field_bits
+    if func.is_parenthesis() or func.op == 'sign+':
+        return 0
+    elif func.is_ite() or func.is_bop():
+        return 1
+    elif func.is_eq():
+        return 2
+    elif func.is_comp():
+        # Comparison of field elements requires a full bit decomposition of both operands
+        return 2 * n + 2 if is_field else n + 2
+    elif func.op in ['+', '-', 'sign-']:
+        return 0 if is_field else n + 1
+    elif func.op == '*':
+        return 1 if is_field else 2 * n + 1
+    elif func.op in ['/', '%']:
+        return 4 * n + 2
+    elif func.op in ['~', '<<', '>>']:
+        # Bit decomposition of the operand
+        return n
+    elif func.is_bitop():
+        # Bit decomposition of both operands
+        return 2 * n
+    else:
+        raise NotImplementedError(f'No cost model for operation {func.op}')
@@ -0,0 +1,82 @@
+"""
+This module computes fingerprints of abstract proof circuits.
+
+A fingerprint is a digest of a canonical representation of the circuit statements of a function (CircuitHelper.phi)
+and of its circuit inputs and outputs. It is independent of any backend, so circuit generators can use it to detect
+unchanged circuits without generating backend specific code first.
+"""
+
+import hashlib
+from typing import List, Any
+
+from zkay.compiler.privacy.circuit_generation.circuit_constraints import CircuitStatement
+from zkay.compiler.privacy.circuit_generation.circuit_helper import CircuitHelper
+from zkay.zkay_ast.ast import AST, TypeName, Expression, HybridArgumentIdf, ConstructorOrFunctionDefinition
+from zkay.zkay_ast.visitor.visitor import AstVisitor
+
+
+def get_function_fingerprint(circuit: CircuitHelper) -> str:
+    """
+    Return the fingerprint of the circuit statements, inputs and outputs of circuit.
+
+    Called functions only contribute their name, the caller is responsible for including the fingerprints of all
+    transitively called functions if needed.
+    """
+    v = _FingerprintVisitor()
+    for idfs in [circuit.sec_idfs, circuit.input_idfs, circuit.output_idfs]:
+        v.visit_value(idfs)
+    v.visit_value(circuit.phi)
+    return hashlib.sha256('\x1f'.join(v.tokens).encode()).hexdigest()
+
+
+class _FingerprintVisitor(AstVisitor):
+    """Visitor which collects a canonical token sequence for circuit statements and expressions."""
+
+    # Attributes which fully describe leaf nodes (e.g. literal values, operators, identifier names)
+    _leaf_attributes = ['name', 'value', 'op']
+
+    def __init__(self):
+        super().__init__('node-or-children', False)
+        self.tokens: List[str] = []
+
+    def visit_value(self, val: Any):
+        if isinstance(val, (list, tuple)):
+            self.tokens.append(f'[{len(val)}')
+            for elem in val:
+                self.visit_value(elem)
+        elif isinstance(val, ConstructorOrFunctionDefinition):
+            self.tokens.append(f'fct:{val.name}')
+        elif isinstance(val, (AST, CircuitStatement)):
+            self.visit(val)
+        else:
+            self.tokens.append(repr(val))
+
+    def visitCircuitStatement(self, stmt: CircuitStatement):
+        self.tokens.append(type(stmt).__name__)
+        for name, val in sorted(vars(stmt).items()):
+            self.tokens.append(name)
+            self.visit_value(val)
+        self.tokens.append(')')
+        return True
+
+    def visitHybridArgumentIdf(self, ast: HybridArgumentIdf):
+        # The io layout is not part of the children, but determines how circuit arguments are (un)packed
+        self.tokens.append(f'{ast.name}:{ast.t.code()}@{ast.io_offset}:{ast.packed_bit_offset}')
+        return True
+
+    def visitTypeName(self, ast: TypeName):
+        self.tokens.append(ast.code())
+        return True
+
+    def visitAST(self, ast: AST):
+        self.tokens.append(type(ast).__name__)
+        for attr in self._leaf_attributes:
+            val = vars(ast).get(attr)
+            if isinstance(val, (str, int, bool)):
+                self.tokens.append(repr(val))
+        if isinstance(ast, Expression) and ast.annotated_type is not None:
+            self.tokens.append(ast.annotated_type.type_name.code())
+        for child in ast.children():
+            self.visit(child)
+        self.tokens.append(')')
+        return True
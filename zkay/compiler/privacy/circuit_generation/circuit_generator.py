@@ -1,16 +1,38 @@
-import functools
 import os
 from abc import ABCMeta, abstractmethod
-from multiprocessing import Pool, Value
-from typing import List, Tuple
+from multiprocessing import Pool
+from typing import List, Tuple, Optional, NamedTuple, Dict
 
+from zkay.compiler.privacy.circuit_generation import key_store
+from zkay.compiler.privacy.circuit_generation.circuit_cost import CircuitCost, estimate_circuit_cost
 from zkay.compiler.privacy.circuit_generation.circuit_helper import CircuitHelper
+from zkay.compiler.privacy.circuit_generation.circuit_optimizer import optimize_circuit
 from zkay.compiler.privacy.proving_scheme.proving_scheme import ProvingScheme, VerifyingKey
 from zkay.config import cfg, zk_print
-from zkay.utils.progress_printer import print_step
+from zkay.utils.helpers import get_physical_memory
+from zkay.utils.parallel import memory_bounded_map
+from zkay.utils.progress_printer import print_step, warn_print
 from zkay.utils.timer import time_measure
 
 
+class CircuitJob(NamedTuple):
+    """
+    Description of a pending circuit compilation.
+
+    Jobs only contain the generated backend code, so that sending them to worker processes is cheap
+    (circuit helpers and the ASTs attached to them stay in the parent process).
+    """
+
+    output_dir: str
+    """Output directory of the circuit"""
+
+    code: str
+    """Generated backend code of the circuit"""
+
+    digest: str
+    """Digest of everything which the compiled circuit depends on (used to detect modifications)"""
+
+
 class CircuitGenerator(metaclass=ABCMeta):
     """
     A circuit generator takes an abstract circuit representation and turns it into a concrete zk-snark circuit.
@@ -26,9 +48,14 @@ class CircuitGenerator(metaclass=ABCMeta):
         :param circuits: list which contains the corresponding circuit helper for every function in the contract which requires verification
         :param proving_scheme: the proving scheme instance to be used for verification contract generation
         :param output_dir: base directory where the zkay compilation output is located
-        :param parallel_keygen: if true, multiple python processes are used to generate keys in parallel
+        :param parallel_keygen: if true, keys for multiple circuits are generated in parallel (limited by cfg.keygen_memory_budget)
         """
 
+        if cfg.opt_circuit_constraints:
+            for circ in circuits:
+                removed = optimize_circuit(circ)
+                zk_print(f'Optimized circuit of function \'{circ.fct.name}\' ({removed} statements removed)', verbosity_level=2)
+
         self.circuits = {circ.fct: circ for circ in circuits}
         self.circuits_to_prove = [c for c in circuits if c.requires_verification() and c.fct.can_be_external and c.fct.has_side_effects]
         self.proving_scheme = proving_scheme
@@ -36,6 +63,10 @@ class CircuitGenerator(metaclass=ABCMeta):
         self.parallel_keygen = parallel_keygen
         self.p_count = min(os.cpu_count(), len(self.circuits_to_prove))
 
+    def estimate_circuit_costs(self) -> Dict[CircuitHelper, CircuitCost]:
+        """Return the statically estimated cost of every circuit which requires verification."""
+        return {circ: estimate_circuit_cost(circ, self.circuits) for circ in self.circuits_to_prove}
+
     def generate_circuits(self, *, import_keys: bool):
         """
         Generate circuit code and verification contracts based on the provided circuits and proving scheme.
@@ -45,36 +76,77 @@ class CircuitGenerator(metaclass=ABCMeta):
         """
         # Generate proof circuit code
 
+        # Warn about circuits which are expected to be expensive
+        if cfg.circuit_constraint_warning_threshold > 0:
+            for circ, cost in self.estimate_circuit_costs().items():
+                if cost.constraints > cfg.circuit_constraint_warning_threshold:
+                    with warn_print():
+                        zk_print(f'Warning: Circuit \'{circ.get_verification_contract_name()}\' has an estimated {cost.constraints} '
+                                 f'constraints (proving time ~{cost.proving_time:.0f}s), '
+                                 f'threshold is {cfg.circuit_constraint_warning_threshold}')
+
         # Compile circuits
         c_count = len(self.circuits_to_prove)
         zk_print(f'Compiling {c_count} circuits...')
 
-        gen_circs = functools.partial(self._generate_zkcircuit, import_keys)
-        with time_measure('circuit_compilation', True):
-            if cfg.is_unit_test:
-                modified = list(map(gen_circs, self.circuits_to_prove))
+        # Circuits which are known to be up to date are not generated again
+        circuits_to_generate = []
+        for circ in self.circuits_to_prove:
+            if self._is_circuit_unchanged(circ):
+                zk_print(f'Circuit \'{circ.get_verification_contract_name()}\' not modified, skipping compilation')
             else:
-                with Pool(processes=self.p_count) as pool:
-                    modified = pool.map(gen_circs, self.circuits_to_prove)
+                circuits_to_generate.append(circ)
+
+        with time_measure('circuit_compilation', True):
+            modified = self._generate_zkcircuits(import_keys, circuits_to_generate)
+        modified = {circ for t, circ in zip(modified, circuits_to_generate) if t}
 
         if import_keys:
             for path in self.get_all_key_paths():
                 if not os.path.exists(path):
                     raise RuntimeError("Zkay contract import failed: Missing keys")
         else:
-            modified_circuits_to_prove = [circ for t, circ in zip(modified, self.circuits_to_prove)
-                                          if t or not all(map(os.path.exists, self._get_vk_and_pk_paths(circ)))]
+            modified_circuits_to_prove = [circ for circ in self.circuits_to_prove
+                                          if circ in modified or not all(map(os.path.exists, self._get_vk_and_pk_paths(circ)))]
+
+            # Remove outdated key files (they might be hard links into the key store and must not be overwritten in place)
+            for circ in modified_circuits_to_prove:
+                for path in self._get_vk_and_pk_paths(circ):
+                    if os.path.lexists(path):
+                        os.remove(path)
+
+            # Reuse keys which were already generated for an identical circuit
+            store_keys = {}
+            if key_store.is_enabled():
+                for circ in modified_circuits_to_prove:
+                    digest = self._get_circuit_digest(circ)
+                    if digest is not None:
+                        store_keys[circ] = key_store.get_key(digest)
+                reused = [circ for circ, key in store_keys.items() if key_store.fetch(key, self._get_vk_and_pk_paths(circ))]
+                for circ in reused:
+                    zk_print(f'Reusing stored keys for circuit \'{circ.get_verification_contract_name()}\'')
+                modified_circuits_to_prove = [circ for circ in modified_circuits_to_prove if circ not in reused]
+
+            # Generate keys in parallel (as far as the memory budget allows)
+            k_count = len(modified_circuits_to_prove)
+            zk_print(f'Generating keys for {k_count} circuits...')
+
+            def report_progress(circ: CircuitHelper, finished_count: int):
+                zk_print(f'Generated keys for circuit \'{circ.get_verification_contract_name()}\' [{finished_count}/{k_count}]')
 
-            # Generate keys in parallel
-            zk_print(f'Generating keys for {c_count} circuits...')
             with time_measure('key_generation', True):
                 if self.parallel_keygen and not cfg.is_unit_test:
-                    counter = Value('i', 0)
-                    with Pool(processes=self.p_count, initializer=self.__init_worker, initargs=(counter, c_count,)) as pool:
-                        pool.map(self._generate_keys_par, modified_circuits_to_prove)
+                    memory_estimates = [self._estimate_keygen_memory(circ) for circ in modified_circuits_to_prove]
+                    memory_bounded_map(self._generate_keys, modified_circuits_to_prove, memory_estimates,
+                                       self._get_keygen_memory_budget(), on_finished=report_progress)
                 else:
-                    for circ in modified_circuits_to_prove:
+                    for idx, circ in enumerate(modified_circuits_to_prove):
                         self._generate_keys(circ)
+                        report_progress(circ, idx + 1)
+
+            for circ in modified_circuits_to_prove:
+                if circ in store_keys:
+                    key_store.store(store_keys[circ], self._get_vk_and_pk_paths(circ))
 
         with print_step('Write verification contracts'):
             for circuit in self.circuits_to_prove:
@@ -96,19 +168,15 @@ class CircuitGenerator(metaclass=ABCMeta):
         return [os.path.join(self.output_dir, circuit.verifier_contract_filename) for circuit in self.circuits_to_prove]
 
     @staticmethod
-    def __init_worker(counter, total_count):
-        global finish_counter
-        global c_count
-
-        finish_counter = counter
-        c_count = total_count
-
-    def _generate_keys_par(self, circuit: CircuitHelper):
-        self._generate_keys(circuit)
-        with finish_counter.get_lock():
-            finish_counter.value += 1
-            zk_print(f'Generated keys for circuit '
-                  f'\'{circuit.verifier_contract_type.code()}\' [{finish_counter.value}/{c_count}]')
+    def _get_keygen_memory_budget() -> int:
+        """Return the maximum amount of memory (in bytes) which concurrently running key generations may use."""
+        if cfg.keygen_memory_budget > 0:
+            return cfg.keygen_memory_budget * 1024 * 1024
+        total_memory = get_physical_memory()
+        if total_memory is None:
+            # Unknown amount of physical memory -> generate keys sequentially
+            return 0
+        return total_memory * 3 // 4
 
     def _get_circuit_output_dir(self, circuit: CircuitHelper):
         """Return the output directory for an individual circuit"""
@@ -119,22 +187,84 @@ class CircuitGenerator(metaclass=ABCMeta):
         output_dir = self._get_circuit_output_dir(circuit)
         return tuple(os.path.join(output_dir, fname) for fname in self.get_vk_and_pk_filenames())
 
+    def _get_circuit_digest(self, circuit: CircuitHelper) -> Optional[str]:
+        """
+        Return a digest of the generated concrete circuit, which identifies its keys in the global key store.
+
+        Backends which return None (default) do not use the key store.
+        """
+        return None
+
+    def _estimate_keygen_memory(self, circuit: CircuitHelper) -> int:
+        """
+        Return an estimate of the peak memory usage (in bytes) of key generation for circuit.
+
+        The default (unknown usage) prevents key generation for this circuit from running concurrently with other key generations.
+        """
+        return self._get_keygen_memory_budget() + 1
+
+    def _is_circuit_unchanged(self, circuit: CircuitHelper) -> bool:
+        """
+        Return true if the concrete circuit for circuit was already generated and is known to be up to date.
+
+        Backends can override this to avoid generating circuit code for unchanged circuits,
+        unchanged circuits are neither generated nor do they receive new keys.
+        """
+        return False
+
+    def _generate_zkcircuits(self, import_keys: bool, circuits: List[CircuitHelper]) -> List[bool]:
+        """
+        Generate code for all circuits in this process and compile the modified ones.
+
+        :return: for every circuit, True if it was modified since last generation (need to generate new keys)
+        """
+        jobs = []
+        for circuit in circuits:
+            job = self._get_circuit_job(import_keys, circuit)
+            if job is None:
+                zk_print(f'Circuit \'{circuit.get_verification_contract_name()}\' not modified, skipping compilation')
+            jobs.append(job)
+        self._compile_circuits([job for job in jobs if job is not None])
+        return [job is not None for job in jobs]
+
+    def _compile_circuits(self, jobs: List[CircuitJob]):
+        """
+        Compile the circuits described by jobs.
+
+        The default implementation invokes _compile_circuit for every job in a process pool.
+        Backends can override this to compile all circuits in a single batch.
+        """
+        if cfg.is_unit_test or len(jobs) <= 1:
+            for job in jobs:
+                self._compile_circuit(job)
+        else:
+            with Pool(processes=min(self.p_count, len(jobs))) as pool:
+                pool.map(self._compile_circuit, jobs)
+
     @abstractmethod
-    def _generate_zkcircuit(self, import_keys: bool, circuit: CircuitHelper) -> bool:
+    def _get_circuit_job(self, import_keys: bool, circuit: CircuitHelper) -> Optional[CircuitJob]:
         """
-        Generate code and compile a single circuit.
+        Generate the code of a single circuit.
 
         When implementing a new backend, this function should generate a concrete circuit representation, which has:
         a) circuit IO corresponding to circuit.sec_idfs/output_idfs/input_idfs
         b) logic corresponding to the non-CircCall statements in circuit.phi
         c) a), b) and c) for the circuit associated with the target function for every CircCall statement in circuit.phi
 
-        The output of this function should be in a state where key generation can be invoked immediately without further transformations
-        (i.e. any intermediary compilation steps should also happen here).
+        :return: None if the circuit stored in self._get_circuit_output_dir(circuit) is up to date, otherwise
+                 a job which is passed to _compile_circuit
+        """
+        pass
 
-        It should be stored in self._get_circuit_output_dir(circuit)
+    @staticmethod
+    @abstractmethod
+    def _compile_circuit(job: CircuitJob):
+        """
+        Compile the circuit described by job and store the result in job.output_dir.
 
-        :return: True if the circuit was modified since last generation (need to generate new keys)
+        This may run in a worker process, so it must only depend on job.
+        The output of this function should be in a state where key generation can be invoked immediately without further transformations
+        (i.e. any intermediary compilation steps should also happen here).
         """
         pass
 
@@ -70,10 +70,10 @@ class CircuitHelper:
         self._circ_temp_name_factory = NameFactory('tmp', arg_type=HybridArgType.TMP_CIRCUIT_VAL)
         """Name factory for temporary internal circuit variables"""
 
-        self._in_name_factory = NameFactory(cfg.zk_in_name, arg_type=HybridArgType.PUB_CIRCUIT_ARG)
+        self._in_name_factory = NameFactory(cfg.zk_in_name, arg_type=HybridArgType.PUB_CIRCUIT_ARG, pack=cfg.opt_pack_circuit_io)
         """Name factory for public circuit inputs"""
 
-        self._out_name_factory = NameFactory(cfg.zk_out_name, arg_type=HybridArgType.PUB_CIRCUIT_ARG)
+        self._out_name_factory = NameFactory(cfg.zk_out_name, arg_type=HybridArgType.PUB_CIRCUIT_ARG, pack=cfg.opt_pack_circuit_io)
         """Name factory for public circuit outputs"""
 
         # For a given owner label (idf or me), stores the corresponding assignment of the requested key to the corresponding in variable
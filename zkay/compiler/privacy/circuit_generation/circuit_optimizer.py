@@ -0,0 +1,320 @@
+"""
+This module implements a constraint-level optimizer for abstract proof circuits (CircuitHelper.phi).
+
+The optimizer runs after contract transformation and before circuit generation, and performs:
+
+* constant folding and propagation (temporary circuit variables with constant values are replaced by literals)
+* copy propagation and common subexpression elimination across temporary circuit variables
+* dead temporary elimination (declarations of temporary circuit variables which are never used)
+* deduplication of identical equality and encryption constraints
+
+The circuit interface (public inputs and outputs, private inputs) is never modified, since it is shared with the
+public contract and the offchain simulation. Expressions are never modified in place, since they are also referenced
+by the offchain simulation code.
+
+Folding follows solidity semantics (i.e. wrap around on overflow). Operations on 256 bit values are not folded, since
+they are performed in the circuit's prime field. Divisions are neither folded nor removed, since the circuit checks
+the divisor.
+"""
+
+from typing import List, Dict, Optional, Union, Tuple
+
+from zkay.compiler.privacy.circuit_generation.circuit_constraints import CircuitStatement, CircVarDecl, CircIndentBlock, \
+    CircGuardModification, CircEqConstraint, CircEncConstraint, CircSymmEncConstraint
+from zkay.compiler.privacy.circuit_generation.circuit_helper import CircuitHelper
+from zkay.zkay_ast.ast import Expression, IdentifierExpr, MemberAccessExpr, FunctionCallExpr, BuiltinFunction, \
+    PrimitiveCastExpr, BooleanLiteralExpr, NumberLiteralExpr, HybridArgumentIdf, HybridArgType, TypeName, \
+    NumberLiteralType, BooleanLiteralType, builtin_op_fct
+
+Value = Union[int, bool]
+
+# Operations which are checked by the circuit (e.g. division by zero), expressions containing them are never removed
+_checked_ops = ['/', '%']
+
+
+def optimize_circuit(circuit: CircuitHelper) -> int:
+    """
+    Optimize the circuit statements of circuit in place.
+
+    :return: the number of removed circuit statements
+    """
+    old_count = _count_statements(circuit.phi)
+    optimized = optimize_phi(circuit.phi)
+    circuit.phi[:] = optimized
+    return old_count - _count_statements(optimized)
+
+
+def optimize_phi(phi: List[CircuitStatement]) -> List[CircuitStatement]:
+    """Return an optimized copy of the circuit statement list phi."""
+    return _eliminate_dead_temporaries(_CircuitOptimizer().optimize(phi))
+
+
+class _CircuitOptimizer:
+    """Forward pass which performs constant folding and propagation, copy propagation, cse and constraint deduplication."""
+
+    def __init__(self):
+        self.constants: Dict[str, Tuple[Value, TypeName]] = {}
+        """Constant value and type of temporary circuit variables"""
+
+        self.aliases: Dict[str, HybridArgumentIdf] = {}
+        """Temporary circuit variables which are known to be equal to an earlier circuit variable"""
+
+        self.available: Dict[tuple, HybridArgumentIdf] = {}
+        """Temporary circuit variables which hold the value of an expression (by expression key)"""
+
+        self.constraints: Dict[tuple, List[tuple]] = {}
+        """Guard stacks under which a constraint was already added (by constraint key)"""
+
+        self.guard_stack: List[Tuple[str, bool]] = []
+
+    def optimize(self, phi: List[CircuitStatement]) -> List[CircuitStatement]:
+        out = []
+        for stmt in phi:
+            new_stmt = self.optimize_stmt(stmt)
+            if new_stmt is not None:
+                out.append(new_stmt)
+        return out
+
+    def optimize_stmt(self, stmt: CircuitStatement) -> Optional[CircuitStatement]:
+        if isinstance(stmt, CircIndentBlock):
+            return CircIndentBlock(stmt.name, self.optimize(stmt.statements))
+        elif isinstance(stmt, CircGuardModification):
+            if stmt.new_cond is None:
+                self.guard_stack.pop()
+                return stmt
+            new_cond = self.resolve(stmt.new_cond)
+            self.guard_stack.append((new_cond.name, stmt.is_true))
+            return stmt if new_cond is stmt.new_cond else CircGuardModification(new_cond, stmt.is_true)
+        elif isinstance(stmt, CircVarDecl):
+            return self.optimize_var_decl(stmt)
+        elif isinstance(stmt, CircEqConstraint):
+            new_stmt = CircEqConstraint(self.resolve(stmt.tgt), self.resolve(stmt.val))
+            return self.deduplicate(new_stmt, (new_stmt.tgt.name, new_stmt.val.name), stmt)
+        elif isinstance(stmt, CircEncConstraint):
+            new_stmt = CircEncConstraint(self.resolve(stmt.plain), self.resolve(stmt.rnd), self.resolve(stmt.pk),
+                                         self.resolve(stmt.cipher), stmt.is_dec)
+            key = (new_stmt.plain.name, new_stmt.rnd.name, new_stmt.pk.name, new_stmt.cipher.name, stmt.is_dec)
+            return self.deduplicate(new_stmt, key, stmt)
+        elif isinstance(stmt, CircSymmEncConstraint):
+            new_stmt = CircSymmEncConstraint(self.resolve(stmt.plain), self.resolve(stmt.other_pk), self.resolve(stmt.iv_cipher),
+                                             stmt.is_dec)
+            key = (new_stmt.plain.name, new_stmt.other_pk.name, new_stmt.iv_cipher.name, stmt.is_dec)
+            return self.deduplicate(new_stmt, key, stmt)
+        else:
+            # Comments and calls (called functions use a separate namespace)
+            return stmt
+
+    def optimize_var_decl(self, stmt: CircVarDecl) -> CircVarDecl:
+        expr, value = self.rewrite(stmt.expr)
+        lhs = stmt.lhs
+        if lhs.arg_type == HybridArgType.TMP_CIRCUIT_VAL:
+            if value is not None and _fits(value, lhs.t):
+                self.constants[lhs.name] = (value, lhs.t)
+                literal = _make_literal(value, lhs.t)
+                if literal is not None:
+                    expr = literal
+            elif isinstance(expr, IdentifierExpr) and isinstance(expr.idf, HybridArgumentIdf) and expr.idf.t == lhs.t:
+                # Copy propagation
+                self.aliases[lhs.name] = expr.idf
+            else:
+                # Common subexpression elimination
+                key = _expr_key(expr)
+                if key is not None and not _contains_checked_op(expr):
+                    key = (lhs.t.code(), key)
+                    if key in self.available:
+                        self.aliases[lhs.name] = self.available[key]
+                    else:
+                        self.available[key] = lhs
+        return stmt if expr is stmt.expr else CircVarDecl(lhs, expr)
+
+    def deduplicate(self, new_stmt: CircuitStatement, key: tuple, stmt: CircuitStatement) -> Optional[CircuitStatement]:
+        """Return None if an identical constraint was already added under a (possibly weaker) guard condition, otherwise the constraint."""
+        key = (type(new_stmt).__name__, *key)
+        guard_stack = tuple(self.guard_stack)
+        for prev_guard_stack in self.constraints.get(key, []):
+            if guard_stack[:len(prev_guard_stack)] == prev_guard_stack:
+                return None
+        self.constraints.setdefault(key, []).append(guard_stack)
+        return stmt if vars(new_stmt) == vars(stmt) else new_stmt
+
+    def resolve(self, idf: HybridArgumentIdf) -> HybridArgumentIdf:
+        """Return the earliest circuit variable which is known to be equal to idf."""
+        return self.aliases.get(idf.name, idf)
+
+    def rewrite(self, expr: Expression) -> Tuple[Expression, Optional[Value]]:
+        """
+        Propagate constants and aliases into expr and fold it.
+
+        :return: (rewritten expression (expr itself if nothing changed), constant value of expr or None if not constant)
+        """
+        if isinstance(expr, BooleanLiteralExpr):
+            return expr, expr.value
+        elif isinstance(expr, NumberLiteralExpr):
+            return expr, expr.value
+        elif isinstance(expr, IdentifierExpr) and isinstance(expr.idf, HybridArgumentIdf):
+            t = _get_type(expr)
+            if expr.idf.name in self.constants:
+                value, decl_t = self.constants[expr.idf.name]
+                if t == decl_t:
+                    literal = _make_literal(value, t)
+                    return (expr if literal is None else literal), value
+            if expr.idf.name in self.aliases:
+                return IdentifierExpr(self.aliases[expr.idf.name].clone()).override(annotated_type=expr.annotated_type), None
+            return expr, None
+        elif isinstance(expr, FunctionCallExpr) and isinstance(expr.func, BuiltinFunction):
+            args, values = zip(*map(self.rewrite, expr.args)) if expr.args else ((), ())
+            new_expr = expr
+            if any(new_arg is not arg for new_arg, arg in zip(args, expr.args)):
+                func = BuiltinFunction(expr.func.op).override(is_private=expr.func.is_private)
+                new_expr = FunctionCallExpr(func, list(args)).override(annotated_type=expr.annotated_type)
+
+            t = _get_type(expr)
+            if expr.func.op == 'ite' and values[0] is not None:
+                # Constant condition -> select branch
+                branch, value = (args[1], values[1]) if values[0] else (args[2], values[2])
+                if value is not None:
+                    return self.folded(new_expr, value, t)
+                if _get_type(branch) == t:
+                    return branch, None
+            if all(v is not None for v in values):
+                value = _fold(expr.func.op, list(values), t)
+                if value is not None:
+                    return self.folded(new_expr, value, t)
+            return new_expr, None
+        elif isinstance(expr, FunctionCallExpr) and expr.is_cast:
+            args, _ = zip(*map(self.rewrite, expr.args))
+            if all(new_arg is arg for new_arg, arg in zip(args, expr.args)):
+                return expr, None
+            return FunctionCallExpr(expr.func, list(args)).override(annotated_type=expr.annotated_type), None
+        elif isinstance(expr, PrimitiveCastExpr):
+            inner, value = self.rewrite(expr.expr)
+            new_expr = expr
+            if inner is not expr.expr:
+                new_expr = PrimitiveCastExpr(expr.elem_type, inner, expr.is_implicit).override(annotated_type=expr.annotated_type)
+            if value is not None and not isinstance(value, bool) and expr.elem_type.is_numeric and expr.elem_type.elem_bitwidth < 256:
+                return self.folded(new_expr, _wrap(value, expr.elem_type), _get_type(expr))
+            return new_expr, None
+        else:
+            return expr, None
+
+    @staticmethod
+    def folded(expr: Expression, value: Value, t: Optional[TypeName]) -> Tuple[Expression, Value]:
+        """Return a literal for value if it can be represented in the circuit, otherwise expr."""
+        literal = _make_literal(value, t) if t is not None else None
+        return (expr if literal is None else literal), value
+
+
+def _eliminate_dead_temporaries(phi: List[CircuitStatement]) -> List[CircuitStatement]:
+    """Remove declarations of temporary circuit variables which are not used by any later statement."""
+    used = set()
+
+    def visit(stmts: List[CircuitStatement]) -> List[CircuitStatement]:
+        out = []
+        for stmt in reversed(stmts):
+            if isinstance(stmt, CircIndentBlock):
+                stmt = CircIndentBlock(stmt.name, visit(stmt.statements))
+            elif isinstance(stmt, CircVarDecl):
+                if stmt.lhs.arg_type == HybridArgType.TMP_CIRCUIT_VAL and stmt.lhs.name not in used \
+                        and _expr_key(stmt.expr) is not None and not _contains_checked_op(stmt.expr):
+                    continue
+                used.update(_used_names(stmt.expr))
+            elif isinstance(stmt, CircGuardModification):
+                if stmt.new_cond is not None:
+                    used.add(stmt.new_cond.name)
+            else:
+                used.update(val.name for val in vars(stmt).values() if isinstance(val, HybridArgumentIdf))
+            out.append(stmt)
+        return out[::-1]
+
+    return visit(phi)
+
+
+def _count_statements(phi: List[CircuitStatement]) -> int:
+    return sum(_count_statements(stmt.statements) if isinstance(stmt, CircIndentBlock) else 1 for stmt in phi)
+
+
+def _get_type(expr: Expression) -> Optional[TypeName]:
+    return None if expr.annotated_type is None else expr.annotated_type.type_name
+
+
+def _fits(value: Value, t: TypeName) -> bool:
+    if isinstance(value, bool):
+        return t.is_boolean
+    return t.is_numeric and not t.is_literal and t.can_represent(value)
+
+
+def _wrap(value: int, t: TypeName) -> int:
+    """Truncate value to the bitwidth of t (two's complement for signed types)."""
+    bits = t.elem_bitwidth
+    value &= (1 << bits) - 1
+    if t.is_signed_numeric and value >= (1 << (bits - 1)):
+        value -= 1 << bits
+    return value
+
+
+def _fold(op: str, values: List[Value], t: Optional[TypeName]) -> Optional[Value]:
+    """Return the result of applying op to values with result type t, or None if it cannot be folded."""
+    if t is None or op in _checked_ops or op not in builtin_op_fct:
+        return None
+    if isinstance(t, (NumberLiteralType, BooleanLiteralType)):
+        # Compile time constant
+        return t.value
+    if t.is_boolean:
+        return bool(builtin_op_fct[op](*values))
+    if t.is_numeric and not t.is_literal and t.elem_bitwidth < 256 and not any(isinstance(v, bool) for v in values):
+        if op in ['<<', '>>'] and not 0 <= values[1] < t.elem_bitwidth:
+            return None
+        return _wrap(builtin_op_fct[op](*values), t)
+    return None
+
+
+def _make_literal(value: Value, t: Optional[TypeName]) -> Optional[Expression]:
+    """Return a literal expression with value and type t, or None if value cannot be expressed as a literal of type t."""
+    if t is None:
+        return None
+    if isinstance(value, bool):
+        return BooleanLiteralExpr(value) if t.is_boolean else None
+    if isinstance(t, NumberLiteralType):
+        return NumberLiteralExpr(value) if value >= 0 else None
+    if t.is_numeric and value >= 0 and t.can_represent(value):
+        return NumberLiteralExpr(value).as_type(t.clone())
+    return None
+
+
+def _expr_key(expr: Expression) -> Optional[tuple]:
+    """Return a hashable key which identifies expr (including types), or None if expr contains unsupported elements."""
+    t = _get_type(expr)
+    t_code = None if t is None else t.code()
+    if isinstance(expr, (BooleanLiteralExpr, NumberLiteralExpr)):
+        return type(expr).__name__, expr.value, t_code
+    elif isinstance(expr, IdentifierExpr) and isinstance(expr.idf, HybridArgumentIdf):
+        return 'idf', expr.idf.name, t_code
+    elif isinstance(expr, MemberAccessExpr) and isinstance(expr.member, HybridArgumentIdf):
+        return 'member', expr.member.name, t_code
+    elif isinstance(expr, FunctionCallExpr) and (isinstance(expr.func, BuiltinFunction) or expr.is_cast):
+        func = expr.func.op if isinstance(expr.func, BuiltinFunction) else expr.func.code()
+        args = [_expr_key(arg) for arg in expr.args]
+        return None if None in args else ('call', func, t_code, *args)
+    elif isinstance(expr, PrimitiveCastExpr):
+        inner = _expr_key(expr.expr)
+        return None if inner is None else ('cast', expr.elem_type.code(), t_code, inner)
+    return None
+
+
+def _contains_checked_op(expr: Expression) -> bool:
+    if isinstance(expr, FunctionCallExpr) and isinstance(expr.func, BuiltinFunction) and expr.func.op in _checked_ops:
+        return True
+    return any(_contains_checked_op(child) for child in expr.children() if isinstance(child, Expression))
+
+
+def _used_names(expr: Expression) -> List[str]:
+    """Return the names of all circuit variables referenced in expr."""
+    if isinstance(expr, IdentifierExpr) and isinstance(expr.idf, HybridArgumentIdf):
+        return [expr.idf.name]
+    elif isinstance(expr, MemberAccessExpr) and isinstance(expr.member, HybridArgumentIdf):
+        return [expr.member.name]
+    names = []
+    for child in expr.children():
+        if isinstance(child, Expression):
+            names += _used_names(child)
+    return names
@@ -0,0 +1,125 @@
+"""
+This module implements a global content-addressed store for NIZK prover and verification keys.
+
+Key generation is the most expensive compilation step. Since the keys of a circuit only depend on the compiled circuit
+and on the proving scheme, keys which were generated once are stored in cfg.data_dir/key_store, keyed by a digest of
+the backend circuit file, the proving scheme and the zkay version. When an identical circuit is compiled again
+(into any output directory, or as part of another contract), the stored keys are hard linked (or copied, if hard links
+are not supported) into the circuit output directory instead of being generated again.
+
+Every entry is a directory which contains all key files of one circuit. When the total size of all entries exceeds
+cfg.key_store_size, the least recently used entries are evicted.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Sequence
+
+from zkay.config import cfg
+
+
+def get_store_dir() -> str:
+    return os.path.join(cfg.data_dir, 'key_store')
+
+
+def is_enabled() -> bool:
+    # Unit tests must not fill the user's key store
+    return cfg.key_store_size > 0 and not cfg.is_unit_test
+
+
+def get_key(circuit_digest: str) -> str:
+    """Return the store key for the keys of the circuit with the given digest, using the current proving scheme."""
+    return hashlib.sha256(f'{circuit_digest}:{cfg.proving_scheme}:{cfg.zkay_version}'.encode()).hexdigest()
+
+
+def fetch(key: str, key_paths: Sequence[str]) -> bool:
+    """
+    Link the stored key files for key to key_paths.
+
+    :param key: store key (see get_key)
+    :param key_paths: destination paths of all key files, the file names identify the stored files
+    :return: True if all key files were found and linked, False otherwise
+    """
+    entry_dir = os.path.join(get_store_dir(), key)
+    sources = [os.path.join(entry_dir, os.path.basename(p)) for p in key_paths]
+    if not all(map(os.path.isfile, sources)):
+        return False
+    try:
+        for src, dst in zip(sources, key_paths):
+            _link_or_copy(src, dst)
+        # Mark entry as recently used
+        os.utime(entry_dir)
+    except OSError:
+        return False
+    return True
+
+
+def store(key: str, key_paths: Sequence[str]):
+    """
+    Add the key files at key_paths to the store and evict old entries if the store grew too large.
+
+    Failures to write to the store are silently ignored, since the store is only an optimization.
+    """
+    store_dir = get_store_dir()
+    entry_dir = os.path.join(store_dir, key)
+    if os.path.isdir(entry_dir):
+        return
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=store_dir, suffix='.tmp')
+        try:
+            for path in key_paths:
+                _link_or_copy(path, os.path.join(tmp_dir, os.path.basename(path)))
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        evict(cfg.key_store_size * 1024 * 1024)
+    except OSError:
+        pass
+
+
+def evict(max_size: int):
+    """Remove least recently used entries until the total size of all entries is at most max_size bytes."""
+    store_dir = get_store_dir()
+    if not os.path.isdir(store_dir):
+        return
+
+    entries = []
+    for name in os.listdir(store_dir):
+        entry_dir = os.path.join(store_dir, name)
+        if name.endswith('.tmp') or not os.path.isdir(entry_dir):
+            continue
+        try:
+            size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+            entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+        except OSError:
+            continue
+
+    total_size = sum(e[1] for e in entries)
+    for _, size, entry_dir in sorted(entries):
+        if total_size <= max_size:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total_size -= size
+
+
+def clear():
+    """Remove all entries."""
+    evict(0)
+
+
+def _link_or_copy(src: str, dst: str):
+    """
+    Make dst refer to the contents of src (existing files at dst are replaced).
+
+    Key files are never modified in place (they are always removed before keys are regenerated), so hard links are safe.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, List, Tuple
 
 from zkay.zkay_ast.ast import TypeName, HybridArgType, Expression, HybridArgumentIdf
 
@@ -29,20 +29,46 @@ class BaseNameFactory:
         return name
 
 
+packed_uint_bitwidth = 248
+"""Maximum number of bits of small values which are packed into a single uint (must be smaller than the field bitwidth)"""
+
+
+def is_packable(t: TypeName) -> bool:
+    """Return true if values of type t can share a single serialized uint with other small values."""
+    return t.is_primitive_type() and not t.is_signed_numeric and t.elem_bitwidth < 256
+
+
+def group_by_io_offset(idfs: List[HybridArgumentIdf]) -> List[Tuple[int, List[HybridArgumentIdf]]]:
+    """Return (io_offset, idfs) for every serialized value or packed uint, ordered by offset."""
+    groups = {}
+    for idf in idfs:
+        groups.setdefault(idf.io_offset, []).append(idf)
+    return sorted(groups.items(), key=lambda g: g[0])
+
+
 class NameFactory(BaseNameFactory):
     """A Name factory can generate fresh, unused HybridArgumentIdfs with a given prefix."""
 
-    def __init__(self, base_name: str, arg_type: HybridArgType):
+    def __init__(self, base_name: str, arg_type: HybridArgType, pack: bool = False):
+        """
+        Create a new name factory.
+
+        :param base_name: prefix of all generated names
+        :param arg_type: argument type of all generated HybridArgumentIdfs
+        :param pack: if true, small values are packed into shared uints (see is_packable)
+        """
         super().__init__(base_name)
         self.arg_type = arg_type
         self.size = 0
         self.idfs = []
+        self.pack = pack
+        self._packed_offset, self._packed_bits = -1, packed_uint_bitwidth
 
     def get_new_idf(self, t: TypeName, priv_expr: Optional[Expression] = None) -> HybridArgumentIdf:
         """Generate a new HybridArgumentIdf which references priv_expr and has transformed type t."""
         name = self.get_new_name(t, inc=True)
         idf = HybridArgumentIdf(name, t, self.arg_type, priv_expr)
-        self.size += t.size_in_uints
+        self._allocate(idf)
         self.idfs.append(idf)
         return idf
 
@@ -54,6 +80,19 @@ class NameFactory(BaseNameFactory):
         """
         idf = HybridArgumentIdf(name, t, self.arg_type, priv_expr)
         self.count += 1
-        self.size += t.size_in_uints
+        self._allocate(idf)
         self.idfs.append(idf)
         return idf
+
+    def _allocate(self, idf: HybridArgumentIdf):
+        """Assign the serialization offset of idf (appending it to the last partially filled packed uint if possible)."""
+        if self.pack and is_packable(idf.t):
+            bits = idf.t.elem_bitwidth
+            if self._packed_bits + bits > packed_uint_bitwidth:
+                self._packed_offset, self._packed_bits = self.size, 0
+                self.size += 1
+            idf.io_offset, idf.packed_bit_offset = self._packed_offset, self._packed_bits
+            self._packed_bits += bits
+        else:
+            idf.io_offset = self.size
+            self.size += idf.t.size_in_uints
@@ -0,0 +1,255 @@
+"""
+This module defines the deployment artifact bundle, which is written to the compilation output directory by compile_zkay.
+
+It contains everything which is needed to deploy a compiled zkay contract and to check the integrity of deployed
+zkay contracts, without having to invoke solc again:
+
+* abi and bytecode of all main contracts, compiled with unique placeholder addresses for the pki and verification
+  contracts, together with the offsets at which the placeholder addresses occur in the bytecode
+* abi and unlinked bytecode of all verification contracts, together with the offsets of the library link references
+* the names of all verification contracts
+* hashes of all solidity files which were used to create the artifacts (the bundle is ignored if any of them changed)
+
+All offsets are character offsets into the bytecode hex strings (without 0x prefix).
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from zkay.compiler.privacy.proving_scheme.proving_scheme import ProvingScheme
+from zkay.compiler.solidity.compiler import compile_solidity_json_parallel
+from zkay.config import cfg
+
+
+class DeploymentArtifacts:
+    filename = 'deployment_artifacts.json'
+
+    def __init__(self, data: Dict):
+        self.data = data
+
+    @property
+    def verifier_names(self) -> List[str]:
+        return list(self.data['verifiers'].keys())
+
+    @staticmethod
+    def placeholder_address(name: str) -> str:
+        """
+        Return the placeholder address which is used for the external contract 'name' during compilation.
+
+        The first byte is always non-zero, so that solc always emits a full 20 byte push instruction for the constant.
+        """
+        digest = hashlib.sha256(f'zkay_placeholder_address:{name}'.encode()).hexdigest()[:40]
+        return 'ff' + digest[2:]
+
+    @staticmethod
+    def generate(output_dir: str, verifier_names: List[str]) -> 'DeploymentArtifacts':
+        """
+        Compile the solidity files in output_dir and collect the deployment artifacts.
+
+        :param output_dir: zkay compilation output directory (must contain contract.sol and all verification contracts)
+        :param verifier_names: names of all verification contracts
+        :raise SolcError: if compilation fails
+        :raise ValueError: if a placeholder address which is used by a contract cannot be located in its bytecode
+        :return: the deployment artifacts
+        """
+        external_names = [cfg.pki_contract_name] + verifier_names
+        with open(os.path.join(output_dir, 'contract.sol')) as f:
+            code = f.read()
+        for name in external_names:
+            code = code.replace(f'{name}(0)', f'{name}({_to_checksum_address(DeploymentArtifacts.placeholder_address(name))})')
+
+        with tempfile.TemporaryDirectory() as tempd:
+            # Same filename as used by the blockchain backend when instantiating the contract
+            inst_filename = os.path.join(tempd, 'contract.inst.sol')
+            with open(inst_filename, 'w') as f:
+                f.write(code)
+
+            jobs = [{'sol_filename': os.path.join(output_dir, f'{vname}.sol'), 'optimizer_runs': cfg.opt_solc_optimizer_runs}
+                    for vname in verifier_names]
+            jobs.append({'sol_filename': inst_filename, 'optimizer_runs': cfg.opt_solc_optimizer_runs, 'cwd': output_dir})
+            outputs = compile_solidity_json_parallel(jobs)
+
+        verifiers = {}
+        for vname, out in zip(verifier_names, outputs):
+            jout = out['contracts'][f'{vname}.sol'][vname]
+            verifiers[vname] = {
+                'abi': json.loads(jout['metadata'])['output']['abi'],
+                'bin': jout['evm']['bytecode']['object'],
+                'deployed_bin': jout['evm']['deployedBytecode']['object'],
+                'link_references': {
+                    'bin': _get_link_offsets(jout['evm']['bytecode'].get('linkReferences', {})),
+                    'deployed_bin': _get_link_offsets(jout['evm']['deployedBytecode'].get('linkReferences', {})),
+                },
+            }
+
+        contracts = {}
+        for cname, jout in outputs[-1]['contracts']['contract.inst.sol'].items():
+            contract = {
+                'abi': json.loads(jout['metadata'])['output']['abi'],
+                'bin': jout['evm']['bytecode']['object'],
+                'deployed_bin': jout['evm']['deployedBytecode']['object'],
+                'address_offsets': {'bin': {}, 'deployed_bin': {}},
+            }
+            getters = {entry['name'] for entry in contract['abi'] if entry.get('type') == 'function'}
+            for name in external_names:
+                offsets = _get_address_offsets(contract['bin'], contract['deployed_bin'], DeploymentArtifacts.placeholder_address(name),
+                                               cfg.get_contract_var_name(name) in getters)
+                if offsets is not None:
+                    contract['address_offsets']['bin'][name], contract['address_offsets']['deployed_bin'][name] = offsets
+            contracts[cname] = contract
+
+        source_files = ['contract.sol', f'{cfg.pki_contract_name}.sol', ProvingScheme.verify_libs_contract_filename] + \
+                       [f'{vname}.sol' for vname in verifier_names]
+        return DeploymentArtifacts({
+            'solc-version': cfg.solc_version,
+            'optimizer-runs': cfg.opt_solc_optimizer_runs,
+            'source-hashes': {filename: _hash_file(os.path.join(output_dir, filename)) for filename in source_files},
+            'contracts': contracts,
+            'verifiers': verifiers,
+        })
+
+    def save(self, output_dir: str):
+        with open(os.path.join(output_dir, self.filename), 'w') as f:
+            json.dump(self.data, f)
+
+    @staticmethod
+    def load(project_dir: str) -> Optional['DeploymentArtifacts']:
+        """
+        Load the deployment artifacts from project_dir.
+
+        :return: the artifacts, or None if there are no artifacts or if they are outdated
+                 (i.e. a source file changed or the artifacts were created with a different compiler configuration)
+        """
+        try:
+            with open(os.path.join(project_dir, DeploymentArtifacts.filename)) as f:
+                data = json.load(f)
+            if data['solc-version'] != cfg.solc_version or data['optimizer-runs'] != cfg.opt_solc_optimizer_runs:
+                return None
+            for filename, digest in data['source-hashes'].items():
+                if _hash_file(os.path.join(project_dir, filename)) != digest:
+                    return None
+        except (OSError, ValueError, KeyError):
+            return None
+        return DeploymentArtifacts(data)
+
+    def get_contract_abi(self, contract_name: str) -> List:
+        return self.data['contracts'][contract_name]['abi']
+
+    def get_contract(self, contract_name: str, external_addresses: Dict[str, str]) -> Dict:
+        """
+        Return abi and bytecode of the main contract 'contract_name' with the given pki and verifier addresses.
+
+        :param contract_name: name of the main contract
+        :param external_addresses: dictionary which maps pki and verification contract names to their addresses
+        :return: dictionary with keys 'abi', 'bin' and 'deployed_bin' (same format as Web3Blockchain.compile_contract)
+        """
+        contract = self.data['contracts'][contract_name]
+        ret = {'abi': contract['abi']}
+        for key in ['bin', 'deployed_bin']:
+            offsets = contract['address_offsets'][key]
+            ret[key] = _patch(contract[key], {external_addresses[name]: locs for name, locs in offsets.items()})
+        return ret
+
+    def get_verifier(self, verifier_name: str, lib_addresses: Dict[str, str]) -> Dict:
+        """
+        Return abi and bytecode of the verification contract 'verifier_name' linked against the given libraries.
+
+        :param verifier_name: name of the verification contract
+        :param lib_addresses: dictionary which maps library names to their addresses
+        :return: dictionary with keys 'abi', 'bin' and 'deployed_bin' (same format as Web3Blockchain.compile_contract)
+        """
+        verifier = self.data['verifiers'][verifier_name]
+        ret = {'abi': verifier['abi']}
+        for key in ['bin', 'deployed_bin']:
+            offsets = verifier['link_references'][key]
+            ret[key] = _patch(verifier[key], {lib_addresses[lib]: locs for lib, locs in offsets.items()})
+        return ret
+
+
+def _to_checksum_address(addr: str) -> str:
+    from eth_utils import to_checksum_address
+    return to_checksum_address(f'0x{addr}')
+
+
+def _hash_file(filename: str) -> str:
+    with open(filename, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def strip_metadata(code: str) -> str:
+    """
+    Remove the CBOR encoded solc metadata from the end of the bytecode hex string code (without 0x prefix).
+
+    The last two bytes of the bytecode contain the length of the metadata. If code does not end with valid looking
+    metadata, it is returned unchanged.
+    """
+    if len(code) < 4:
+        return code
+    length = (int(code[-4:], 16) + 2) * 2
+    # Metadata is a CBOR map (major type 5)
+    if length > len(code) or int(code[-length:-length + 2], 16) >> 5 != 5:
+        return code
+    return code[:-length]
+
+
+def _get_address_offsets(code: str, deployed_code: str, placeholder: str,
+                         required: bool) -> Optional[Tuple[List[int], List[int]]]:
+    """
+    Locate the placeholder address in the creation and in the runtime bytecode.
+
+    Every occurrence must be the operand of a PUSH20 instruction, and the runtime bytecode (which is part of the creation
+    bytecode) must not contain more occurrences than the creation bytecode.
+
+    :param code: creation bytecode
+    :param deployed_code: runtime bytecode
+    :param placeholder: placeholder address
+    :param required: if true, the placeholder must occur in the runtime bytecode (e.g. because it is stored in a public constant)
+    :raise ValueError: if the placeholder occurrences are inconsistent
+    :return: (creation offsets, runtime offsets) or None if the placeholder does not occur at all
+    """
+    offsets = _find_all(code, placeholder)
+    deployed_offsets = _find_all(deployed_code, placeholder)
+    if not deployed_offsets and required:
+        raise ValueError(f'Placeholder address {placeholder} not found in runtime bytecode')
+    if len(offsets) < len(deployed_offsets):
+        raise ValueError(f'Placeholder address {placeholder} occurs {len(offsets)} times in the creation bytecode, '
+                         f'but {len(deployed_offsets)} times in the runtime bytecode')
+    for c, offs in [(code, offsets), (deployed_code, deployed_offsets)]:
+        if any(off % 2 != 0 or c[off - 2:off] != '73' for off in offs):
+            raise ValueError(f'Placeholder address {placeholder} occurs outside of a PUSH20 instruction')
+    if not offsets:
+        return None
+    return offsets, deployed_offsets
+
+
+def _find_all(code: str, needle: str) -> List[int]:
+    offsets = []
+    idx = code.find(needle)
+    while idx != -1:
+        offsets.append(idx)
+        idx = code.find(needle, idx + len(needle))
+    return offsets
+
+
+def _get_link_offsets(link_references: Dict) -> Dict[str, List[int]]:
+    """Convert solc linkReferences (byte offsets, grouped by file) into library name -> character offsets."""
+    offsets = {}
+    for file_refs in link_references.values():
+        for lib, refs in file_refs.items():
+            offsets.setdefault(lib, []).extend(ref['start'] * 2 for ref in refs)
+    return offsets
+
+
+def _patch(code: str, addresses: Dict[str, List[int]]) -> str:
+    """Write each address (hex string) into code at all of its offsets."""
+    code = list(code)
+    for addr, offsets in addresses.items():
+        addr = addr[2:] if addr.startswith('0x') else addr
+        addr = addr.lower()
+        assert len(addr) == 40
+        for offset in offsets:
+            code[offset:offset + 40] = addr
+    return ''.join(code)
@@ -1,7 +1,8 @@
+import hashlib
 import json
 import os
 from contextlib import contextmanager
-from typing import ContextManager
+from typing import ContextManager, List, Optional, Dict
 
 from zkay.config import cfg
 from zkay.utils.progress_printer import warn_print
@@ -12,6 +13,14 @@ class Manifest:
     zkay_version = 'zkay-version'
     solc_version = 'solc-version'
     zkay_options = 'zkay-options'
+    contract_hash = 'contract-hash'
+    verifiers = 'verifiers'
+
+    # Keys of the per-verifier entries in manifest[Manifest.verifiers]
+    in_size = 'in-size'
+    out_size = 'out-size'
+    priv_in_size = 'priv-in-size'
+    file_hashes = 'file-hashes'
 
     @staticmethod
     def load(project_dir):
@@ -20,6 +29,63 @@ class Manifest:
             j = json.loads(f.read())
         return j
 
+    @staticmethod
+    def hash_file(filename: str) -> str:
+        with open(filename, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    @staticmethod
+    def get_verifier_metadata(project_dir: str, circuits: List['CircuitHelper'], key_filenames: List[str]) -> Dict:
+        """
+        Return the manifest entries which describe the verification contracts of the compiled contract in project_dir.
+
+        :param project_dir: compilation output directory (contract.zkay, the verification contracts and keys must exist)
+        :param circuits: circuits for which verification contracts were generated
+        :param key_filenames: names of the key files in each circuit output directory whose hashes should be recorded
+        :return: dictionary with Manifest.contract_hash and Manifest.verifiers entries
+        """
+        verifiers = {}
+        for circuit in circuits:
+            vname = circuit.get_verification_contract_name()
+            files = [f'{vname}.sol'] + [os.path.join(cfg.get_circuit_output_dir_name(vname), k) for k in key_filenames]
+            verifiers[vname] = {
+                Manifest.in_size: circuit.in_size_trans,
+                Manifest.out_size: circuit.out_size_trans,
+                Manifest.priv_in_size: circuit.priv_in_size_trans,
+                Manifest.file_hashes: {f: Manifest.hash_file(os.path.join(project_dir, f))
+                                       for f in files if os.path.exists(os.path.join(project_dir, f))}
+            }
+        return {
+            Manifest.contract_hash: Manifest.hash_file(os.path.join(project_dir, 'contract.zkay')),
+            Manifest.verifiers: verifiers
+        }
+
+    @staticmethod
+    def get_verifier_names(project_dir: str, manifest: Optional[Dict] = None) -> Optional[List[str]]:
+        """
+        Return the names of all verification contracts recorded in the manifest in project_dir.
+
+        The recorded information is only used if the hash of contract.zkay matches the recorded hash and if all recorded
+        files which are present in project_dir have the recorded hashes.
+
+        :param project_dir: compilation output directory
+        :param manifest: [OPTIONAL] already loaded manifest
+        :return: list of verification contract names, or None if the manifest does not contain (valid) verifier information
+        """
+        try:
+            manifest = Manifest.load(project_dir) if manifest is None else manifest
+            if Manifest.verifiers not in manifest or \
+                    Manifest.hash_file(os.path.join(project_dir, 'contract.zkay')) != manifest[Manifest.contract_hash]:
+                return None
+            for meta in manifest[Manifest.verifiers].values():
+                for f, digest in meta[Manifest.file_hashes].items():
+                    path = os.path.join(project_dir, f)
+                    if os.path.exists(path) and Manifest.hash_file(path) != digest:
+                        return None
+        except (OSError, ValueError, KeyError):
+            return None
+        return list(manifest[Manifest.verifiers].keys())
+
     @staticmethod
     def import_manifest_config(manifest):
         # Check if zkay version matches
@@ -1,3 +1,4 @@
+import builtins
 from contextlib import contextmanager
 from datetime import datetime
 from textwrap import dedent
@@ -14,8 +15,9 @@ from zkay.zkay_ast.ast import ContractDefinition, SourceUnit, ConstructorOrFunct
     CircuitComputationStatement, VariableDeclaration, Block, KeyLiteralExpr, VariableDeclarationStatement, LocationExpr, \
     PrimitiveCastExpr, EnumDefinition, EnumTypeName, UintTypeName, \
     StatementList, StructDefinition, NumberTypeName, EnterPrivateKeyStatement, ArrayLiteralExpr, NumberLiteralExpr, \
-    BoolTypeName
+    BoolTypeName, Mapping, BooleanLiteralExpr
 from zkay.zkay_ast.visitor.python_visitor import PythonCodeVisitor
+from zkay.zkay_ast.visitor.visitor import AstVisitor
 
 
 def api(name: str, invoker: str = 'self') -> str:
@@ -69,6 +71,16 @@ class PythonOffchainVisitor(PythonCodeVisitor):
         self.inside_circuit: bool = False
         self.flatten_hybrid_args: bool = False
 
+        self.state_var_ids: Dict[str, int] = {}
+        """StateDict variable ids of all simulated state variables of the current contract"""
+
+        self.contract_names: Set[str] = set()
+        self.local_names: Optional[Dict[int, str]] = None
+        """
+        Python identifiers of all local variable declarations (keyed by declaration id) in the current function,
+        None if local variables are stored in a LocalsDict (cfg.opt_native_offchain_locals disabled)
+        """
+
     @property
     def _get_forbidden_words(self) -> Set[str]:
         return super()._get_forbidden_words.union({kw for kw in [
@@ -76,7 +88,7 @@ class PythonOffchainVisitor(PythonCodeVisitor):
             'connect', 'deploy', 'me', 'wei_amount',
 
             # base class member variables
-            'api', 'locals', 'state',
+            'api', 'locals', 'state', 'runtime',
 
             # base class functions
             '_scope', '_function_ctx', 'default_address', 'initialize_keys_for', 'use_config_from_manifest', 'create_dummy_accounts',
@@ -84,7 +96,7 @@ class PythonOffchainVisitor(PythonCodeVisitor):
             # Globals
             'os', 'IntEnum', 'Dict', 'List', 'Tuple', 'Optional', 'Union', 'Any',
             'my_logging', 'CipherValue', 'AddressValue', 'RandomnessValue', 'PublicKeyValue',
-            'ContractSimulator', 'RequireException', 'help', 'annotations'
+            'ContractSimulator', 'RequireException', 'PrivateValuesDict', 'help', 'annotations'
         ]})
 
     def _get_type_constr(self, t: TypeName):
@@ -116,6 +128,7 @@ class PythonOffchainVisitor(PythonCodeVisitor):
             return a, p
 
     def visitSourceUnit(self, ast: SourceUnit):
+        self.contract_names = {c.idf.name for c in ast.contracts}
         contracts = self.visit_list(ast.contracts)
         is_payable = ast.contracts[0].constructor_definitions and ast.contracts[0].constructor_definitions[0].is_payable
         val_param = ', wei_amount=0' if is_payable else ''
@@ -138,7 +151,7 @@ class PythonOffchainVisitor(PythonCodeVisitor):
 
         from zkay import my_logging
         from zkay.transaction.types import CipherValue, AddressValue, RandomnessValue, PublicKeyValue
-        from zkay.transaction.offchain import {SCALAR_FIELD_NAME}, ContractSimulator, RequireException
+        from zkay.transaction.offchain import {SCALAR_FIELD_NAME}, ContractSimulator, RequireException, PrivateValuesDict
         from zkay.transaction.int_casts import *
 
         me = None
@@ -197,7 +210,7 @@ class PythonOffchainVisitor(PythonCodeVisitor):
             deploy_cmd = f'c.constructor({c_args}{val_arg})'
 
         sv_constr = []
-        for svd in [sv for sv in ast.state_variable_declarations if isinstance(sv, StateVariableDeclaration) and not sv.idf.name.startswith(cfg.reserved_name_prefix)]:
+        for svd in self.get_simulated_state_vars(ast):
             t = svd.annotated_type.type_name
             while not isinstance(t, CipherText) and hasattr(t, 'value_type'):
                 t = t.value_type.type_name
@@ -205,7 +218,7 @@ class PythonOffchainVisitor(PythonCodeVisitor):
                 constr = f', {self._get_type_constr(t.plain_type.type_name)}, cipher=True'
             else:
                 constr = f', {self._get_type_constr(t)}'
-            sv_constr.append(f'self.state.decl("{svd.idf.name}"{constr})')
+            sv_constr.append(f'self.state.decl("{svd.idf.name}"{constr})  # id {self.state_var_ids[svd.idf.name]}')
 
         mf = MultiLineFormatter() * \
             'def __init__(self, project_dir: str, user_addr: AddressValue):' /\
@@ -229,6 +242,12 @@ class PythonOffchainVisitor(PythonCodeVisitor):
             '''
         return indent(f'{mf}\n')
 
+    @staticmethod
+    def get_simulated_state_vars(ast: ContractDefinition) -> List[StateVariableDeclaration]:
+        """Return all state variables of contract ast which are accessed via the StateDict, in declaration order."""
+        return [sv for sv in ast.state_variable_declarations
+                if isinstance(sv, StateVariableDeclaration) and not sv.idf.name.startswith(cfg.reserved_name_prefix)]
+
     @staticmethod
     def is_special_var(idf: Identifier):
         return idf.name.startswith(cfg.reserved_name_prefix) or idf.name in ['msg', 'block', 'tx', '_tmp_key', 'now']
@@ -261,17 +280,23 @@ class PythonOffchainVisitor(PythonCodeVisitor):
             return self.get_loc_value(idf.idf, indices)
         elif isinstance(idf.target, StateVariableDeclaration):
             # If a state variable appears as an rvalue, the value may need to be requested from the blockchain
+            # (StateDict ids are assigned in declaration order)
             indices = f', {", ".join(indices)}' if indices else ''
-            return f'self.state["{idf.idf.name}"{indices}]'
+            return f'self.state[{self.state_var_ids[idf.idf.name]}{indices}]'
         else:
             name = idf.idf
             if isinstance(idf.target, VariableDeclaration) and not self.inside_circuit:
-                # Local variables are stored in locals dict
-                name = Identifier(f'self.locals["{idf.idf.name}"]')
+                if self.local_names is not None:
+                    # Local variables are python locals with unique names
+                    name = Identifier(self.local_names[id(idf.target)])
+                else:
+                    # Local variables are stored in locals dict
+                    name = Identifier(f'self.locals["{idf.idf.name}"]')
             return self.get_loc_value(name, indices)
 
     def visitContractDefinition(self, ast: ContractDefinition):
         """Generate a python class with methods for each function and constructor definition and nested classes for each enum definition."""
+        self.state_var_ids = {svd.idf.name: idx for idx, svd in enumerate(self.get_simulated_state_vars(ast))}
         enums = self.visit_list(ast.enum_definitions, '\n\n')
         constr = self.visit_list(ast.constructor_definitions, '\n\n')
         fcts = self.visit_list(ast.function_definitions, '\n\n')
@@ -283,7 +308,42 @@ class PythonOffchainVisitor(PythonCodeVisitor):
 
     def visitConstructorOrFunctionDefinition(self, ast: ConstructorOrFunctionDefinition):
         with self.circuit_ctx(ast):
-            return super().visitConstructorOrFunctionDefinition(ast)
+            self.local_names = self.get_native_local_names(ast) if cfg.opt_native_offchain_locals else None
+            ret = super().visitConstructorOrFunctionDefinition(ast)
+            self.local_names = None
+            return ret
+
+    def get_native_local_names(self, ast: ConstructorOrFunctionDefinition) -> Dict[int, str]:
+        """
+        Assign a python identifier to every local variable declared in the body of ast.
+
+        Python does not have block scopes, thus every declaration gets a name which is unique within the function
+        (the original name if possible, otherwise the original name with a numeric suffix).
+        Names of parameters, of python builtins and of all other identifiers which are used by the generated
+        function code are never used.
+
+        :return: dictionary which maps the id of each VariableDeclaration to its python identifier
+        """
+        collector = _LocalDeclarationCollector()
+        collector.visit(ast.body)
+        decls = [decl for decl in collector.decls if not self.is_special_var(decl.idf)]
+
+        reserved = set(self._get_forbidden_words) | set(dir(builtins)) | self.contract_names
+        reserved.update([self.visit(p.idf) for p in ast.parameters])
+        reserved.update(['msg', 'block', 'tx', 'now', 'actual_params', 'proof', SCALAR_FIELD_NAME])
+        original_names = {decl.idf.name for decl in decls}
+
+        names, used = {}, set()
+        for decl in decls:
+            name = decl.idf.name
+            if name in reserved or name in used:
+                suffix = 1
+                while f'{name}_{suffix}' in reserved or f'{name}_{suffix}' in original_names or f'{name}_{suffix}' in used:
+                    suffix += 1
+                name = f'{name}_{suffix}'
+            names[id(decl)] = name
+            used.add(name)
+        return names
 
     def visitParameter(self, ast: Parameter):
         if ast.parent.is_external:
@@ -356,7 +416,13 @@ class PythonOffchainVisitor(PythonCodeVisitor):
 
         if circuit and circuit.sec_idfs:
             priv_struct = StructDefinition(None, [VariableDeclaration([], AnnotatedTypeName(sec_idf.t), sec_idf) for sec_idf in circuit.sec_idfs])
-            preamble_str += f'\n{PRIV_VALUES_NAME}: Dict[str, Any] = {self.get_default_value(StructTypeName([], priv_struct))}\n'
+            preamble_str += f'\n{PRIV_VALUES_NAME}: Dict[str, Any] = PrivateValuesDict({self.get_default_value(StructTypeName([], priv_struct))})\n'
+
+        prefetch_locs = self.get_prefetchable_state_locations(ast)
+        if prefetch_locs:
+            # Request all statically known state locations which are read during the transaction at once
+            prefetch_str = f'self.state.prefetch([{", ".join(prefetch_locs)}])'
+            preamble_str += f'\n{self.do_if_external(ast, [prefetch_str])}\n'
 
         all_params = ', '.join([f'{self.visit(param.idf)}' for param in self.current_params])
         if ast.can_be_external:
@@ -412,8 +478,11 @@ class PythonOffchainVisitor(PythonCodeVisitor):
         if circuit is not None:
             if circuit.output_idfs:
                 out_elemwidths = ', '.join([str(out.t.elem_bitwidth) if out.t.is_primitive_type() else '0' for out in circuit.output_idfs])
+                out_packing = ''
+                if cfg.opt_pack_circuit_io:
+                    out_packing = ', [' + ', '.join([f'({out.io_offset}, {out.packed_bit_offset})' for out in circuit.output_idfs]) + ']'
                 serialize_str += f'\n{cfg.zk_out_name}[{cfg.zk_out_name}_start_idx:{cfg.zk_out_name}_start_idx + {circuit.out_size}] = ' \
-                                 f'{api("serialize_circuit_outputs")}(zk__data, [{out_elemwidths}])'
+                                 f'{api("serialize_circuit_outputs")}(zk__data, [{out_elemwidths}]{out_packing})'
             if circuit.sec_idfs:
                 sec_elemwidths = ', '.join([str(sec.t.elem_bitwidth) if sec.t.is_primitive_type() else '0' for sec in circuit.sec_idfs])
                 serialize_str += f'\n{api("serialize_private_inputs")}({PRIV_VALUES_NAME}, [{sec_elemwidths}])'
@@ -487,6 +556,42 @@ class PythonOffchainVisitor(PythonCodeVisitor):
             func_ctx_params.append(f'name={fname}')
         return f'with self._function_ctx({", ".join(func_ctx_params)}) as {IS_EXTERNAL_CALL}:\n' + indent(code)
 
+    def get_prefetchable_state_locations(self, ast: ConstructorOrFunctionDefinition) -> List[str]:
+        """
+        Return python code for the keys of all state locations whose values may be read when ast is called externally and whose
+        location is known at the beginning of the transaction.
+
+        This includes all state variables of primitive type and all mapping entries with a constant key or with key me
+        (read values of transitively called functions are included as well).
+
+        :param ast: function which is called externally
+        :return: sorted list of python tuple expressions which correspond to StateDict keys
+        """
+        if ast.is_constructor:
+            # State is not yet available on the chain
+            return []
+
+        read_values = set(ast.read_values)
+        for fct in ast.called_functions:
+            read_values.update(fct.read_values)
+
+        locs = set()
+        for val in read_values:
+            if not isinstance(val.target, StateVariableDeclaration) or val.target.idf.name not in self.state_var_ids:
+                continue
+            var_id = self.state_var_ids[val.target.idf.name]
+            t = val.target.annotated_type.type_name
+            if val.key is None:
+                if not isinstance(t, (Mapping, Array)):
+                    locs.add(f'({var_id}, )')
+            elif isinstance(t, Mapping) and not isinstance(t.value_type.type_name, (Mapping, Array)):
+                if isinstance(val.key, MeExpr):
+                    locs.add(f'({var_id}, msg.sender)')
+                elif isinstance(val.key, NumberLiteralExpr) and isinstance(t.key_type, NumberTypeName) \
+                        or isinstance(val.key, BooleanLiteralExpr) and isinstance(t.key_type, BoolTypeName):
+                    locs.add(f'({var_id}, {val.key.value})')
+        return sorted(locs)
+
     def visitStatementList(self, ast: StatementList):
         if ast.excluded_from_simulation:
             return None
@@ -494,8 +599,11 @@ class PythonOffchainVisitor(PythonCodeVisitor):
             return super().visitStatementList(ast)
 
     def visitBlock(self, ast: Block):
-        # Introduce a new virtual local scope when visiting a block
         ret = super().visitBlock(ast)
+        if self.local_names is not None:
+            # Scoping is already resolved at compile time
+            return ret
+        # Introduce a new virtual local scope when visiting a block
         return f'with self._scope():\n{indent(ret)}'
 
     def visitReturnStatement(self, ast: ReturnStatement):
@@ -517,7 +625,7 @@ class PythonOffchainVisitor(PythonCodeVisitor):
         if in_idf.corresponding_priv_expression is not None:
             plain_idf_name = self.get_priv_value(in_idf.corresponding_priv_expression.idf.name)
             constr = self._get_type_constr(in_idf.t.plain_type.type_name)
-            dec_call = f'{api("dec")}({self.visit(in_idf.get_loc_expr())}, {constr})'
+            dec_call = f'{api("dec_lazy")}({self.visit(in_idf.get_loc_expr())}, {constr})'
             if cfg.is_symmetric_cipher():
                 in_decrypt += f'\n{plain_idf_name}, _ = {dec_call}'
             else:
@@ -685,6 +793,8 @@ class PythonOffchainVisitor(PythonCodeVisitor):
         else:
             s = ast.variable_declaration.idf.name
             e = self.handle_var_decl_expr(ast)
+            if self.local_names is not None:
+                return f'{self.local_names[id(ast.variable_declaration)]} = {e}'
             return f'self.locals.decl("{s}", {e})'
 
     def handle_var_decl_expr(self, ast: VariableDeclarationStatement) -> str:
@@ -743,3 +853,14 @@ class PythonOffchainVisitor(PythonCodeVisitor):
         assert self.inside_circuit
         self.inside_circuit = False
         self.flatten_hybrid_args = old_fp
+
+
+class _LocalDeclarationCollector(AstVisitor):
+    """Collect all variable declarations in a function body, in order of appearance."""
+
+    def __init__(self):
+        super().__init__('node-or-children')
+        self.decls: List[VariableDeclaration] = []
+
+    def visitVariableDeclaration(self, ast: VariableDeclaration):
+        self.decls.append(ast)
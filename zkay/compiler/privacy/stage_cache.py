@@ -0,0 +1,183 @@
+"""
+This module implements a content-addressed on-disk cache for the intermediate results of compile_zkay.
+
+Every compilation stage whose result only depends on the zkay source code and the compiler configuration
+(type-checked AST, transformed AST + abstract circuits, generated solidity and offchain simulation code) stores
+its result under a key which is derived from:
+
+* the zkay source code
+* the zkay version and the state of the zkay compiler sources and bundled resources (so that cached ASTs are never used
+  with different classes)
+* the solc version and all compiler settings which affect the compilation output
+
+When the same code is compiled again with the same configuration, all cached stages are skipped.
+Entries are stored as individual pickle files in cfg.data_dir/stage_cache.
+Since unpickling can execute arbitrary code, the cache directory is created private to the current user and entries
+are only loaded if neither the directory nor the entry could have been written by another user.
+When the total cache size exceeds cfg.stage_cache_size, the least recently used entries are evicted.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import stat
+import tempfile
+from typing import Optional, Any, Callable, TypeVar
+
+from zkay.config import cfg
+
+T = TypeVar('T')
+
+# Settings which are not part of the exported compiler settings, but affect the generated code
+_codegen_settings = ['indentation']
+
+_compiler_fingerprint: Optional[str] = None
+
+
+def get_cache_dir() -> str:
+    return os.path.join(cfg.data_dir, 'stage_cache')
+
+
+def is_enabled() -> bool:
+    return cfg.stage_cache_size > 0
+
+
+def get_key(code: str) -> str:
+    """Return the cache key for compiling code with the current configuration."""
+    key_data = {
+        'code': code,
+        'zkay-version': cfg.zkay_version,
+        'compiler': _get_compiler_fingerprint(),
+        'solc-version': cfg.solc_version,
+        'settings': cfg.export_compiler_settings(),
+        'codegen-settings': {name: getattr(cfg, name) for name in _codegen_settings},
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+
+def lookup(key: str, stage: str) -> Optional[Any]:
+    """
+    Return the cached result of stage for key.
+
+    :param key: cache key (see get_key)
+    :param stage: name of the compilation stage
+    :return: the stage result or None if there is no (valid) entry
+    """
+    filename = os.path.join(get_cache_dir(), f'{key}.{stage}.pickle')
+    try:
+        with open(filename, 'rb') as f:
+            if not _is_private(get_cache_dir()) or not _is_private(f.fileno()):
+                return None
+            result = pickle.load(f)
+        # Mark entry as recently used
+        os.utime(filename)
+        return result
+    except Exception:
+        # Missing or corrupt entry
+        return None
+
+
+def store(key: str, stage: str, result: Any):
+    """
+    Add the result of stage for key to the cache and evict old entries if the cache grew too large.
+
+    Failures to write to the cache (including results which cannot be pickled) are silently ignored,
+    since the cache is only an optimization.
+    """
+    cache_dir = get_cache_dir()
+    try:
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        if not _is_private(cache_dir):
+            return
+        fd, tmp_filename = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_filename, os.path.join(cache_dir, f'{key}.{stage}.pickle'))
+        evict(cfg.stage_cache_size * 1024 * 1024)
+    except Exception:
+        pass
+
+
+def cached(key: Optional[str], stage: str, compute: Callable[[], T]) -> T:
+    """
+    Return the cached result of stage for key, or compute and cache it if there is none.
+
+    :param key: cache key (see get_key), if None, the cache is bypassed
+    :param stage: name of the compilation stage
+    :param compute: function which computes the stage result (must not return None)
+    :return: the stage result
+    """
+    if key is not None:
+        result = lookup(key, stage)
+        if result is not None:
+            return result
+    result = compute()
+    if key is not None:
+        store(key, stage, result)
+    return result
+
+
+def evict(max_size: int):
+    """Remove least recently used entries until the total size of all entries is at most max_size bytes."""
+    cache_dir = get_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.pickle'):
+            try:
+                st = os.stat(os.path.join(cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+
+    total_size = sum(e[1] for e in entries)
+    for _, size, name in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            pass
+        total_size -= size
+
+
+def clear():
+    """Remove all cache entries."""
+    evict(0)
+
+
+def _is_private(path) -> bool:
+    """Return true if path (file name or descriptor) is owned by the current user and not writable by anyone else."""
+    if not hasattr(os, 'getuid'):
+        return True
+    st = os.stat(path)
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _get_compiler_fingerprint() -> str:
+    """
+    Return a digest of the zkay compiler files.
+
+    Python sources are identified by their names, sizes and modification times, all other files (e.g. solidity templates
+    and the jsnark jar) by their contents.
+    """
+    global _compiler_fingerprint
+    if _compiler_fingerprint is None:
+        zkay_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(zkay_dir):
+            dirs[:] = sorted(d for d in dirs if d not in ['tests', '__pycache__'])
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if name.endswith('.py'):
+                    st = os.stat(path)
+                    h.update(f'{os.path.relpath(path, zkay_dir)}:{st.st_size}:{st.st_mtime_ns};'.encode())
+                elif not name.endswith('.pyc'):
+                    with open(path, 'rb') as f:
+                        h.update(f'{os.path.relpath(path, zkay_dir)}:{hashlib.sha256(f.read()).hexdigest()};'.encode())
+        _compiler_fingerprint = h.hexdigest()
+    return _compiler_fingerprint
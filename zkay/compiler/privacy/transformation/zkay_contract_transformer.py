@@ -343,14 +343,12 @@ class ZkayTransformer(AstTransformerVisitor):
 
         # Deserialize out array (if any)
         deserialize_stmts = []
-        offset = 0
         for s in circuit.output_idfs:
-            deserialize_stmts.append(s.deserialize(cfg.zk_out_name, out_start_idx, offset))
+            deserialize_stmts.append(s.deserialize(cfg.zk_out_name, out_start_idx, s.io_offset))
             if isinstance(s.t, CipherText) and cfg.is_symmetric_cipher():
                 # Assign sender field to user-encrypted values if necessary
                 sender_key = in_var.index(0)
                 deserialize_stmts.append(s.get_loc_expr().index(cfg.cipher_payload_len).assign(sender_key))
-            offset += s.t.size_in_uints
         if deserialize_stmts:
             stmts.append(StatementList(Comment.comment_wrap_block("Deserialize output values", deserialize_stmts), excluded_from_simulation=True))
 
@@ -359,11 +357,9 @@ class ZkayTransformer(AstTransformerVisitor):
 
         # Serialize in parameters to in array (if any)
         serialize_stmts = []
-        offset = 0
         for s in circuit.input_idfs:
-            serialize_stmts += [s.serialize(cfg.zk_in_name, in_start_idx, offset)]
-            offset += s.t.size_in_uints
-        if offset:
+            serialize_stmts += [s.serialize(cfg.zk_in_name, in_start_idx, s.io_offset)]
+        if serialize_stmts:
             stmts.append(Comment())
             stmts += Comment.comment_wrap_block('Serialize input values', serialize_stmts)
 
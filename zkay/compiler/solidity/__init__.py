@@ -5,5 +5,6 @@ This package deals with solidity/solc compilation.
 Submodules
 ==========
 * :py:mod:`.compiler`: Type-check or compile solidity code (uses standard_json interface internally).
+* :py:mod:`.solc_cache`: Content-addressed on-disk cache for solc compilation outputs.
 * :py:mod:`.fake_solidity_generator`: Strip privacy features from zkay in a source-code location preserving way, so that type-checking/analysis can be performed with tools designed for solidity code.
 """
\ No newline at end of file
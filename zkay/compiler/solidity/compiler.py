@@ -1,14 +1,19 @@
+import hashlib
 import json
 import os
 import pathlib
+import re
 import tempfile
 # get relevant paths
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, Tuple, List, Any
 
+from semantic_version import Version
 from solcx import compile_standard
 from solcx.exceptions import SolcError
 
+from zkay.compiler.solidity import solc_cache
 from zkay.config import zk_print, cfg
+from zkay.utils.parallel import parallel_map
 from zkay.zkay_ast.ast import get_code_error_msg
 
 
@@ -17,20 +22,125 @@ class SolcException(Exception):
     pass
 
 
+_IMPORT_PATTERN = re.compile(r'import\s+(?:[^"\';]*\s+from\s+)?["\']([^"\']+)["\']')
+
+
+def get_imported_source_files(sol_filename: str, import_dir: Optional[str] = None) -> List[str]:
+    """
+    Return the absolute paths of sol_filename and of all local files which it (transitively) imports.
+
+    Imports which cannot be resolved to an existing file are ignored (solc will report those).
+
+    :param sol_filename: path to solidity file
+    :param import_dir: [OPTIONAL] directory relative to which the imports of sol_filename are resolved \
+                       (defaults to the directory containing sol_filename)
+    :return: list of absolute paths in discovery order, starting with sol_filename
+    """
+    files = [os.path.abspath(sol_filename)]
+    seen = set(files)
+    for filename in files:
+        with open(filename) as f:
+            code = f.read()
+        base_dir = os.path.abspath(import_dir) if import_dir is not None and filename == files[0] else os.path.dirname(filename)
+        for imported in _IMPORT_PATTERN.findall(code):
+            path = os.path.normpath(os.path.join(base_dir, imported))
+            if path not in seen and os.path.isfile(path):
+                seen.add(path)
+                files.append(path)
+    return files
+
+
+def get_source_digest(sol_filename: str, import_dir: Optional[str] = None) -> str:
+    """
+    Compute a digest over the contents of sol_filename and all local files which it (transitively) imports.
+
+    :param sol_filename: path to solidity file
+    :param import_dir: [OPTIONAL] directory relative to which the imports of sol_filename are resolved
+    :return: hex digest which changes whenever any of the involved source files changes
+    """
+    digest = hashlib.sha256()
+    base_dir = os.path.dirname(os.path.abspath(sol_filename)) if import_dir is None else os.path.abspath(import_dir)
+    for idx, filename in enumerate(get_imported_source_files(sol_filename, import_dir)):
+        with open(filename, 'rb') as f:
+            # Main file is identified by position, imports by their path relative to the import directory
+            rel_name = '' if idx == 0 else os.path.relpath(filename, base_dir)
+            digest.update(rel_name.encode())
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
 def compile_solidity_json(sol_filename: str, libs: Optional[Dict[str, str]] = None, optimizer_runs: int = -1,
                           output_selection: Tuple = ('metadata', 'evm.bytecode', 'evm.deployedBytecode'),
-                          cwd: str = None) -> Dict:
+                          cwd: str = None, solc_version: Optional[str] = None) -> Dict:
     """
     Compile the given solidity file using solc json interface with the provided options.
 
+    Successful compilation outputs are cached on disk, keyed by the compiler input, the contents of all involved
+    source files and the solc version (see :py:mod:`.solc_cache`).
+
     :param sol_filename: path to solidity file
     :param libs: [OPTIONAL] dictionary containing <LibraryContractName, LibraryContractAddress> pairs, used for linking
     :param optimizer_runs: controls the optimize-runs flag, negative values disable the optimizer
     :param output_selection: determines which fields are included in the compiler output dict
-    :param cwd: working directory
+    :param cwd: directory relative to which imports are resolved (solc base path), defaults to the directory of sol_filename
+    :param solc_version: solc version to use (same format as cfg.solc_version), defaults to cfg.solc_version
     :return: dictionary with the compilation results according to output_selection
     """
     solp = pathlib.Path(sol_filename)
+    json_in = _get_standard_json_input([solp], optimizer_runs, output_selection)
+
+    if libs is not None:
+        json_in['settings']['libraries'] = {
+            solp.name: libs
+        }
+
+    if cwd is None:
+        cwd = solp.absolute().parent
+    return _compile_standard_json(json_in, [sol_filename], cwd, solc_version)
+
+
+def compile_solidity_json_parallel(jobs: List[Dict[str, Any]], max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    Run multiple compile_solidity_json invocations concurrently (each solc invocation runs in a separate process).
+
+    The solc version is determined once by the calling thread, the workers do not access the configuration.
+
+    :param jobs: list of keyword argument dicts for :py:func:`compile_solidity_json`
+    :param max_workers: maximum number of concurrent solc processes (None -> default thread pool size)
+    :raise SolcError: if any of the compilations fails
+    :return: list with the compilation results, in the same order as jobs
+    """
+    jobs = [{'solc_version': cfg.solc_version, **job} for job in jobs]
+    return parallel_map(lambda job: compile_solidity_json(**job), jobs, max_workers)
+
+
+def compile_solidity_files_json(sol_filenames: List[str], optimizer_runs: int = -1,
+                                output_selection: Tuple = ('metadata', 'evm.bytecode', 'evm.deployedBytecode'),
+                                cwd: str = None, solc_version: Optional[str] = None) -> Dict:
+    """
+    Compile multiple solidity files using a single solc standard json invocation.
+
+    Each file becomes a separate source unit, named after its filename (which must thus be unique).
+    The output is cached in the same way as for :py:func:`compile_solidity_json`.
+
+    :param sol_filenames: paths to solidity files
+    :param optimizer_runs: controls the optimize-runs flag, negative values disable the optimizer
+    :param output_selection: determines which fields are included in the compiler output dict
+    :param cwd: directory relative to which imports are resolved (defaults to the directory containing the first file)
+    :param solc_version: solc version to use (same format as cfg.solc_version), defaults to cfg.solc_version
+    :return: dictionary with the compilation results according to output_selection
+    """
+    paths = [pathlib.Path(f) for f in sol_filenames]
+    if len({p.name for p in paths}) != len(paths):
+        raise ValueError('Source files must have unique filenames')
+    json_in = _get_standard_json_input(paths, optimizer_runs, output_selection)
+
+    if cwd is None:
+        cwd = paths[0].absolute().parent
+    return _compile_standard_json(json_in, sol_filenames, cwd, solc_version)
+
+
+def _get_standard_json_input(sol_paths: List[pathlib.Path], optimizer_runs: int, output_selection: Tuple) -> Dict:
     json_in = {
         'language': 'Solidity',
         'sources': {
@@ -38,7 +148,7 @@ def compile_solidity_json(sol_filename: str, libs: Optional[Dict[str, str]] = No
                 'urls': [
                     str(solp.absolute())
                 ]
-            }
+            } for solp in sol_paths
         },
         'settings': {
             'outputSelection': {
@@ -52,21 +162,44 @@ def compile_solidity_json(sol_filename: str, libs: Optional[Dict[str, str]] = No
             'enabled': True,
             'runs': optimizer_runs
         }
+    return json_in
 
-    if libs is not None:
-        json_in['settings']['libraries'] = {
-            solp.name: libs
-        }
 
-    if cwd is None:
-        cwd = solp.absolute().parent
-    old_cwd = os.getcwd()
-    os.chdir(cwd)
-    ret = compile_standard(json_in, allow_paths='.')
-    os.chdir(old_cwd)
+def _compile_standard_json(json_in: Dict, sol_filenames: List[str], cwd, solc_version: Optional[str]) -> Dict:
+    if solc_version is None:
+        solc_version = cfg.solc_version
+
+    cache_key = None
+    if solc_cache.is_enabled():
+        cache_key = _get_cache_key(json_in, sol_filenames, cwd, solc_version)
+        ret = solc_cache.lookup(cache_key)
+        if ret is not None:
+            return ret
+
+    # Imports are resolved relative to the base path, this does not depend on the process working directory
+    # and is thus safe to use from multiple threads
+    base_path = str(pathlib.Path(cwd).absolute())
+    allow_paths = sorted({base_path} | {str(pathlib.Path(f).absolute().parent) for f in sol_filenames})
+    ret = compile_standard(json_in, base_path=base_path, allow_paths=allow_paths,
+                           solc_version=Version(solc_version.lstrip('v')))
+
+    if cache_key is not None:
+        solc_cache.store(cache_key, ret)
     return ret
 
 
+def _get_cache_key(json_in: Dict, sol_filenames: List[str], import_dir: str, solc_version: str) -> str:
+    # Source locations are irrelevant for the output, only the contents matter
+    key_json = dict(json_in)
+    key_json['sources'] = {name: {} for name in json_in['sources']}
+    key_data = json.dumps({
+        'input': key_json,
+        'sources': [get_source_digest(f, str(import_dir)) for f in sol_filenames],
+        'solc': solc_version,
+    }, sort_keys=True)
+    return hashlib.sha256(key_data.encode()).hexdigest()
+
+
 def _get_line_col(code: str, idx: int):
     """ Get line and column (1-based) from character index """
     line = len(code[:idx + 1].splitlines())
@@ -95,7 +228,6 @@ def check_compilation(filename: str, show_errors: bool = False, display_code: st
         code = f.read()
     display_code = code if display_code is None else display_code
 
-    had_error = False
     try:
         errors = compile_solidity_json(filename, None, -1, ())
         if not show_errors:
@@ -108,34 +240,91 @@ def check_compilation(filename: str, show_errors: bool = False, display_code: st
     # if solc reported any errors or warnings, print them and throw exception
     if 'errors' in errors:
         zk_print()
-        errors = sorted(errors['errors'], key=get_error_order_key)
-
-        fatal_error_report = ''
-        for error in errors:
-            from zkay.utils.progress_printer import colored_print, TermColor
-            is_error = error['severity'] == 'error'
-
-            with colored_print(TermColor.FAIL if is_error else TermColor.WARNING):
-                if 'sourceLocation' in error:
-                    file = error['sourceLocation']['file']
-                    if file == sol_name:
-                        line, column = _get_line_col(code, error['sourceLocation']['start'])
-                        report = f'{get_code_error_msg(line, column + 1, str(display_code).splitlines())}\n'
-                        had_error |= is_error
-                    else:
-                        report = f"In imported file '{file}' idx: {error['sourceLocation']['start']}\n"
-                report = f'\n{error["severity"].upper()}: {error["type"] if is_error else ""}\n{report}\n{error["message"]}\n'
-
-                if is_error:
-                    fatal_error_report += report
-                elif 'errorCode' not in error or error['errorCode'] not in ['1878']:  # Suppress SPDX license warning
-                    zk_print(report)
-
+        fatal_error_report, had_error = _process_errors(errors['errors'], {sol_name: (code, display_code)}, show_errors)
         zk_print()
         if had_error:
             raise SolcException(fatal_error_report)
 
 
+def check_compilations(filenames: List[str], show_errors: bool = False):
+    """
+    Run the given files through a single solc invocation without output to check for compiler errors.
+
+    :param filenames: files to dry-compile, must have unique filenames
+    :param show_errors: if true, errors and warnings are printed
+    :raise SolcException: raised if solc reports a compiler error, the message contains the errors of all files
+    """
+    if not filenames:
+        return
+
+    sources = {}
+    for filename in filenames:
+        with open(filename) as f:
+            code = f.read()
+        sources[pathlib.Path(filename).name] = (code, code)
+
+    failed = False
+    try:
+        errors = compile_solidity_files_json(filenames, -1, ())
+        if not show_errors:
+            return
+    except SolcError as e:
+        errors = json.loads(e.stdout_data)
+        failed = True
+
+    fatal_error_report = ''
+    if 'errors' in errors:
+        if show_errors:
+            zk_print()
+        fatal_error_report, _ = _process_errors(errors['errors'], sources, show_errors)
+        if show_errors:
+            zk_print()
+    if failed:
+        raise SolcException(fatal_error_report)
+
+
+def _process_errors(errors: List[Dict], sources: Dict[str, Tuple[str, str]], show_errors: bool) -> Tuple[str, bool]:
+    """
+    Format solc errors in the context of the corresponding source files and print warnings if requested.
+
+    :param errors: error list from the solc json output
+    :param sources: dictionary which maps source unit names to (code, display_code) tuples
+    :param show_errors: if true, warnings are printed
+    :return: (report of all fatal errors, true if any fatal error is located in one of the sources)
+    """
+    from zkay.utils.progress_printer import colored_print, TermColor
+
+    # Group errors by file and order them by source location
+    errors = sorted(errors, key=lambda err: (err['sourceLocation']['file'] if 'sourceLocation' in err else '',
+                                             get_error_order_key(err)))
+
+    had_error = False
+    fatal_error_report = ''
+    for error in errors:
+        is_error = error['severity'] == 'error'
+
+        with colored_print(TermColor.FAIL if is_error else TermColor.WARNING):
+            report = ''
+            if 'sourceLocation' in error:
+                file = error['sourceLocation']['file']
+                if file in sources:
+                    code, display_code = sources[file]
+                    line, column = _get_line_col(code, error['sourceLocation']['start'])
+                    report = f'{get_code_error_msg(line, column + 1, str(display_code).splitlines())}\n'
+                    if len(sources) > 1:
+                        report = f"In file '{file}':\n{report}"
+                    had_error |= is_error
+                else:
+                    report = f"In imported file '{file}' idx: {error['sourceLocation']['start']}\n"
+            report = f'\n{error["severity"].upper()}: {error["type"] if is_error else ""}\n{report}\n{error["message"]}\n'
+
+            if is_error:
+                fatal_error_report += report
+            elif show_errors and ('errorCode' not in error or error['errorCode'] not in ['1878']):  # Suppress SPDX license warning
+                zk_print(report)
+    return fatal_error_report, had_error
+
+
 def check_for_zkay_solc_errors(zkay_code: str, fake_solidity_code: str):
     """
     Run fake solidity code (stripped privacy features) through solc and report errors in the context of the original zkay code.
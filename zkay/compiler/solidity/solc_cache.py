@@ -0,0 +1,92 @@
+"""
+This module implements a content-addressed on-disk cache for solc standard-json compilation outputs.
+
+Entries are stored as individual json files in cfg.data_dir/solc_cache, named after a digest of the
+compiler input (see :py:func:`.compiler.compile_solidity_json`).
+When the total cache size exceeds cfg.solc_cache_size, the least recently used entries are evicted.
+"""
+
+import json
+import os
+import tempfile
+from typing import Optional, Dict
+
+from zkay.config import cfg
+
+
+def get_cache_dir() -> str:
+    return os.path.join(cfg.data_dir, 'solc_cache')
+
+
+def is_enabled() -> bool:
+    return cfg.solc_cache_size > 0
+
+
+def lookup(key: str) -> Optional[Dict]:
+    """
+    Return the cached compiler output for key.
+
+    :param key: digest of the compiler input
+    :return: the compiler output dict or None if there is no (valid) entry for key
+    """
+    filename = os.path.join(get_cache_dir(), f'{key}.json')
+    try:
+        with open(filename) as f:
+            output = json.load(f)
+        # Mark entry as recently used
+        os.utime(filename)
+        return output
+    except (OSError, ValueError):
+        return None
+
+
+def store(key: str, output: Dict):
+    """
+    Add the compiler output for key to the cache and evict old entries if the cache grew too large.
+
+    Failures to write to the cache are silently ignored, since the cache is only an optimization.
+
+    :param key: digest of the compiler input
+    :param output: compiler output dict
+    """
+    cache_dir = get_cache_dir()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_filename = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(output, f)
+        os.replace(tmp_filename, os.path.join(cache_dir, f'{key}.json'))
+        evict(cfg.solc_cache_size * 1024 * 1024)
+    except OSError:
+        pass
+
+
+def evict(max_size: int):
+    """Remove least recently used entries until the total size of all entries is at most max_size bytes."""
+    cache_dir = get_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.json'):
+            try:
+                st = os.stat(os.path.join(cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+
+    total_size = sum(e[1] for e in entries)
+    for _, size, name in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            pass
+        total_size -= size
+
+
+def clear():
+    """Remove all cache entries."""
+    evict(0)
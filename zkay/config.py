@@ -1,6 +1,7 @@
 import json
 import math
 import os
+import threading
 from contextlib import contextmanager
 from typing import Dict, Any, ContextManager, List
 
@@ -31,12 +32,23 @@ class Config(UserConfig):
         self._options_with_effect_on_circuit_output = [
             'proving_scheme', 'snark_backend', 'crypto_backend',
             'opt_solc_optimizer_runs', 'opt_hash_threshold',
-            'opt_eval_constexpr_in_circuit', 'opt_cache_circuit_inputs', 'opt_cache_circuit_outputs',
+            'opt_eval_constexpr_in_circuit', 'opt_cache_circuit_inputs', 'opt_cache_circuit_outputs', 'opt_circuit_constraints',
+            'opt_pack_circuit_io', 'opt_native_offchain_locals',
         ]
 
+        # Values of options which were introduced later, corresponding to the behavior of older zkay versions
+        self._legacy_compiler_settings = {
+            'opt_circuit_constraints': False,
+            'opt_pack_circuit_io': False,
+            'opt_native_offchain_locals': False,
+        }
+
         self._is_unit_test = False
         self._concrete_solc_version = None
 
+        # Per-thread solc settings overrides (see library_compilation_environment)
+        self._solc_overrides = threading.local()
+
     def _load_cfg_file_if_exists(self, filename):
         if os.path.exists(filename):
             with open(filename) as conf:
@@ -75,20 +87,43 @@ class Config(UserConfig):
         return out
 
     def import_compiler_settings(self, vals: dict):
+        """
+        Import settings which were exported with export_compiler_settings.
+
+        Options which are missing in vals (e.g. in manifests of older zkay versions) are set to their legacy values,
+        such that the generated circuits match the ones which were originally compiled.
+        """
         for k in vals:
             if k not in self._options_with_effect_on_circuit_output:
                 raise KeyError(f'vals contains unknown option "{k}"')
-            setattr(self, k, vals[k])
+        for k, v in {**self._legacy_compiler_settings, **vals}.items():
+            setattr(self, k, v)
 
     @contextmanager
     def library_compilation_environment(self) -> ContextManager:
-        """Use this fixed configuration compiling libraries to get reproducible output."""
-        old_solc, old_opt_runs = self.solc_version, self.opt_solc_optimizer_runs
-        self.override_solc(self.library_solc_version)
-        self.opt_solc_optimizer_runs = 1000
-        yield
-        self.opt_solc_optimizer_runs = old_opt_runs
-        self.override_solc(old_solc)
+        """
+        Use this fixed configuration compiling libraries to get reproducible output.
+
+        The configuration only applies to the current thread, so concurrent compilations in other threads are not affected.
+        """
+        old_solc = getattr(self._solc_overrides, 'solc_version', None)
+        old_opt_runs = getattr(self._solc_overrides, 'opt_solc_optimizer_runs', None)
+        self._solc_overrides.solc_version = Versions.ensure_solc_version_installed(self.library_solc_version)
+        self._solc_overrides.opt_solc_optimizer_runs = 1000
+        try:
+            yield
+        finally:
+            self._solc_overrides.solc_version = old_solc
+            self._solc_overrides.opt_solc_optimizer_runs = old_opt_runs
+
+    @property
+    def opt_solc_optimizer_runs(self) -> int:
+        runs = getattr(self._solc_overrides, 'opt_solc_optimizer_runs', None)
+        return UserConfig.opt_solc_optimizer_runs.fget(self) if runs is None else runs
+
+    @opt_solc_optimizer_runs.setter
+    def opt_solc_optimizer_runs(self, val: int):
+        UserConfig.opt_solc_optimizer_runs.fset(self, val)
 
     @property
     def library_solc_version(self) -> str:
@@ -107,6 +142,9 @@ class Config(UserConfig):
 
     @property
     def solc_version(self) -> str:
+        version = getattr(self._solc_overrides, 'solc_version', None)
+        if version is not None:
+            return version
         version = Versions.SOLC_VERSION
         assert version is not None and version != 'latest'
         return version
@@ -47,6 +47,11 @@ class UserConfig:
         self._blockchain_pki_address: str = ''
         self._blockchain_crypto_lib_addresses: str = ''
         self._blockchain_default_account: Union[int, str, None] = 0
+        self._blockchain_reverify: bool = False
+        self._blockchain_verification_workers: int = 8
+        self._blockchain_state_mirror: bool = False
+        self._blockchain_state_mirror_sync_interval: int = 1000
+        self._blockchain_prefetch_workers: int = 8
 
         self._indentation: str = ' ' * 4
         self._libsnark_check_verify_locally_during_proof_generation: bool = False
@@ -56,9 +61,19 @@ class UserConfig:
         self._opt_eval_constexpr_in_circuit: bool = True
         self._opt_cache_circuit_inputs: bool = True
         self._opt_cache_circuit_outputs: bool = True
+        self._opt_circuit_constraints: bool = True
+        self._opt_pack_circuit_io: bool = False
+        self._opt_native_offchain_locals: bool = True
 
         self._data_dir: str = self._appdirs.user_data_dir
         self._log_dir: str = self._appdirs.user_log_dir
+        self._solc_cache_size: int = 256
+        self._stage_cache_size: int = 512
+        self._key_store_size: int = 1024
+        self._keygen_memory_budget: int = 0
+        self._circuit_constraint_warning_threshold: int = 1000000
+        self._jsnark_max_heap_size: int = 0
+        self._jsnark_class_data_sharing: bool = True
         self._use_circuit_cache_during_testing_with_encryption: bool = True
         self._verbosity: int = 1
 
@@ -187,6 +202,78 @@ class UserConfig:
         _type_check(val, (int, str, None))
         self._blockchain_default_account = val
 
+    @property
+    def blockchain_reverify(self) -> bool:
+        """
+        If true, cached results of previous contract integrity checks are ignored when connecting to a contract
+        and all contracts and prover keys are verified again from scratch.
+
+        (Successful checks are cached in the data directory, keyed by chain id, contract address, remote bytecode,
+        local sources and compiler settings)
+        """
+        return self._blockchain_reverify
+
+    @blockchain_reverify.setter
+    def blockchain_reverify(self, val: bool):
+        _type_check(val, bool)
+        self._blockchain_reverify = val
+
+    @property
+    def blockchain_verification_workers(self) -> int:
+        """Maximum number of verification contracts whose integrity is checked concurrently when connecting to a contract."""
+        return self._blockchain_verification_workers
+
+    @blockchain_verification_workers.setter
+    def blockchain_verification_workers(self, val: int):
+        _type_check(val, int)
+        if val < 1:
+            raise ValueError('Number of verification workers must be positive')
+        self._blockchain_verification_workers = val
+
+    @property
+    def blockchain_state_mirror(self) -> bool:
+        """
+        If true, state variable reads of the offchain simulation are served from a local mirror of the contract state,
+        which is kept consistent with a specific block height, instead of requesting every value from the blockchain node.
+
+        The mirror is synchronized at the beginning of every transaction. Other state reads may return values which are
+        up to blockchain_state_mirror_sync_interval milliseconds old.
+        """
+        return self._blockchain_state_mirror
+
+    @blockchain_state_mirror.setter
+    def blockchain_state_mirror(self, val: bool):
+        _type_check(val, bool)
+        self._blockchain_state_mirror = val
+
+    @property
+    def blockchain_state_mirror_sync_interval(self) -> int:
+        """Minimum time in milliseconds between two synchronizations of the state mirror outside of transactions."""
+        return self._blockchain_state_mirror_sync_interval
+
+    @blockchain_state_mirror_sync_interval.setter
+    def blockchain_state_mirror_sync_interval(self, val: int):
+        _type_check(val, int)
+        if val < 0:
+            raise ValueError('State mirror sync interval must not be negative')
+        self._blockchain_state_mirror_sync_interval = val
+
+    @property
+    def blockchain_prefetch_workers(self) -> int:
+        """
+        Maximum number of concurrent state variable requests when prefetching the statically known state reads of a transaction.
+
+        (1 -> values are requested sequentially)
+        """
+        return self._blockchain_prefetch_workers
+
+    @blockchain_prefetch_workers.setter
+    def blockchain_prefetch_workers(self, val: int):
+        _type_check(val, int)
+        if val < 1:
+            raise ValueError('Number of prefetch workers must be positive')
+        self._blockchain_prefetch_workers = val
+
     @property
     def indentation(self) -> str:
         """Specifies the identation which should be used for the generated code output."""
@@ -284,6 +371,52 @@ class UserConfig:
         _type_check(val, bool)
         self._opt_cache_circuit_outputs = val
 
+    @property
+    def opt_circuit_constraints(self) -> bool:
+        """
+        If true, abstract proof circuits are optimized before circuit generation
+        (constant folding and propagation, common subexpression elimination, dead temporary elimination and
+        removal of duplicate equality and encryption constraints).
+        """
+        return self._opt_circuit_constraints
+
+    @opt_circuit_constraints.setter
+    def opt_circuit_constraints(self, val: bool):
+        _type_check(val, bool)
+        self._opt_circuit_constraints = val
+
+    @property
+    def opt_pack_circuit_io(self) -> bool:
+        """
+        If true, small public circuit inputs and outputs (bools, unsigned integers with less than 256 bits and addresses)
+        are packed into shared uints (the circuit unpacks them).
+
+        This reduces the number of public verifier inputs (and thus verification gas), at the cost of a few
+        additional constraints and some packing/unpacking code in the public contract.
+        """
+        return self._opt_pack_circuit_io
+
+    @opt_pack_circuit_io.setter
+    def opt_pack_circuit_io(self, val: bool):
+        _type_check(val, bool)
+        self._opt_pack_circuit_io = val
+
+    @property
+    def opt_native_offchain_locals(self) -> bool:
+        """
+        If true, local variables in the generated offchain simulation code are compiled to plain python local variables
+        (shadowed variables are renamed at compile time).
+
+        Otherwise all local variables are stored in a scoped dictionary at runtime, which is slower but makes
+        the generated code easier to debug.
+        """
+        return self._opt_native_offchain_locals
+
+    @opt_native_offchain_locals.setter
+    def opt_native_offchain_locals(self, val: bool):
+        _type_check(val, bool)
+        self._opt_native_offchain_locals = val
+
     @property
     def data_dir(self) -> str:
         """Path to directory where to store user data (e.g. generated encryption keys)."""
@@ -310,6 +443,116 @@ class UserConfig:
             os.makedirs(val)
         self._log_dir = val
 
+    @property
+    def solc_cache_size(self) -> int:
+        """
+        Maximum size (in MiB) of the on-disk cache for solc compilation outputs, which is stored in the data directory.
+
+        If 0, solc outputs are not cached.
+        """
+        return self._solc_cache_size
+
+    @solc_cache_size.setter
+    def solc_cache_size(self, val: int):
+        _type_check(val, int)
+        self._solc_cache_size = val
+
+    @property
+    def stage_cache_size(self) -> int:
+        """
+        Maximum size (in MiB) of the on-disk cache for intermediate compilation results (ASTs, generated code),
+        which is stored in the data directory.
+
+        If 0, compilation results are not cached and every compilation starts from scratch.
+        """
+        return self._stage_cache_size
+
+    @stage_cache_size.setter
+    def stage_cache_size(self, val: int):
+        _type_check(val, int)
+        self._stage_cache_size = val
+
+    @property
+    def key_store_size(self) -> int:
+        """
+        Maximum size (in MiB) of the global store for generated prover and verification keys, which is stored in the data directory.
+
+        Keys of circuits which are identical to a previously compiled circuit are taken from this store instead of
+        being generated again. If 0, the key store is not used. The key store is never used by unit tests.
+        """
+        return self._key_store_size
+
+    @key_store_size.setter
+    def key_store_size(self, val: int):
+        _type_check(val, int)
+        self._key_store_size = val
+
+    @property
+    def keygen_memory_budget(self) -> int:
+        """
+        Maximum amount of memory (in MiB) which concurrently running snark key generations may use (based on estimates).
+
+        If 0, 3/4 of the physical memory are used.
+        """
+        return self._keygen_memory_budget
+
+    @keygen_memory_budget.setter
+    def keygen_memory_budget(self, val: int):
+        _type_check(val, int)
+        if val < 0:
+            raise ValueError('Key generation memory budget must not be negative')
+        self._keygen_memory_budget = val
+
+    @property
+    def circuit_constraint_warning_threshold(self) -> int:
+        """
+        If the estimated number of constraints of a circuit exceeds this value, a warning is printed during compilation.
+
+        Use 'zkay stats' to show the estimated costs of all circuits. If 0, no warnings are printed.
+        """
+        return self._circuit_constraint_warning_threshold
+
+    @circuit_constraint_warning_threshold.setter
+    def circuit_constraint_warning_threshold(self, val: int):
+        _type_check(val, int)
+        if val < 0:
+            raise ValueError('Circuit constraint warning threshold must not be negative')
+        self._circuit_constraint_warning_threshold = val
+
+    @property
+    def jsnark_max_heap_size(self) -> int:
+        """
+        Maximum java heap size (in MiB) of jsnark invocations.
+
+        The initial heap size is estimated for every invocation (e.g. based on the circuit size).
+        If 0, 3/4 of the physical memory are used as limit, shared by all concurrently running jsnark invocations
+        of a batch circuit compilation.
+        """
+        return self._jsnark_max_heap_size
+
+    @jsnark_max_heap_size.setter
+    def jsnark_max_heap_size(self, val: int):
+        _type_check(val, int)
+        if val < 0:
+            raise ValueError('Maximum jsnark heap size must not be negative')
+        self._jsnark_max_heap_size = val
+
+    @property
+    def jsnark_class_data_sharing(self) -> bool:
+        """
+        If true, jsnark invocations use an application class data sharing archive (stored in the data directory)
+        to reduce JVM startup time.
+
+        The archive is created automatically by the first suitable invocation (requires Java 13 or newer,
+        older JVMs ignore this option).
+        """
+        return self._jsnark_class_data_sharing
+
+    @jsnark_class_data_sharing.setter
+    def jsnark_class_data_sharing(self, val: bool):
+        _type_check(val, bool)
+        self._jsnark_class_data_sharing = val
+
     @property
     def use_circuit_cache_during_testing_with_encryption(self) -> bool:
         """
@@ -16,6 +16,21 @@ class Versions:
     with open(os.path.join(os.path.realpath(os.path.dirname(__file__)), 'VERSION')) as f:
         ZKAY_VERSION = f.read().strip()
 
+    @staticmethod
+    def ensure_solc_version_installed(version: str) -> str:
+        """
+        Install the given concrete solc version if necessary, without changing the active solc version.
+
+        :return: normalized version string (same format as SOLC_VERSION)
+        """
+        version = version[1:] if version.startswith('v') else version
+
+        import solcx
+        v = Version(version)
+        if v not in solcx.get_installed_solc_versions():
+            solcx.install_solc(version)
+        return f"v{v.truncate(level='patch')}"
+
     @staticmethod
     def set_solc_version(version: str):
         version = version[1:] if version.startswith('v') else version
@@ -4,6 +4,7 @@ This package contains glue code to interact with the external jsnark and libsnar
 ==========
 Submodules
 ==========
-* :py:mod:`.jsnark_interface`: Jsnark circuit compilation and evaluation (preparation steps for key and proof generation).
+* :py:mod:`.jsnark_interface`: Jsnark circuit compilation and evaluation (preparation steps for key and proof generation)
+  and launching of all java programs which use the jsnark circuit builder.
 * :py:mod:`.libsnark_interface`: Libsnark key and proof generation.
 """
\ No newline at end of file
@@ -1,9 +1,34 @@
+"""
+This module provides the interface to the jsnark circuit builder.
+
+All java invocations (circuit compilation, circuit evaluation and the java crypto primitives) go through run_java, which
+
+* sizes the java heap for every invocation (based on an estimate of the required memory, limited by cfg.jsnark_max_heap_size
+  or by a share of the physical memory)
+* uses an application class data sharing (AppCDS) archive for JsnarkCircuitBuilder.jar if cfg.jsnark_class_data_sharing
+  is enabled. The archive is created automatically at the end of the first invocation with a given class path and stored in
+  cfg.data_dir/jsnark_cds. Class data sharing is only used with JVMs which support dynamic archives (Java >= 13),
+  CDS log output is disabled since the output of the java programs is parsed.
+
+Compiled circuit classes are not loaded from the class path but by the circuit runner (a small driver class which is
+compiled once and stored in cfg.data_dir/jsnark_runner), so that the class path of all circuit related invocations is
+identical and they can share a single archive. Circuit compilation copies the runner jar into the compilation output
+directory, so that proof generation does not require a java compiler.
+"""
+
 import os
-from typing import List
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import zipfile
+from typing import List, Tuple, Sequence, Optional
 
 from zkay.compiler.privacy.circuit_generation.circuit_helper import CircuitHelper
 from zkay.config import cfg
-from zkay.utils.helpers import hash_file
+from zkay.utils.helpers import hash_file, hash_string, get_physical_memory
+from zkay.utils.parallel import parallel_map
 from zkay.utils.run_command import run_command
 from zkay.zkay_ast.ast import indent
 
@@ -11,6 +36,70 @@ from zkay.zkay_ast.ast import indent
 circuit_builder_jar = os.path.join(os.path.dirname(os.path.realpath(__file__)),  'JsnarkCircuitBuilder.jar')
 circuit_builder_jar_hash = hash_file(circuit_builder_jar).hex()
 
+jvm_base_heap_size = 64 * 1024 * 1024
+"""Initial java heap size (in bytes) for invocations which do not depend on a circuit (e.g. encryption)"""
+
+jvm_heap_size_per_wire = 1024
+"""Estimated java heap usage per circuit wire (in bytes) during jsnark circuit compilation and evaluation"""
+
+default_max_heap_size = 16384 * 1024 * 1024
+"""Maximum java heap size (in bytes) if neither cfg.jsnark_max_heap_size nor the amount of physical memory is known"""
+
+
+def run_java(main_class: str, args: Sequence[str], *, class_path: Sequence[str] = (), heap_size: Optional[int] = None,
+             cwd: Optional[str] = None, allow_verbose: bool = False, concurrent_jvms: int = 1,
+             class_data_sharing: bool = True) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Run a java program which uses the jsnark circuit builder.
+
+    :param main_class: fully qualified name of the main class
+    :param args: program arguments
+    :param class_path: class path entries in addition to the circuit builder jar (must be jar files to allow class data sharing)
+    :param heap_size: estimated heap usage (in bytes), used as initial heap size. If None, jvm_base_heap_size is used
+    :param cwd: working directory
+    :param allow_verbose: see run_command
+    :param concurrent_jvms: number of JVMs which the caller runs concurrently (they share the default maximum heap size)
+    :param class_data_sharing: if false, no class data sharing archive is used (required if class_path contains directories)
+    :raise SubprocessError: if the java program fails
+    :return: see run_command
+    """
+    max_heap_size = _get_max_heap_size(concurrent_jvms)
+    heap_size = min(max(heap_size or 0, jvm_base_heap_size), max_heap_size)
+    class_path = [circuit_builder_jar, *class_path]
+    jvm_args = [f'-Xms{heap_size // (1024 * 1024)}m', f'-Xmx{max_heap_size // (1024 * 1024)}m']
+
+    archive_file, tmp_archive_file = None, None
+    if class_data_sharing and cfg.jsnark_class_data_sharing and _get_java_major_version() >= 13:
+        archive_file = _get_cds_archive_path(class_path)
+        # CDS warnings (e.g. archive mismatch) would otherwise be printed to stdout after the program output
+        jvm_args.append('-Xlog:cds=off,cds+dynamic=off')
+        if os.path.exists(archive_file):
+            jvm_args.append(f'-XX:SharedArchiveFile={archive_file}')
+        else:
+            # Dump the classes which are loaded by this invocation (atomically moved into place after successful termination)
+            os.makedirs(os.path.dirname(archive_file), exist_ok=True)
+            tmp_archive_file = f'{archive_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+            jvm_args.append(f'-XX:ArchiveClassesAtExit={tmp_archive_file}')
+
+    try:
+        ret = run_command(['java', *jvm_args, '-cp', ':'.join(class_path), main_class, *args], cwd=cwd, allow_verbose=allow_verbose)
+        if tmp_archive_file is not None and os.path.exists(tmp_archive_file):
+            os.replace(tmp_archive_file, archive_file)
+        return ret
+    finally:
+        if tmp_archive_file is not None and os.path.exists(tmp_archive_file):
+            os.remove(tmp_archive_file)
+
+
+def get_circuit_wire_count(circuit_dir: str) -> Optional[int]:
+    """Return the number of wires of the compiled circuit in circuit_dir, or None if there is no (valid) compiled circuit."""
+    # The first line of circuit.arith contains the total number of wires ('total <count>')
+    try:
+        with open(os.path.join(circuit_dir, 'circuit.arith')) as f:
+            return int(f.readline().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
 
 def compile_circuit(circuit_dir: str, javacode: str):
     """
@@ -20,15 +109,54 @@ def compile_circuit(circuit_dir: str, javacode: str):
     :param javacode: circuit code (java class which uses the custom jsnark wrapper API)
     :raise SubprocessError: if compilation fails
     """
-    jfile = os.path.join(circuit_dir, cfg.jsnark_circuit_classname + ".java")
-    with open(jfile, 'w') as f:
-        f.write(javacode)
+    compile_circuits([(circuit_dir, javacode)])
+
+
+def compile_circuits(jobs: Sequence[Tuple[str, str]], max_jvms: int = 1):
+    """
+    Compile multiple circuits in batch mode.
+
+    Instead of running javac and java for every circuit, the circuits are distributed among at most max_jvms JVM
+    processes. Each of them compiles the java code of its circuits using the in-process java compiler API and then
+    compiles the circuits using jsnark, one after the other, so the JVM startup cost does not depend on the number of circuits.
+
+    :param jobs: list of (output directory, circuit java code) tuples, the output directories must be distinct
+    :param max_jvms: maximum number of JVMs which compile circuits concurrently
+    :raise SubprocessError: if compilation fails
+    """
+    if not jobs:
+        return
+
+    for circuit_dir, javacode in jobs:
+        with open(os.path.join(circuit_dir, cfg.jsnark_circuit_classname + ".java"), 'w') as f:
+            f.write(javacode)
+
+    runner_jar = _get_circuit_runner_jar()
+    for output_dir in {os.path.dirname(os.path.abspath(circuit_dir)) for circuit_dir, _ in jobs}:
+        # Ship the runner with the compilation output, proof generation then only requires a java runtime
+        shipped_jar = _get_shipped_runner_jar(output_dir)
+        if not os.path.exists(shipped_jar) or hash_file(shipped_jar) != hash_file(runner_jar):
+            tmp_jar = f'{shipped_jar}.{os.getpid()}.tmp'
+            shutil.copyfile(runner_jar, tmp_jar)
+            os.replace(tmp_jar, shipped_jar)
+
+    jvm_count = max(1, min(max_jvms, len(jobs)))
+    batches = [[os.path.abspath(circuit_dir) for circuit_dir, _ in jobs[i::jvm_count]] for i in range(jvm_count)]
+
+    def compile_batch(circuit_dirs: List[str]):
+        # The size of previous versions of the circuits is the best available estimate for the required heap
+        wire_counts = [get_circuit_wire_count(circuit_dir) or 0 for circuit_dir in circuit_dirs]
+        heap_size = jvm_base_heap_size + max(wire_counts) * jvm_heap_size_per_wire
 
-    # Compile the circuit java file
-    run_command(['javac', '-cp', f'{circuit_builder_jar}', jfile], cwd=circuit_dir)
+        # jsnark writes its output files to the working directory, the circuit runner moves them to the circuit directories
+        work_dir = tempfile.mkdtemp(dir=os.path.dirname(circuit_dirs[0]), prefix='.jsnark_')
+        try:
+            run_java(_circuit_runner_classname, [cfg.jsnark_circuit_classname, 'compile', *circuit_dirs],
+                     class_path=[runner_jar], heap_size=heap_size, cwd=work_dir, allow_verbose=True, concurrent_jvms=jvm_count)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
 
-    # Run jsnark to generate the circuit
-    run_command(['java', '-Xms4096m', '-Xmx16384m', '-cp', f'{circuit_builder_jar}:{circuit_dir}', cfg.jsnark_circuit_classname, 'compile'], cwd=circuit_dir, allow_verbose=True)
+    parallel_map(compile_batch, batches, max_workers=jvm_count)
 
 
 def prepare_proof(circuit_dir: str, output_dir: str, serialized_args: List[int]):
@@ -41,9 +169,18 @@ def prepare_proof(circuit_dir: str, output_dir: str, serialized_args: List[int])
     :raise SubprocessError: if circuit evaluation fails
     """
     serialized_arg_str = [format(arg, 'x') for arg in serialized_args]
+    heap_size = jvm_base_heap_size + (get_circuit_wire_count(circuit_dir) or 0) * jvm_heap_size_per_wire
 
     # Run jsnark to evaluate the circuit and compute prover inputs
-    run_command(['java', '-Xms4096m', '-Xmx16384m', '-cp', f'{circuit_builder_jar}:{circuit_dir}', cfg.jsnark_circuit_classname, 'prove', *serialized_arg_str], cwd=output_dir, allow_verbose=True)
+    circuit_dir = os.path.abspath(circuit_dir)
+    runner_jar = _get_shipped_runner_jar(os.path.dirname(circuit_dir))
+    if os.path.exists(runner_jar):
+        run_java(_circuit_runner_classname, [cfg.jsnark_circuit_classname, 'prove', circuit_dir, *serialized_arg_str],
+                 class_path=[runner_jar], heap_size=heap_size, cwd=output_dir, allow_verbose=True)
+    else:
+        # Circuit was compiled without shipping the runner, load the circuit class directly (no class data sharing)
+        run_java(cfg.jsnark_circuit_classname, ['prove', *serialized_arg_str], class_path=[circuit_dir],
+                 heap_size=heap_size, cwd=output_dir, allow_verbose=True, class_data_sharing=False)
 
 
 _class_template_str = '' + '''\
@@ -71,6 +208,8 @@ public class {circuit_class_name} extends ZkayCircuitBase {{
 '''
 """Java circuit code template"""
 
+circuit_template_hash = hash_string(_class_template_str.encode('utf-8')).hex()
+
 
 def get_jsnark_circuit_class_str(circuit: CircuitHelper, fdefs: List[str], circuit_statements: List[str]) -> str:
     """
@@ -89,3 +228,143 @@ def get_jsnark_circuit_class_str(circuit: CircuitHelper, fdefs: List[str], circu
                                       key_bits=cfg.key_bits, pub_in_size=circuit.in_size_trans, pub_out_size=circuit.out_size_trans,
                                       priv_in_size=circuit.priv_in_size_trans, use_input_hashing=str(cfg.should_use_hash(circuit)).lower(),
                                       fdefs=indent(function_definitions), circuit_statements=indent(indent('\n'.join(circuit_statements))))
+
+
+_circuit_runner_classname = 'ZkayCircuitRunner'
+
+_circuit_runner_str = '' + '''\
+import java.io.File;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.file.DirectoryStream;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.StandardCopyOption;
+import java.util.Arrays;
+import javax.tools.JavaCompiler;
+import javax.tools.ToolProvider;
+
+/**
+ * Usage: {circuit_runner_class_name} <circuit class name> compile <circuit dir>...
+ *        {circuit_runner_class_name} <circuit class name> prove <circuit dir> <serialized args>...
+ */
+public class {circuit_runner_class_name} {{
+    public static void main(String[] args) throws Exception {{
+        String className = args[0];
+        if (args[1].equals("prove")) {{
+            String[] circuitArgs = Arrays.copyOfRange(args, 2, args.length);
+            circuitArgs[0] = "prove";
+            runCircuit(new File(args[2]).getAbsoluteFile(), className, circuitArgs);
+            return;
+        }}
+
+        String classPath = System.getProperty("java.class.path");
+        Path workDir = new File("").getAbsoluteFile().toPath();
+        JavaCompiler javac = ToolProvider.getSystemJavaCompiler();
+        if (javac == null) {{
+            throw new IllegalStateException("No system java compiler available");
+        }}
+
+        for (int i = 2; i < args.length; i++) {{
+            File circuitDir = new File(args[i]).getAbsoluteFile();
+            File javaFile = new File(circuitDir, className + ".java");
+            if (javac.run(null, null, null, "-cp", classPath, "-d", circuitDir.getPath(), javaFile.getPath()) != 0) {{
+                throw new IllegalStateException("Failed to compile " + javaFile.getPath());
+            }}
+
+            runCircuit(circuitDir, className, new String[]{{"compile"}});
+
+            try (DirectoryStream<Path> outputs = Files.newDirectoryStream(workDir)) {{
+                for (Path output : outputs) {{
+                    Files.move(output, circuitDir.toPath().resolve(output.getFileName()), StandardCopyOption.REPLACE_EXISTING);
+                }}
+            }}
+        }}
+    }}
+
+    private static void runCircuit(File circuitDir, String className, String[] args) throws Exception {{
+        // Every circuit class is loaded by a separate class loader, since all circuit classes have the same name
+        try (URLClassLoader loader = new URLClassLoader(new URL[]{{circuitDir.toURI().toURL()}},
+                                                        {circuit_runner_class_name}.class.getClassLoader())) {{
+            Method main = loader.loadClass(className).getMethod("main", String[].class);
+            main.invoke(null, (Object) args);
+        }}
+    }}
+}}
+'''.format(circuit_runner_class_name=_circuit_runner_classname)
+"""Java code of the circuit runner, which compiles and runs circuit classes which are not on the class path"""
+
+
+def _get_circuit_runner_jar() -> str:
+    """Return the path of the jar file which contains the circuit runner (compile it if necessary)."""
+    src_hash = hash_string((circuit_builder_jar_hash + _circuit_runner_str).encode('utf-8')).hex()
+    runner_jar = os.path.join(cfg.data_dir, 'jsnark_runner', f'{_circuit_runner_classname}_{src_hash[:16]}.jar')
+    if not os.path.exists(runner_jar):
+        os.makedirs(os.path.dirname(runner_jar), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(runner_jar), suffix='.tmp')
+        try:
+            jfile = os.path.join(tmp_dir, f'{_circuit_runner_classname}.java')
+            with open(jfile, 'w') as f:
+                f.write(_circuit_runner_str)
+            run_command(['javac', '-cp', f'{circuit_builder_jar}', jfile], cwd=tmp_dir)
+
+            # Package the class in a jar file, since class data sharing does not support directories on the class path
+            tmp_jar = os.path.join(tmp_dir, 'runner.jar')
+            with zipfile.ZipFile(tmp_jar, 'w') as jar:
+                jar.writestr('META-INF/MANIFEST.MF', 'Manifest-Version: 1.0\n')
+                for name in os.listdir(tmp_dir):
+                    if name.endswith('.class'):
+                        jar.write(os.path.join(tmp_dir, name), name)
+            os.replace(tmp_jar, runner_jar)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return runner_jar
+
+
+def _get_shipped_runner_jar(output_dir: str) -> str:
+    """Return the path of the circuit runner jar in the compilation output directory output_dir."""
+    return os.path.join(output_dir, f'{_circuit_runner_classname}.jar')
+
+
+def _get_max_heap_size(concurrent_jvms: int = 1) -> int:
+    """Return the maximum java heap size (in bytes) of each of concurrent_jvms concurrently running JVMs."""
+    if cfg.jsnark_max_heap_size > 0:
+        return cfg.jsnark_max_heap_size * 1024 * 1024
+    total_memory = get_physical_memory()
+    max_heap_size = default_max_heap_size if total_memory is None else total_memory * 3 // 4
+    return max(max_heap_size // max(concurrent_jvms, 1), jvm_base_heap_size)
+
+
+_java_versions = {}
+_java_versions_lock = threading.Lock()
+
+
+def _get_java_major_version() -> int:
+    """Return the major version of the java runtime on the PATH (0 if unknown)."""
+    java = shutil.which('java')
+    if java is None:
+        return 0
+    java = os.path.realpath(java)
+    with _java_versions_lock:
+        if java not in _java_versions:
+            try:
+                # 'java -version' prints e.g. 'openjdk version "17.0.2" ...' or 'java version "1.8.0_292"' to stderr
+                _, err = run_command([java, '-version'])
+                match = re.search(r'version "(?:1\.)?(\d+)', err)
+                _java_versions[java] = int(match.group(1)) if match else 0
+            except (OSError, subprocess.SubprocessError):
+                _java_versions[java] = 0
+        return _java_versions[java]
+
+
+def _get_cds_archive_path(class_path: Sequence[str]) -> str:
+    """Return the path of the class data sharing archive for the given class path and the current java installation."""
+    java = shutil.which('java')
+    java_id = ''
+    if java is not None:
+        java = os.path.realpath(java)
+        java_id = f'{java}:{os.stat(java).st_mtime_ns}'
+    class_path_id = ':'.join(f'{path}:{os.stat(path).st_mtime_ns}' for path in class_path)
+    archive_hash = hash_string(f'{java_id};{class_path_id};{circuit_builder_jar_hash}'.encode('utf-8')).hex()
+    return os.path.join(cfg.data_dir, 'jsnark_cds', f'{archive_hash[:32]}.jsa')
@@ -1,7 +1,20 @@
 import contextlib
-from typing import List
+import threading
+from typing import List, Dict
 
-full_log_context: List = []
+# Log contexts are tracked per thread, contexts of the main thread are inherited by all other threads
+_log_contexts: Dict[int, List] = {}
+_lock = threading.Lock()
+
+
+def get_log_context() -> List:
+    """Return a snapshot of the log context of the current thread."""
+    main_id, own_id = threading.main_thread().ident, threading.get_ident()
+    with _lock:
+        ctx = list(_log_contexts.get(main_id, []))
+        if own_id != main_id:
+            ctx += _log_contexts.get(own_id, [])
+        return [list(item) for item in ctx]
 
 
 @contextlib.contextmanager
@@ -9,27 +22,40 @@ def log_context(key: str, value):
     found = find_key(key) is not None
     if not found:
         add_log_context(key, value)
-    yield
-    if not found:
-        remove_log_context(key)
+    try:
+        yield
+    finally:
+        if not found:
+            remove_log_context(key)
 
 
 def add_log_context(key: str, value):
     assert key is not None
     assert value is not None
 
-    full_log_context.append([key, value])
+    with _lock:
+        _log_contexts.setdefault(threading.get_ident(), []).append([key, value])
 
 
 def find_key(key):
-    for i, item in enumerate(full_log_context):
+    with _lock:
+        return _find_key(_log_contexts.get(threading.get_ident(), []), key)
+
+
+def _find_key(ctx: List, key):
+    for i, item in enumerate(ctx):
         if key == item[0]:
             return i
     return None
 
 
 def remove_log_context(key):
-    i = find_key(key)
-    if i is None:
-        raise ValueError(f'Key {key} not found')
-    del full_log_context[i]
+    tid = threading.get_ident()
+    with _lock:
+        ctx = _log_contexts.get(tid, [])
+        i = _find_key(ctx, key)
+        if i is None:
+            raise ValueError(f'Key {key} not found')
+        del ctx[i]
+        if not ctx:
+            del _log_contexts[tid]
@@ -6,7 +6,7 @@ from logging import addLevelName
 
 # current time
 from zkay.config import cfg
-from zkay.my_logging.log_context import full_log_context
+from zkay.my_logging.log_context import get_log_context
 
 timestamp = '{:%Y-%m-%d_%H-%M-%S}'.format(datetime.datetime.now())
 
@@ -36,7 +36,7 @@ def data(key, value):
     """
     Log (key, value) to log-level DATA
     """
-    d = {'key': key, 'value': value, 'context': full_log_context}
+    d = {'key': key, 'value': value, 'context': get_log_context()}
     return logging.log(DATA, json.dumps(d))
 
 
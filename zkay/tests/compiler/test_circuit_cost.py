@@ -0,0 +1,39 @@
+from zkay.compiler.privacy.circuit_generation.circuit_constraints import CircVarDecl, CircEncConstraint, CircIndentBlock
+from zkay.compiler.privacy.circuit_generation.circuit_cost import _CostEstimator, enc_constraint_costs
+from zkay.config import cfg
+from zkay.tests.zkay_unit_test import ZkayTestCase
+from zkay.zkay_ast.ast import HybridArgumentIdf, HybridArgType, TypeName, IdentifierExpr, FunctionCallExpr, BuiltinFunction, \
+    UintTypeName, AnnotatedTypeName
+
+
+def _idf(name: str, t: TypeName) -> HybridArgumentIdf:
+    return HybridArgumentIdf(name, t, HybridArgType.TMP_CIRCUIT_VAL)
+
+
+def _decl(op: str, t: TypeName, res_t: TypeName = None) -> CircVarDecl:
+    args = [IdentifierExpr(_idf(f'a{i}', t)).as_type(t) for i in range(2)]
+    return CircVarDecl(_idf('tmp', res_t or t), FunctionCallExpr(BuiltinFunction(op), args).as_type(res_t or t))
+
+
+class TestCircuitCost(ZkayTestCase):
+
+    def test_small_types_are_cheaper_than_field_elements(self):
+        e = _CostEstimator({})
+        t8, t256 = UintTypeName('uint8'), TypeName.uint_type()
+        self.assertEqual(0, e.get_stmt_cost(_decl('+', t256)))
+        self.assertLess(0, e.get_stmt_cost(_decl('+', t8)))
+        self.assertLess(e.get_stmt_cost(_decl('<', t8, TypeName.bool_type())), e.get_stmt_cost(_decl('<', t256, TypeName.bool_type())))
+        self.assertLess(e.get_stmt_cost(_decl('*', t256)), e.get_stmt_cost(_decl('*', t8)))
+
+    def test_encryption_cost_depends_on_crypto_backend(self):
+        old_backend = cfg.crypto_backend
+        try:
+            key_t, rnd_t = TypeName.key_type(), TypeName.rnd_type()
+            cipher_t = TypeName.cipher_type(AnnotatedTypeName.uint_all())
+            stmt = CircIndentBlock('', [CircEncConstraint(_idf('p', TypeName.uint_type()), _idf('r', rnd_t), _idf('k', key_t),
+                                                          _idf('c', cipher_t), False)] * 2)
+            for backend in ['dummy', 'rsa-oaep']:
+                cfg.crypto_backend = backend
+                self.assertEqual(2 * enc_constraint_costs[backend], _CostEstimator({}).get_stmt_cost(stmt))
+        finally:
+            cfg.crypto_backend = old_backend
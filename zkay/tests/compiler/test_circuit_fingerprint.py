@@ -0,0 +1,81 @@
+from zkay.compiler.privacy.circuit_generation.backends.jsnark_generator import JsnarkGenerator
+from zkay.compiler.privacy.circuit_generation.circuit_constraints import CircVarDecl, CircEqConstraint, CircCall
+from zkay.compiler.privacy.circuit_generation.circuit_fingerprint import get_function_fingerprint
+from zkay.tests.zkay_unit_test import ZkayTestCase
+from zkay.zkay_ast.ast import HybridArgumentIdf, HybridArgType, TypeName, IdentifierExpr, FunctionCallExpr, BuiltinFunction, \
+    NumberLiteralExpr, UintTypeName, PrimitiveCastExpr, ConstructorOrFunctionDefinition, Identifier, Block
+
+
+class _Circuit:
+    """Stand-in for the CircuitHelper attributes which are used for fingerprinting."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _circuit(op: str = '+', lit: int = 1, t: TypeName = None, cast_t: TypeName = None, packed_bit_offset=None, phi=None):
+    """Return the circuit of a function computing zk__out0 = cast_t(tmp0 op lit), where tmp0 = zk__in0."""
+    t = TypeName.uint_type() if t is None else t
+    cast_t = TypeName.uint_type() if cast_t is None else cast_t
+    in0 = HybridArgumentIdf('zk__in0', t, HybridArgType.PUB_CIRCUIT_ARG)
+    out0 = HybridArgumentIdf('zk__out0', cast_t, HybridArgType.PUB_CIRCUIT_ARG)
+    in0.io_offset, out0.io_offset = 0, 0
+    in0.packed_bit_offset = packed_bit_offset
+    tmp0 = HybridArgumentIdf('tmp0', t, HybridArgType.TMP_CIRCUIT_VAL)
+
+    ref = IdentifierExpr(tmp0.clone()).as_type(t)
+    res = FunctionCallExpr(BuiltinFunction(op), [ref, NumberLiteralExpr(lit).as_type(t)]).as_type(t)
+    if phi is None:
+        phi = [
+            CircVarDecl(tmp0, IdentifierExpr(in0.clone()).as_type(t)),
+            CircEqConstraint(PrimitiveCastExpr(cast_t, res).as_type(cast_t), out0.clone()),
+        ]
+    return _Circuit(sec_idfs=[], input_idfs=[in0], output_idfs=[out0], phi=phi)
+
+
+def _fct(name: str) -> ConstructorOrFunctionDefinition:
+    return ConstructorOrFunctionDefinition(Identifier(name), [], ['public'], None, Block([]))
+
+
+class TestCircuitFingerprint(ZkayTestCase):
+
+    def test_stable(self):
+        circuit = _circuit()
+        self.assertEqual(get_function_fingerprint(circuit), get_function_fingerprint(circuit))
+        self.assertEqual(get_function_fingerprint(circuit), get_function_fingerprint(_circuit()))
+
+    def test_changes(self):
+        fingerprint = get_function_fingerprint(_circuit())
+        variants = {
+            'literal': _circuit(lit=2),
+            'operator': _circuit(op='*'),
+            'type': _circuit(t=UintTypeName('uint8')),
+            'cast type': _circuit(cast_t=UintTypeName('uint8')),
+            'io layout': _circuit(packed_bit_offset=0),
+        }
+        for desc, circuit in variants.items():
+            with self.subTest(desc):
+                self.assertNotEqual(fingerprint, get_function_fingerprint(circuit))
+
+    def test_callee_body_changes(self):
+        f, g = _fct('f'), _fct('g')
+        caller = _circuit(phi=[CircCall(g)])
+        self.assertEqual(get_function_fingerprint(caller), get_function_fingerprint(_circuit(phi=[CircCall(g)])))
+        self.assertNotEqual(get_function_fingerprint(caller), get_function_fingerprint(_circuit(phi=[CircCall(f)])))
+
+        def get_circuit_fingerprint(callee):
+            circuits = {f: caller, g: callee}
+            for fct, circuit in circuits.items():
+                circuit.fct = fct
+                circuit.transitively_called_functions = {g: None} if fct is f else {}
+                circuit.in_size_trans = circuit.trans_in_size = circuit.out_size_trans = circuit.trans_out_size = 1
+                circuit.priv_in_size_trans = 0
+                circuit.get_verification_contract_name = lambda: 'Verify_f'
+            generator = JsnarkGenerator.__new__(JsnarkGenerator)
+            generator.circuits = circuits
+            generator._function_fingerprints = {}
+            return generator._get_circuit_fingerprint(caller)
+
+        # Called functions only contribute their name to the fingerprint of the caller, the backend includes their bodies
+        self.assertEqual(get_circuit_fingerprint(_circuit()), get_circuit_fingerprint(_circuit()))
+        self.assertNotEqual(get_circuit_fingerprint(_circuit()), get_circuit_fingerprint(_circuit(lit=2)))
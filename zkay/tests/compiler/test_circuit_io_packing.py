@@ -0,0 +1,81 @@
+from zkay.compiler.privacy.circuit_generation.backends.jsnark_generator import _add_packed_io
+from zkay.compiler.privacy.circuit_generation.name_factory import NameFactory, group_by_io_offset, packed_uint_bitwidth
+from zkay.tests.zkay_unit_test import ZkayTestCase
+from zkay.transaction.offchain import ApiWrapper
+from zkay.transaction.types import AddressValue
+from zkay.zkay_ast.ast import HybridArgType, TypeName, AnnotatedTypeName, UintTypeName, IntTypeName, IdentifierExpr
+
+
+class TestCircuitIoPacking(ZkayTestCase):
+
+    @staticmethod
+    def _add_idfs(pack: bool, base_name: str = 'zk__out'):
+        nf = NameFactory(base_name, HybridArgType.PUB_CIRCUIT_ARG, pack=pack)
+        types = [TypeName.bool_type(), TypeName.cipher_type(AnnotatedTypeName.uint_all()), UintTypeName('uint32'),
+                 IntTypeName('int8'), TypeName.address_type(), TypeName.uint_type(), TypeName.address_type()]
+        for idx, t in enumerate(types):
+            nf.add_idf(f'{base_name}{idx}_plain', t)
+        return nf
+
+    @staticmethod
+    def _add_small_idfs():
+        nf = NameFactory('zk__out', HybridArgType.PUB_CIRCUIT_ARG, pack=True)
+        for idx, t in enumerate([TypeName.bool_type(), UintTypeName('uint32'), TypeName.address_type()]):
+            nf.add_idf(f'zk__out{idx}_plain', t)
+        return nf
+
+    def test_layout_without_packing(self):
+        nf = self._add_idfs(False)
+        self.assertEqual([0, 1] + [1 + nf.idfs[1].t.size_in_uints + i for i in range(5)], [idf.io_offset for idf in nf.idfs])
+        self.assertTrue(all(idf.packed_bit_offset is None for idf in nf.idfs))
+        self.assertEqual(nf.idfs[-1].io_offset + 1, nf.size)
+
+    def test_small_values_are_packed(self):
+        nf = self._add_idfs(True)
+        unpacked = self._add_idfs(False)
+        # The first bool, uint32 and address share a single uint
+        self.assertEqual(unpacked.size - 2, nf.size)
+
+        groups = group_by_io_offset(nf.idfs)
+        self.assertEqual(['zk__out0_plain', 'zk__out2_plain', 'zk__out4_plain'], [idf.name for idf in groups[0][1]])
+        self.assertEqual([0, 1, 33], [idf.packed_bit_offset for idf in groups[0][1]])
+        # The second address does not fit into the first packed uint anymore
+        self.assertEqual(['zk__out6_plain'], [idf.name for idf in groups[-1][1]])
+        for _, idfs in groups:
+            self.assertLessEqual(sum(idf.t.elem_bitwidth for idf in idfs if idf.packed_bit_offset is not None), packed_uint_bitwidth)
+
+    def test_packed_serialization(self):
+        base = IdentifierExpr('zk__out_start_idx')
+        idf = self._add_idfs(True).idfs[2]
+        self.assertEqual('zk__data.zk__out2_plain = uint32(((zk__out[zk__out_start_idx + 0] >> 1) & 4294967295));',
+                         idf.deserialize('zk__out', base, idf.io_offset).code())
+        base = IdentifierExpr('zk__in_start_idx')
+        idf = self._add_idfs(True, 'zk__in').idfs[2]
+        self.assertEqual('zk__in[zk__in_start_idx + 0] = zk__in[zk__in_start_idx + 0] | ((uint(zk__data.zk__in2_plain)) << 1);',
+                         idf.serialize('zk__in', base, idf.io_offset).code())
+
+    def test_packed_output_round_trip(self):
+        nf = self._add_small_idfs()
+        addr = AddressValue('0x' + 'ab' * 20)
+        values = {'zk__out0_plain': True, 'zk__out1_plain': 0xdeadbeef, 'zk__out2_plain': addr}
+        packing = [(idf.io_offset, idf.packed_bit_offset) for idf in nf.idfs]
+        api = ApiWrapper.__new__(ApiWrapper)
+        zk_out = api.serialize_circuit_outputs(values, [idf.t.elem_bitwidth for idf in nf.idfs], packing)
+        self.assertEqual(1, len(zk_out))
+
+        # Evaluate the generated solidity deserialization code on the serialized output
+        expected = [1, 0xdeadbeef, int.from_bytes(addr.val, byteorder='big')]
+        for idf, expected_val in zip(nf.idfs, expected):
+            code = idf.deserialize('zk__out', IdentifierExpr('zk__out_start_idx'), idf.io_offset).code()
+            expr = code[code.index(' = ') + 3:-1].replace('zk__out[zk__out_start_idx + 0]', str(zk_out[0]))
+            for t in ['uint32', 'address']:
+                expr = expr.replace(f'{t}(', '(')
+            self.assertEqual(expected_val, int(eval(expr)))
+
+    def test_packed_java_io(self):
+        self.assertEqual([
+            'addOut("zk__out0_packed", 1, ZkUint(248));',
+            'decl("zk__out0_plain", o_(o_(cast(get("zk__out0_packed"), ZkUint(8)), \'&\', val(1, ZkUint(8))), "==", val(1, ZkUint(8))));',
+            'decl("zk__out1_plain", cast(o_(get("zk__out0_packed"), ">>", 1), ZkUint(32)));',
+            'decl("zk__out2_plain", cast(o_(get("zk__out0_packed"), ">>", 33), ZkUint(160)));',
+        ], _add_packed_io('addOut', 'zk__out0_packed', self._add_small_idfs().idfs))
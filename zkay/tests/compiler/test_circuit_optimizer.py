@@ -0,0 +1,106 @@
+from zkay.compiler.privacy.circuit_generation.circuit_constraints import CircVarDecl, CircEqConstraint, CircEncConstraint, \
+    CircGuardModification
+from zkay.compiler.privacy.circuit_generation.circuit_optimizer import optimize_phi
+from zkay.config import cfg
+from zkay.tests.zkay_unit_test import ZkayTestCase
+from zkay.zkay_ast.ast import HybridArgumentIdf, HybridArgType, TypeName, IdentifierExpr, FunctionCallExpr, BuiltinFunction, \
+    NumberLiteralExpr, MemberAccessExpr, UintTypeName, AnnotatedTypeName
+
+
+def _tmp(name: str, t: TypeName = None) -> HybridArgumentIdf:
+    return HybridArgumentIdf(name, TypeName.uint_type() if t is None else t, HybridArgType.TMP_CIRCUIT_VAL)
+
+
+def _in(name: str, t: TypeName) -> HybridArgumentIdf:
+    return HybridArgumentIdf(name, t, HybridArgType.PUB_CIRCUIT_ARG)
+
+
+def _ref(idf: HybridArgumentIdf):
+    return IdentifierExpr(idf.clone()).as_type(idf.t)
+
+
+def _in_ref(idf: HybridArgumentIdf):
+    return MemberAccessExpr(IdentifierExpr('zk__in'), idf.clone()).as_type(idf.t)
+
+
+def _op(op: str, t: TypeName, *args):
+    return FunctionCallExpr(BuiltinFunction(op), list(args)).as_type(t)
+
+
+def _lit(v: int, t: TypeName = None):
+    return NumberLiteralExpr(v).as_type(TypeName.uint_type() if t is None else t)
+
+
+class TestCircuitOptimizer(ZkayTestCase):
+
+    def test_constant_folding(self):
+        t8 = UintTypeName('uint8')
+        a, b, out = _tmp('tmp0', t8), _tmp('tmp1', t8), _in('zk__out0', t8)
+        phi = [
+            CircVarDecl(a, _lit(200, t8)),
+            CircVarDecl(b, _op('+', t8, _ref(a), _lit(100, t8))),
+            CircEqConstraint(out, b),
+        ]
+        opt = optimize_phi(phi)
+        self.assertEqual(2, len(opt))
+        self.assertIsInstance(opt[0].expr, NumberLiteralExpr)
+        self.assertEqual(44, opt[0].expr.value)
+        self.assertEqual('tmp1', opt[1].val.name)
+
+    def test_cse_and_constraint_deduplication(self):
+        t = TypeName.uint_type()
+        x, o = _in('zk__in0', t), _in('zk__out0', t)
+        a, b = _tmp('tmp0'), _tmp('tmp1')
+        cond = _tmp('tmp2', TypeName.bool_type())
+        phi = [
+            CircVarDecl(a, _op('*', t, _in_ref(x), _in_ref(x))),
+            CircVarDecl(b, _op('*', t, _in_ref(x), _in_ref(x))),
+            CircVarDecl(cond, _op('<', TypeName.bool_type(), _in_ref(x), _lit(3))),
+            CircEqConstraint(o, a),
+            CircGuardModification(cond, True),
+            CircEqConstraint(o, b),
+            CircGuardModification(None),
+        ]
+        opt = optimize_phi(phi)
+        self.assertEqual(['tmp0', 'tmp2'], [s.lhs.name for s in opt if isinstance(s, CircVarDecl)])
+        self.assertEqual(1, len([s for s in opt if isinstance(s, CircEqConstraint)]))
+
+    def test_guarded_constraint_is_kept(self):
+        key_t, cipher_t, rnd_t = TypeName.key_type(), TypeName.cipher_type(AnnotatedTypeName.uint_all()), TypeName.rnd_type()
+        plain, pk, rnd, cipher = _tmp('tmp0'), _in('zk__in0', key_t), _in('zk__in1', rnd_t), _in('zk__in2', cipher_t)
+        cond = _tmp('tmp1', TypeName.bool_type())
+        phi = [
+            CircVarDecl(plain, _in_ref(_in('zk__in3', TypeName.uint_type()))),
+            CircVarDecl(cond, _op('<', TypeName.bool_type(), _ref(plain), _lit(3))),
+            CircGuardModification(cond, True),
+            CircEncConstraint(plain, rnd, pk, cipher, False),
+            CircGuardModification(None),
+            CircEncConstraint(plain, rnd, pk, cipher, False),
+            CircEncConstraint(plain, rnd, pk, cipher, False),
+        ]
+        opt = optimize_phi(phi)
+        self.assertEqual(2, len([s for s in opt if isinstance(s, CircEncConstraint)]))
+
+    def test_dead_temporaries_are_removed(self):
+        x = _in('zk__in0', TypeName.uint_type())
+        phi = [
+            CircVarDecl(_tmp('tmp0'), _op('+', TypeName.uint_type(), _in_ref(x), _lit(1))),
+            CircVarDecl(_tmp('tmp1'), _op('/', TypeName.uint_type(), _in_ref(x), _lit(0))),
+        ]
+        opt = optimize_phi(phi)
+        self.assertEqual(['tmp1'], [s.lhs.name for s in opt])
+
+    def test_import_legacy_settings(self):
+        old_settings = cfg.export_compiler_settings()
+        try:
+            cfg.opt_circuit_constraints = True
+            legacy = {k: v for k, v in old_settings.items() if k not in ['opt_circuit_constraints', 'opt_pack_circuit_io']}
+            cfg.import_compiler_settings(legacy)
+            self.assertFalse(cfg.opt_circuit_constraints)
+            self.assertFalse(cfg.opt_pack_circuit_io)
+            self.assertEqual(old_settings['opt_native_offchain_locals'], cfg.opt_native_offchain_locals)
+
+            cfg.import_compiler_settings(old_settings)
+            self.assertEqual(old_settings, cfg.export_compiler_settings())
+        finally:
+            cfg.import_compiler_settings(old_settings)
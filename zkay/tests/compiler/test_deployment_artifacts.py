@@ -0,0 +1,93 @@
+import os
+import tempfile
+
+from zkay.compiler.privacy.deployment_artifacts import DeploymentArtifacts, strip_metadata, _get_address_offsets
+from zkay.compiler.privacy.proving_scheme.proving_scheme import ProvingScheme
+from zkay.compiler.solidity.compiler import compile_solidity_json
+from zkay.config import cfg
+from zkay.tests.zkay_unit_test import ZkayTestCase
+
+pki_code = '''\
+pragma solidity ^0.6.0;
+
+contract {pki} {{
+    function getPk(address) public pure returns (uint) {{
+        return 1;
+    }}
+}}
+'''
+
+contract_code = '''\
+pragma solidity ^0.6.0;
+
+import "./{pki}.sol";
+
+contract Test {{
+    {pki} public constant {pki_var} = {pki}(0);
+    uint public x;
+
+    function f() public {{
+        x = {pki_var}.getPk(msg.sender);
+    }}
+}}
+'''
+
+
+class TestDeploymentArtifacts(ZkayTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.pki = cfg.pki_contract_name
+        self.pki_var = cfg.get_contract_var_name(self.pki)
+        files = {
+            'contract.sol': contract_code.format(pki=self.pki, pki_var=self.pki_var),
+            f'{self.pki}.sol': pki_code.format(pki=self.pki),
+            ProvingScheme.verify_libs_contract_filename: '',
+        }
+        for filename, code in files.items():
+            with open(os.path.join(self.tmpdir.name, filename), 'w') as f:
+                f.write(code)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def test_patched_bytecode_matches_compilation_with_addresses(self):
+        artifacts = DeploymentArtifacts.generate(self.tmpdir.name, [])
+        self.assertEqual(1, len(artifacts.data['contracts']['Test']['address_offsets']['deployed_bin'][self.pki]))
+
+        address = '0x' + '12' * 20
+        patched = artifacts.get_contract('Test', {self.pki: address})
+
+        with open(os.path.join(self.tmpdir.name, 'contract.sol')) as f:
+            code = f.read().replace(f'{self.pki}(0)', f'{self.pki}(0x{"12" * 20})')
+        with open(os.path.join(self.tmpdir.name, 'contract.inst.sol'), 'w') as f:
+            f.write(code)
+        out = compile_solidity_json(os.path.join(self.tmpdir.name, 'contract.inst.sol'),
+                                    optimizer_runs=cfg.opt_solc_optimizer_runs)['contracts']['contract.inst.sol']['Test']
+
+        # Only the metadata hash differs, since it covers the source text
+        self.assertEqual(strip_metadata(out['evm']['bytecode']['object']), strip_metadata(patched['bin']))
+        self.assertEqual(strip_metadata(out['evm']['deployedBytecode']['object']), strip_metadata(patched['deployed_bin']))
+
+    def test_inconsistent_placeholder_occurrences_are_rejected(self):
+        placeholder = DeploymentArtifacts.placeholder_address('C')
+        push = f'73{placeholder}'
+        self.assertEqual(([4, 46], [4]), _get_address_offsets(f'60{push}{push}', f'60{push}', placeholder, True))
+        self.assertIsNone(_get_address_offsets('6000', '6000', placeholder, False))
+
+        with self.assertRaises(ValueError):
+            # Runtime bytecode is part of the creation bytecode
+            _get_address_offsets(f'60{push}', f'60{push}{push}', placeholder, True)
+        with self.assertRaises(ValueError):
+            # Public constant must occur in the runtime bytecode
+            _get_address_offsets(f'60{push}', '6000', placeholder, True)
+        with self.assertRaises(ValueError):
+            # Not the operand of a PUSH20 instruction
+            _get_address_offsets(f'6000{placeholder}', f'6000{placeholder}', placeholder, False)
+
+    def test_strip_metadata(self):
+        metadata = 'a2646970667358221220' + '00' * 32 + '64736f6c634300060c' + '0033'
+        self.assertEqual('6080', strip_metadata('6080' + metadata))
+        self.assertEqual('6080', strip_metadata('6080'))
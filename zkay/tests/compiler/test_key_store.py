@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+from zkay.compiler.privacy.circuit_generation import key_store
+from zkay.config import cfg
+from zkay.tests.zkay_unit_test import ZkayTestCase
+
+
+class TestKeyStore(ZkayTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_data_dir = cfg.data_dir
+        cfg.data_dir = os.path.join(self.tmpdir.name, 'data')
+
+    def tearDown(self) -> None:
+        cfg.data_dir = self.old_data_dir
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def _make_dir(self, name: str):
+        d = os.path.join(self.tmpdir.name, name)
+        os.makedirs(d)
+        return [os.path.join(d, f) for f in ['verification.key', 'proving.key']]
+
+    def test_keys_are_shared_between_directories(self):
+        src_paths = self._make_dir('a')
+        for path in src_paths:
+            with open(path, 'w') as f:
+                f.write(os.path.basename(path))
+
+        key = key_store.get_key('circuit_digest')
+        dst_paths = self._make_dir('b')
+        self.assertFalse(key_store.fetch(key, dst_paths))
+        key_store.store(key, src_paths)
+        self.assertTrue(key_store.fetch(key, dst_paths))
+        for path in dst_paths:
+            with open(path) as f:
+                self.assertEqual(os.path.basename(path), f.read())
+
+        self.assertFalse(key_store.fetch(key_store.get_key('other_digest'), dst_paths))
+
+    def test_key_depends_on_proving_scheme(self):
+        key = key_store.get_key('circuit_digest')
+        old_scheme = cfg.proving_scheme
+        try:
+            cfg.proving_scheme = 'groth16' if old_scheme != 'groth16' else 'gm17'
+            self.assertNotEqual(key, key_store.get_key('circuit_digest'))
+        finally:
+            cfg.proving_scheme = old_scheme
@@ -1,7 +1,11 @@
 import os
-from unittest import TestCase
+import tempfile
+import threading
+from unittest import TestCase, mock
 
-from zkay.compiler.solidity.compiler import compile_solidity_code, compile_solidity_json
+from zkay.compiler.solidity.compiler import compile_solidity_code, compile_solidity_json, check_compilations, \
+    SolcException, compile_solidity_json_parallel
+from zkay.config import cfg
 from zkay.examples.examples import others_dir
 
 simple_storage = """
@@ -29,3 +33,82 @@ class TestCompileSolidity(TestCase):
     def test_compile_with_import(self):
         compile_output = compile_solidity_json(os.path.join(others_dir, 'AddUser.sol'))
         self.assertIsNotNone(compile_output)
+
+    def test_compile_cached(self):
+        from zkay.compiler.solidity import compiler
+        with tempfile.TemporaryDirectory() as d:
+            old_data_dir = cfg.data_dir
+            cfg.data_dir = os.path.join(d, 'data')
+            try:
+                filename = os.path.join(d, 'SimpleStorage.sol')
+                with open(filename, 'w') as f:
+                    f.write(simple_storage)
+                with mock.patch.object(compiler, 'compile_standard', wraps=compiler.compile_standard) as solc:
+                    first = compile_solidity_json(filename)
+                    self.assertEqual(first, compile_solidity_json(filename))
+                    self.assertEqual(1, solc.call_count)
+
+                    with open(filename, 'a') as f:
+                        f.write('\n')
+                    compile_solidity_json(filename)
+                    self.assertEqual(2, solc.call_count)
+            finally:
+                cfg.data_dir = old_data_dir
+
+    def test_check_multiple_files(self):
+        with tempfile.TemporaryDirectory() as d:
+            good = os.path.join(d, 'Good.sol')
+            bad = os.path.join(d, 'Bad.sol')
+            with open(good, 'w') as f:
+                f.write(simple_storage)
+            with open(bad, 'w') as f:
+                f.write(simple_storage.replace('SimpleStorage', 'Bad').replace('storedData = x;', 'storedData = y;'))
+
+            check_compilations([good])
+            with self.assertRaises(SolcException) as ctx:
+                check_compilations([good, bad])
+            self.assertIn("In file 'Bad.sol'", str(ctx.exception))
+            self.assertNotIn("In file 'Good.sol'", str(ctx.exception))
+
+    def test_compile_parallel(self):
+        cwd = os.getcwd()
+        jobs = [{'sol_filename': os.path.join(others_dir, 'AddUser.sol'), 'optimizer_runs': runs} for runs in [-1, 50, 200]]
+        outputs = compile_solidity_json_parallel(jobs)
+        self.assertEqual(3, len(outputs))
+        self.assertEqual(compile_solidity_json(**jobs[1]), outputs[1])
+        self.assertEqual(cwd, os.getcwd())
+
+    def test_compile_parallel_uses_solc_version_of_caller(self):
+        from zkay.compiler.solidity import compiler
+        from zkay.config import Config
+
+        def solc_version():
+            # Workers must not read the (possibly thread dependent) configuration
+            return 'v0.6.11' if threading.current_thread() is threading.main_thread() else 'v0.0.0'
+
+        old_cache_size = cfg.solc_cache_size
+        cfg.solc_cache_size = 0
+        try:
+            with mock.patch.object(Config, 'solc_version', new_callable=mock.PropertyMock, side_effect=solc_version), \
+                    mock.patch.object(compiler, 'compile_standard', return_value={}) as solc:
+                jobs = [{'sol_filename': os.path.join(others_dir, 'AddUser.sol'), 'optimizer_runs': runs} for runs in [-1, 50]]
+                compile_solidity_json_parallel(jobs, max_workers=2)
+            self.assertEqual(['0.6.11'] * 2, [str(call[1]['solc_version']) for call in solc.call_args_list])
+        finally:
+            cfg.solc_cache_size = old_cache_size
+
+    def test_library_compilation_environment(self):
+        old_runs = cfg.opt_solc_optimizer_runs
+        other_thread_runs = []
+        with self.assertRaises(RuntimeError):
+            with cfg.library_compilation_environment():
+                self.assertEqual(f'v{cfg.library_solc_version}', cfg.solc_version)
+                self.assertEqual(1000, cfg.opt_solc_optimizer_runs)
+
+                # Other threads are not affected
+                t = threading.Thread(target=lambda: other_thread_runs.append(cfg.opt_solc_optimizer_runs))
+                t.start()
+                t.join()
+                raise RuntimeError()
+        self.assertEqual([old_runs], other_thread_runs)
+        self.assertEqual(old_runs, cfg.opt_solc_optimizer_runs)
@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+from zkay.compiler.privacy import stage_cache
+from zkay.config import cfg
+from zkay.tests.zkay_unit_test import ZkayTestCase
+
+
+class TestStageCache(ZkayTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_data_dir = cfg.data_dir
+        cfg.data_dir = self.tmpdir.name
+
+    def tearDown(self) -> None:
+        cfg.data_dir = self.old_data_dir
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def test_key_depends_on_code_and_settings(self):
+        key = stage_cache.get_key('contract A {}')
+        self.assertEqual(key, stage_cache.get_key('contract A {}'))
+        self.assertNotEqual(key, stage_cache.get_key('contract B {}'))
+
+        old_threshold = cfg.opt_hash_threshold
+        try:
+            cfg.opt_hash_threshold = old_threshold + 1
+            self.assertNotEqual(key, stage_cache.get_key('contract A {}'))
+        finally:
+            cfg.opt_hash_threshold = old_threshold
+
+    def test_cached_stage_is_computed_once(self):
+        calls = []
+
+        def compute():
+            calls.append(None)
+            return {'ast': [1, 2, 3]}
+
+        key = stage_cache.get_key('contract A {}')
+        self.assertEqual({'ast': [1, 2, 3]}, stage_cache.cached(key, 'test', compute))
+        self.assertEqual({'ast': [1, 2, 3]}, stage_cache.cached(key, 'test', compute))
+        self.assertEqual(1, len(calls))
+
+        stage_cache.clear()
+        stage_cache.cached(key, 'test', compute)
+        self.assertEqual(2, len(calls))
+
+    def test_entries_writable_by_others_are_ignored(self):
+        key = stage_cache.get_key('contract A {}')
+        stage_cache.store(key, 'test', {'ast': [1]})
+        self.assertEqual({'ast': [1]}, stage_cache.lookup(key, 'test'))
+
+        os.chmod(os.path.join(stage_cache.get_cache_dir(), f'{key}.test.pickle'), 0o666)
+        self.assertIsNone(stage_cache.lookup(key, 'test'))
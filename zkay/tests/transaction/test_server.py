@@ -0,0 +1,115 @@
+import os
+import tempfile
+
+from zkay.compiler.privacy.deployment_artifacts import DeploymentArtifacts
+from zkay.config import cfg
+from zkay.tests.zkay_unit_test import ZkayTestCase
+from zkay.transaction.runtime import Runtime
+from zkay.transaction.server import ZkayServer, RpcError, _to_json
+from zkay.transaction.types import AddressValue
+
+counter_code = '''\
+pragma zkay >=0.2.0;
+
+contract Counter {
+    uint x;
+
+    function set(uint v) public {
+        x = v;
+    }
+
+    function get() public view returns (uint) {
+        return x;
+    }
+}
+'''
+
+
+class TestServer(ZkayTestCase):
+
+    def test_to_json(self):
+        addr = AddressValue('0x' + '12' * 20)
+        self.assertEqual(['0x' + '12' * 20, [1, True]], _to_json((addr, [1, True])))
+        self.assertEqual({'1': None}, _to_json({1: None}))
+
+    def test_invalid_requests(self):
+        server = ZkayServer.__new__(ZkayServer)
+        self.assertEqual(RpcError.invalid_request, server._dispatch({'id': 1, 'method': 'contracts'})['error']['code'])
+        resp = server._dispatch({'jsonrpc': '2.0', 'id': 2, 'method': 'unknown'})
+        self.assertEqual(2, resp['id'])
+        self.assertEqual(RpcError.method_not_found, resp['error']['code'])
+
+    def test_authorization(self):
+        server = ZkayServer.__new__(ZkayServer)
+        server.token = 'secret'
+        self.assertTrue(server.is_authorized('Bearer secret'))
+        self.assertFalse(server.is_authorized('Bearer other'))
+        self.assertFalse(server.is_authorized('secret'))
+        self.assertFalse(server.is_authorized(None))
+
+
+class TestServerTransactions(ZkayTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.old_cfg = cfg.blockchain_backend, cfg.crypto_backend
+        cfg.blockchain_backend, cfg.crypto_backend = 'w3-eth-tester', 'dummy'
+        Runtime.reset()
+
+        from zkay.zkay_frontend import compile_zkay
+        self.tmpdir = tempfile.TemporaryDirectory()
+        compile_zkay(counter_code, self.tmpdir.name)
+
+    def tearDown(self) -> None:
+        Runtime.reset()
+        cfg.blockchain_backend, cfg.crypto_backend = self.old_cfg
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def _create_server(self, **kwargs):
+        server = ZkayServer([self.tmpdir.name], **kwargs)
+        with server.runtime.activate():
+            self.user, self.other_user = server.runtime.blockchain().create_test_accounts(2)
+        return server
+
+    def test_deploy_transact_call_get_plain(self):
+        server = self._create_server()
+        self.assertEqual({'set': 'nonpayable', 'get': 'view'}, server.rpc_contracts()['Counter']['functions'])
+
+        address = server.handle('deploy', {'contract': 'Counter', 'user': self.user})
+        server.handle('transact', {'contract': 'Counter', 'address': address, 'user': self.user,
+                                   'function': 'set', 'args': [42]})
+        self.assertEqual(42, server.handle('call', {'contract': 'Counter', 'address': address, 'user': self.other_user,
+                                                    'function': 'get'}))
+        self.assertEqual(42, server.handle('get_plain', {'contract': 'Counter', 'address': address,
+                                                         'user': self.other_user, 'name': 'x'}))
+
+        with self.assertRaises(RpcError) as e:
+            server.handle('call', {'contract': 'Counter', 'address': address, 'user': self.user,
+                                   'function': 'set', 'args': [1]})
+        self.assertEqual(RpcError.invalid_params, e.exception.code)
+        self.assertEqual(42, server.handle('get_plain', {'contract': 'Counter', 'address': address,
+                                                         'user': self.user, 'name': 'x'}))
+
+    def test_mutability_without_artifacts(self):
+        os.remove(os.path.join(self.tmpdir.name, DeploymentArtifacts.filename))
+        server = self._create_server()
+        self.assertEqual({'set': 'nonpayable', 'get': 'view'}, server.rpc_contracts()['Counter']['functions'])
+
+    def test_call_unknown_mutability(self):
+        server = self._create_server()
+        address = server.handle('deploy', {'contract': 'Counter', 'user': self.user})
+        server.contracts['Counter'].functions['set'] = '?'
+        with self.assertRaises(RpcError) as e:
+            server.handle('call', {'contract': 'Counter', 'address': address, 'user': self.user,
+                                   'function': 'set', 'args': [1]})
+        self.assertEqual(RpcError.invalid_params, e.exception.code)
+        self.assertEqual(0, server.handle('get_plain', {'contract': 'Counter', 'address': address,
+                                                        'user': self.user, 'name': 'x'}))
+
+    def test_restricted_users(self):
+        server = self._create_server()
+        server.users = {str(AddressValue(self.user))}
+        address = server.handle('deploy', {'contract': 'Counter', 'user': self.user})
+        with self.assertRaises(RpcError):
+            server.handle('get_plain', {'contract': 'Counter', 'address': address, 'user': self.other_user, 'name': 'x'})
@@ -0,0 +1,84 @@
+import threading
+
+from zkay.config import cfg
+from zkay.tests.zkay_unit_test import ZkayTestCase
+from zkay.transaction.state_mirror import StateMirror
+
+
+class _Handle:
+    address = '0x01'
+
+
+class _Chain:
+    """Minimal in-memory chain which records all state requests."""
+
+    def __init__(self):
+        self.block = 1
+        self.storage = {1: {('x',): 1}}
+        self.requests = []
+
+    def _get_block_number(self):
+        return self.block
+
+    def _storage_modified(self, contract_handle, from_block, to_block):
+        return self.storage[from_block] != self.storage[to_block]
+
+    def _req_state_var(self, contract_handle, name, *indices, block=None):
+        self.requests.append((name, *indices, block))
+        return self.storage[block][(name, *indices)]
+
+    def mine(self, storage):
+        self.block += 1
+        self.storage[self.block] = storage
+
+
+class TestStateMirror(ZkayTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.chain = _Chain()
+        self.mirror = StateMirror(self.chain)
+
+    def test_reads_are_served_locally(self):
+        self.assertEqual(1, self.mirror.get(_Handle(), 'x'))
+        self.assertEqual(1, self.mirror.get(_Handle(), 'x'))
+        self.assertEqual([('x', 1)], self.chain.requests)
+
+    def test_sync_keeps_unmodified_state(self):
+        self.mirror.get(_Handle(), 'x')
+        self.chain.mine({('x',): 1})
+        self.assertEqual(2, self.mirror.sync(_Handle(), force=True))
+        self.assertEqual(1, self.mirror.get(_Handle(), 'x'))
+        self.assertEqual(1, len(self.chain.requests))
+
+    def test_sync_discards_modified_state(self):
+        self.mirror.get(_Handle(), 'x')
+        self.chain.mine({('x',): 2})
+        self.mirror.sync(_Handle(), force=True)
+        self.assertEqual(2, self.mirror.get(_Handle(), 'x'))
+        self.assertEqual(('x', 2), self.chain.requests[-1])
+
+    def test_sync_interval(self):
+        old_interval = cfg.blockchain_state_mirror_sync_interval
+        try:
+            cfg.blockchain_state_mirror_sync_interval = 60 * 1000
+            self.mirror.get(_Handle(), 'x')
+            self.chain.mine({('x',): 2})
+            self.assertEqual(1, self.mirror.get(_Handle(), 'x'))
+            self.mirror.invalidate(_Handle.address)
+            self.assertEqual(2, self.mirror.get(_Handle(), 'x'))
+        finally:
+            cfg.blockchain_state_mirror_sync_interval = old_interval
+
+    def test_invalidate_during_get(self):
+        sync = self.mirror.sync
+
+        def sync_and_invalidate(contract_handle, force=False):
+            block = sync(contract_handle, force)
+            t = threading.Thread(target=self.mirror.invalidate, args=(contract_handle.address,))
+            t.start()
+            t.join(0.1)
+            return block
+
+        self.mirror.sync = sync_and_invalidate
+        self.assertEqual(1, self.mirror.get(_Handle(), 'x'))
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+
+from zkay.config import cfg
+from zkay.tests.zkay_unit_test import ZkayTestCase
+from zkay.transaction.verification_cache import VerificationCache
+
+
+class TestVerificationCache(ZkayTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'cache.json')
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+        cfg.blockchain_reverify = False
+        super().tearDown()
+
+    def test_key_depends_on_all_components(self):
+        k = VerificationCache.make_key('contract', 1, '0xabc', 'code')
+        self.assertEqual(k, VerificationCache.make_key('contract', 1, '0xabc', 'code'))
+        self.assertNotEqual(k, VerificationCache.make_key('contract', 2, '0xabc', 'code'))
+        self.assertNotEqual(k, VerificationCache.make_key('contract', 1, '0xabc', 'other_code'))
+
+    def test_persistence(self):
+        key = VerificationCache.make_key('test')
+        VerificationCache(self.filename).store(key, {'abi': [1, 2]})
+        self.assertEqual({'abi': [1, 2]}, VerificationCache(self.filename).lookup(key))
+        self.assertIsNone(VerificationCache(self.filename).lookup(VerificationCache.make_key('other')))
+
+    def test_reverify_bypasses_cache(self):
+        cache = VerificationCache(self.filename)
+        key = VerificationCache.make_key('test')
+        cache.store(key, 42)
+        cfg.blockchain_reverify = True
+        self.assertIsNone(cache.lookup(key))
+        cfg.blockchain_reverify = False
+        self.assertEqual(42, cache.lookup(key))
+
+    def test_eviction(self):
+        cache = VerificationCache(self.filename)
+        cache.max_entries = 2
+        keys = [VerificationCache.make_key(i) for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.store(key, i)
+        self.assertIsNone(cache.lookup(keys[0]))
+        self.assertEqual(2, cache.lookup(keys[2]))
+
+    def test_file_stats_detect_in_place_rewrite(self):
+        key_file = os.path.join(self.tmpdir.name, 'proving.key')
+        with open(key_file, 'w') as f:
+            f.write('key1')
+        st = os.stat(key_file)
+        stats = VerificationCache.file_stats(self.tmpdir.name)
+
+        # Same size and modification time, but different contents (wait for coarse file system timestamps)
+        time.sleep(0.05)
+        with open(key_file, 'w') as f:
+            f.write('key2')
+        os.utime(key_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertNotEqual(stats, VerificationCache.file_stats(self.tmpdir.name))
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from zkay.tests.zkay_unit_test import ZkayTestCase
+from zkay.utils.parallel import parallel_map, memory_bounded_map
+
+
+def _inverse(x):
+    return 1 / x
+
+
+class TestParallel(ZkayTestCase):
+
+    def test_order_preserved(self):
+        self.assertEqual([x * x for x in range(20)], parallel_map(lambda x: x * x, range(20), max_workers=4))
+
+    def test_exception_raised(self):
+        with self.assertRaises(ZeroDivisionError):
+            parallel_map(_inverse, [1, 0, 2])
+
+    def test_return_exceptions(self):
+        res = parallel_map(_inverse, [1, 0, 2], return_exceptions=True)
+        self.assertEqual(1, res[0])
+        self.assertIsInstance(res[1], ZeroDivisionError)
+        self.assertEqual(0.5, res[2])
+
+    def test_memory_budget_respected(self):
+        cond = threading.Condition()
+        running = []
+        usage = {'current': 0, 'max': 0, 'max_jobs': 0, 'oversized_not_alone': False}
+
+        def job(mem):
+            release = threading.Event()
+            with cond:
+                usage['current'] += mem
+                running.append(release)
+                if mem > 10:
+                    usage['oversized_not_alone'] |= len(running) > 1
+                else:
+                    usage['max'] = max(usage['max'], usage['current'])
+                usage['max_jobs'] = max(usage['max_jobs'], len(running))
+                cond.notify_all()
+            # Hold the memory until the releaser lets this job finish
+            release.wait(timeout=10)
+            with cond:
+                usage['current'] -= mem
+                running.remove(release)
+            return mem * 2
+
+        mems = [5, 1, 3, 8, 2, 20]
+
+        def releaser():
+            for _ in mems:
+                with cond:
+                    cond.wait_for(lambda: running, timeout=10)
+                # Give the scheduler time to admit all jobs which fit into the remaining budget
+                time.sleep(0.05)
+                with cond:
+                    if running:
+                        running[0].set()
+
+        releaser_thread = threading.Thread(target=releaser)
+        releaser_thread.start()
+        finished = []
+        res = memory_bounded_map(job, mems, mems, 10, max_workers=4, on_finished=lambda item, cnt: finished.append(cnt))
+        releaser_thread.join()
+
+        self.assertEqual([m * 2 for m in mems], res)
+        self.assertEqual(list(range(1, len(mems) + 1)), finished)
+        self.assertLessEqual(usage['max'], 10)
+        self.assertFalse(usage['oversized_not_alone'])
+        self.assertGreater(usage['max_jobs'], 1)
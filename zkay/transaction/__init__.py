@@ -7,7 +7,10 @@ Submodules
 * :py:mod:`.interface`: Runtime API interface
 * :py:mod:`.offchain`: Offchain simulator base class with common functionality
 * :py:mod:`.runtime`: Static class which provides access to the individual API backend singletons.
+* :py:mod:`.server`: Long-running JSON-RPC server which serves transactions for compiled zkay contracts (zkay serve).
+* :py:mod:`.state_mirror`: Block-height consistent local mirror of contract state for offchain simulation.
 * :py:mod:`.types`: Type wrapper classes (for safer API interactions) used by the Runtime API.
+* :py:mod:`.verification_cache`: Persistent cache for the results of contract integrity checks.
 
 ===========
 Subpackages
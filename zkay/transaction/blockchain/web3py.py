@@ -1,6 +1,8 @@
+import hashlib
 import json
 import os
 import tempfile
+import threading
 from abc import abstractmethod
 from contextlib import contextmanager
 from pathlib import Path
@@ -8,20 +10,26 @@ from typing import Any, Dict, Optional, Tuple, List, Union
 
 from eth_tester import PyEVMBackend, EthereumTester
 from web3 import Web3
+from web3.providers.eth_tester import EthereumTesterProvider
 
 from zkay import my_logging
 from zkay.compiler.privacy import library_contracts
-from zkay.compiler.solidity.compiler import compile_solidity_json
+from zkay.compiler.privacy.deployment_artifacts import DeploymentArtifacts, strip_metadata
+from zkay.compiler.solidity.compiler import compile_solidity_json, get_source_digest
 from zkay.config import cfg, zk_print, zk_print_banner
 from zkay.my_logging.log_context import log_context
 from zkay.transaction.interface import ZkayBlockchainInterface, IntegrityError, BlockChainError, \
     TransactionFailedException
+from zkay.transaction.verification_cache import VerificationCache
 from zkay.transaction.types import PublicKeyValue, AddressValue, MsgStruct, BlockStruct, TxStruct
 from zkay.utils.helpers import get_contract_names, save_to_file
-from zkay.zkay_ast.process_ast import get_verification_contract_names
+from zkay.utils.parallel import parallel_map
 
 max_gas_limit = 10000000
 
+max_indexed_blocks = 256
+"""Maximum number of blocks which are scanned for transactions when synchronizing the state mirror without eth_getProof"""
+
 
 class Web3Blockchain(ZkayBlockchainInterface):
     def __init__(self) -> None:
@@ -29,17 +37,37 @@ class Web3Blockchain(ZkayBlockchainInterface):
         self.w3 = self._create_w3_instance()
         if not self.w3.isConnected():
             raise BlockChainError(f'Failed to connect to blockchain: {self.w3.provider}')
+        self._chain_id = None
 
     @staticmethod
-    def compile_contract(sol_filename: str, contract_name: str, libs: Optional[Dict] = None, cwd=None):
+    def compile_contract(sol_filename: str, contract_name: str, libs: Optional[Dict] = None, cwd=None,
+                         solc_version: Optional[str] = None, optimizer_runs: Optional[int] = None):
         solp = Path(sol_filename)
-        jout = compile_solidity_json(sol_filename, libs, optimizer_runs=cfg.opt_solc_optimizer_runs, cwd=cwd)['contracts'][solp.name][contract_name]
+        if optimizer_runs is None:
+            optimizer_runs = cfg.opt_solc_optimizer_runs
+        jout = compile_solidity_json(sol_filename, libs, optimizer_runs=optimizer_runs, cwd=cwd,
+                                     solc_version=solc_version)['contracts'][solp.name][contract_name]
         return {
             'abi': json.loads(jout['metadata'])['output']['abi'],
             'bin': jout['evm']['bytecode']['object'],
             'deployed_bin': jout['evm']['deployedBytecode']['object']
         }
 
+    @staticmethod
+    def compile_contracts(jobs: List[Tuple[str, str, Optional[Dict]]], cwd=None) -> List[Dict]:
+        """
+        Compile multiple contracts concurrently.
+
+        The solc settings of the calling thread are used for all jobs, the workers do not access the configuration.
+
+        :param jobs: list of (sol_filename, contract_name, libs) tuples, see compile_contract
+        :param cwd: directory relative to which imports are resolved
+        :return: list of compilation results (same order as jobs)
+        """
+        solc_version, optimizer_runs = cfg.solc_version, cfg.opt_solc_optimizer_runs
+        return parallel_map(lambda job: Web3Blockchain.compile_contract(*job, cwd=cwd, solc_version=solc_version,
+                                                                        optimizer_runs=optimizer_runs), jobs)
+
     def deploy_solidity_contract(self, sol_filename: str, contract_name: Optional[str], sender: Union[bytes, str]) -> str:
         contract_name = get_contract_names(sol_filename)[0] if contract_name is None else contract_name
         contract = self._deploy_contract(sender, self.compile_contract(sol_filename, contract_name))
@@ -56,6 +84,12 @@ class Web3Blockchain(ZkayBlockchainInterface):
     def _create_w3_instance(self) -> Web3:
         pass
 
+    @property
+    def chain_id(self) -> int:
+        if self._chain_id is None:
+            self._chain_id = self.w3.eth.chainId
+        return self._chain_id
+
     def _default_address(self) -> Union[None, bytes, str]:
         if cfg.blockchain_default_account is None:
             return None
@@ -74,12 +108,39 @@ class Web3Blockchain(ZkayBlockchainInterface):
         with log_context('transaction', f'announcePk'):
             return self._transact(self.pki_contract, address, 'announcePk', pk)
 
-    def _req_state_var(self, contract_handle, name: str, *indices) -> Any:
+    def _req_state_var(self, contract_handle, name: str, *indices, block: Optional[int] = None) -> Any:
         try:
-            return contract_handle.functions[name](*indices).call()
+            return contract_handle.functions[name](*indices).call(block_identifier=block)
         except Exception as e:
             raise BlockChainError(e.args)
 
+    def _get_block_number(self) -> int:
+        try:
+            return self.w3.eth.blockNumber
+        except Exception as e:
+            raise BlockChainError(e.args)
+
+    def _storage_modified(self, contract_handle, from_block: int, to_block: int) -> bool:
+        address = contract_handle.address
+        try:
+            # Cheap check via storage root if the node supports eth_getProof
+            return self.w3.eth.getProof(address, [], from_block)['storageHash'] != \
+                self.w3.eth.getProof(address, [], to_block)['storageHash']
+        except Exception:
+            pass
+
+        # Otherwise, storage is only guaranteed to be unchanged if there were no transactions at all in the block range
+        # (transactions to other contracts may modify this contract's storage via internal calls)
+        if to_block - from_block > max_indexed_blocks:
+            return True
+        try:
+            for number in range(from_block + 1, to_block + 1):
+                if self.w3.eth.getBlockTransactionCount(number) > 0:
+                    return True
+        except Exception as e:
+            raise BlockChainError(e.args)
+        return False
+
     def _call(self, contract_handle, sender: Union[bytes, str], name: str, *args) -> Union[bool, int, str]:
         try:
             fct = contract_handle.functions[name]
@@ -109,13 +170,21 @@ class Web3Blockchain(ZkayBlockchainInterface):
         return tx_receipt
 
     def _deploy(self, project_dir: str, sender: Union[bytes, str], contract: str, *actual_args, wei_amount: Optional[int] = None) -> Any:
-        with open(os.path.join(project_dir, 'contract.zkay')) as f:
-            verifier_names = get_verification_contract_names(f.read())
+        artifacts = DeploymentArtifacts.load(project_dir)
+        if artifacts is not None:
+            verifier_names = artifacts.verifier_names
+        else:
+            verifier_names = self._get_verifier_names(project_dir)
 
         # Deploy verification contracts if not already done
         external_contract_addresses =  self._deploy_dependencies(sender, project_dir, verifier_names)
-        with self.__hardcoded_external_contracts_ctx(project_dir, external_contract_addresses) as filename:
-            cout = self.compile_contract(filename, contract, cwd=project_dir)
+        if artifacts is not None:
+            # Patch addresses into precompiled bytecode
+            cout = artifacts.get_contract(contract, {name: self.__normalized_hex(addr.val)
+                                                     for name, addr in external_contract_addresses.items()})
+        else:
+            with self.__hardcoded_external_contracts_ctx(project_dir, external_contract_addresses) as filename:
+                cout = self.compile_contract(filename, contract, cwd=project_dir)
         handle = self._deploy_contract(sender, cout, *actual_args, wei_amount=wei_amount)
         zk_print(f'Deployed contract "{contract}" at address "{handle.address}"')
         return handle
@@ -135,14 +204,51 @@ class Web3Blockchain(ZkayBlockchainInterface):
         )
         return contract
 
+    def _deploy_contracts(self, sender: Union[bytes, str], contract_interfaces: List[Tuple[str, Dict]]) -> List[Any]:
+        """
+        Deploy multiple independent contracts which have no constructor arguments.
+
+        All deployment transactions are submitted back-to-back with explicit consecutive nonces,
+        only afterwards the receipts are awaited. Thus the deployment takes roughly as long as a single deployment.
+
+        :param sender: deployer address
+        :param contract_interfaces: list of (name, compilation output) tuples, the name is only used for logging
+        :raise BlockChainError: if there is an error in the backend
+        :raise TransactionFailedException: if any of the deployment transactions failed
+        :return: list of contract handles (same order as contract_interfaces)
+        """
+        try:
+            nonce = self.w3.eth.getTransactionCount(sender, 'pending')
+            tx_hashes = []
+            for idx, (_, contract_interface) in enumerate(contract_interfaces):
+                constructor = self.w3.eth.contract(abi=contract_interface['abi'], bytecode=contract_interface['bin']).constructor()
+                gas_amount = self._gas_heuristic(sender, constructor)
+                tx_hashes.append(constructor.transact({'from': sender, 'gas': gas_amount, 'nonce': nonce + idx}))
+            tx_receipts = [self.w3.eth.waitForTransactionReceipt(tx_hash) for tx_hash in tx_hashes]
+        except Exception as e:
+            raise BlockChainError(e.args)
+
+        contracts = []
+        for (name, contract_interface), tx_receipt in zip(contract_interfaces, tx_receipts):
+            if tx_receipt['status'] == 0:
+                raise TransactionFailedException(f'Deployment of {name} failed')
+            with log_context('transaction', f'deploy_{name}'):
+                gas = tx_receipt['gasUsed']
+                zk_print(f"Consumed gas: {gas}")
+                my_logging.data('gas', gas)
+            contracts.append(self.w3.eth.contract(address=tx_receipt.contractAddress, abi=contract_interface['abi']))
+        return contracts
+
     def _deploy_dependencies(self, sender: Union[bytes, str], project_dir: str, verifier_names: List[str]) -> Dict[str, AddressValue]:
-        # Deploy verification contracts if not already done
-        vf = {}
-        for verifier_name in verifier_names:
-            with log_context('transaction', f'deploy_{verifier_name}'):
-                filename = os.path.join(project_dir, f'{verifier_name}.sol')
-                cout = self.compile_contract(filename, verifier_name, self.lib_addresses)
-                vf[verifier_name] = AddressValue(self._deploy_contract(sender, cout).address)
+        # Deploy verification contracts (independent of each other -> compile and deploy all of them at once)
+        artifacts = DeploymentArtifacts.load(project_dir)
+        if artifacts is not None and set(verifier_names) <= set(artifacts.verifier_names):
+            couts = [artifacts.get_verifier(verifier_name, self.lib_addresses) for verifier_name in verifier_names]
+        else:
+            couts = self.compile_contracts([(os.path.join(project_dir, f'{verifier_name}.sol'), verifier_name, self.lib_addresses)
+                                            for verifier_name in verifier_names])
+        contracts = self._deploy_contracts(sender, list(zip(verifier_names, couts)))
+        vf = {verifier_name: AddressValue(contract.address) for verifier_name, contract in zip(verifier_names, contracts)}
         vf[cfg.pki_contract_name] = AddressValue(self.pki_contract.address)
         return vf
 
@@ -169,15 +275,18 @@ class Web3Blockchain(ZkayBlockchainInterface):
                     self._lib_addresses[lib] = out.address
 
     def _connect(self, project_dir: str, contract: str, address: Union[bytes, str]) -> Any:
-        filename = os.path.join(project_dir, 'contract.sol')
-        cout = self.compile_contract(filename, contract)
+        artifacts = DeploymentArtifacts.load(project_dir)
+        if artifacts is not None:
+            abi = artifacts.get_contract_abi(contract)
+        else:
+            abi = self.compile_contract(os.path.join(project_dir, 'contract.sol'), contract)['abi']
         return self.w3.eth.contract(
-            address=address, abi=cout['abi']
+            address=address, abi=abi
         )
 
     def _verify_contract_integrity(self, address: Union[bytes, str], sol_filename: str, *,
                                    libraries: Dict = None, contract_name: str = None, is_library: bool = False,
-                                   cwd=None) -> Any:
+                                   cwd=None, precompiled: Optional[Dict] = None, ignore_metadata: bool = False) -> Any:
         if isinstance(address, bytes):
             address = self.w3.toChecksumAddress(address)
 
@@ -187,19 +296,37 @@ class Web3Blockchain(ZkayBlockchainInterface):
         if not actual_byte_code:
             raise IntegrityError(f'Expected contract {contract_name} is not deployed at address {address}')
 
-        cout = self.compile_contract(sol_filename, contract_name, libs=libraries, cwd=cwd)
-        expected_byte_code = self.__normalized_hex(cout['deployed_bin'])
-
-        if is_library:
-            # https://github.com/ethereum/solidity/issues/7101
-            expected_byte_code = expected_byte_code[:2] + self.__normalized_hex(address) + expected_byte_code[42:]
-
-        if actual_byte_code != expected_byte_code:
-            raise IntegrityError(f'Deployed contract at address {address} does not match local contract {sol_filename}')
-        zk_print(f'Contract@{address} matches {sol_filename[sol_filename.rfind("/") + 1:]}:{contract_name}')
+        # Integrity check result only depends on the remote code and on the local sources and compiler settings
+        cache_key = self._verification_cache_key('contract', address, actual_byte_code, sol_filename,
+                                                 contract_name, libraries, is_library, cwd=cwd)
+        abi = self.verification_cache.lookup(cache_key)
+        # The metadata hash covers the exact source text, which differs between the placeholder-patched deployment
+        # artifacts and a compilation with hardcoded addresses, the executable code is identical
+        normalize = strip_metadata if ignore_metadata else (lambda code: code)
+        if abi is None and precompiled is not None and \
+                normalize(self.__normalized_hex(precompiled['deployed_bin'])) == normalize(actual_byte_code):
+            # Matches precompiled deployment artifact -> no need to invoke solc
+            abi = precompiled['abi']
+            self.verification_cache.store(cache_key, abi)
+            zk_print(f'Contract@{address} matches {sol_filename[sol_filename.rfind("/") + 1:]}:{contract_name}')
+        elif abi is None:
+            cout = self.compile_contract(sol_filename, contract_name, libs=libraries, cwd=cwd)
+            expected_byte_code = self.__normalized_hex(cout['deployed_bin'])
+
+            if is_library:
+                # https://github.com/ethereum/solidity/issues/7101
+                expected_byte_code = expected_byte_code[:2] + self.__normalized_hex(address) + expected_byte_code[42:]
+
+            if normalize(actual_byte_code) != normalize(expected_byte_code):
+                raise IntegrityError(f'Deployed contract at address {address} does not match local contract {sol_filename}')
+            abi = cout['abi']
+            self.verification_cache.store(cache_key, abi)
+            zk_print(f'Contract@{address} matches {sol_filename[sol_filename.rfind("/") + 1:]}:{contract_name}')
+        else:
+            zk_print(f'Contract@{address} matches {sol_filename[sol_filename.rfind("/") + 1:]}:{contract_name} (cached)')
 
         return self.w3.eth.contract(
-            address=address, abi=cout['abi']
+            address=address, abi=abi
         )
 
     def _verify_library_integrity(self, libraries: List[Tuple[str, str]], contract_with_libs_addr: str, sol_with_libs_filename: str) -> Dict[str, str]:
@@ -207,30 +334,51 @@ class Web3Blockchain(ZkayBlockchainInterface):
         actual_code = self.__normalized_hex(self.w3.eth.getCode(contract_with_libs_addr))
         if not actual_code:
             raise IntegrityError(f'Expected contract {cname} is not deployed at address {contract_with_libs_addr}')
-        code_with_placeholders = self.__normalized_hex(self.compile_contract(sol_with_libs_filename, cname)['deployed_bin'])
-
-        if len(actual_code) != len(code_with_placeholders):
-            raise IntegrityError(f'Local code of contract {cname} has different length than remote contract')
-
-        addresses = {}
-        for lib_name, lib_sol in libraries:
-            # Compute placeholder according to
-            # https://solidity.readthedocs.io/en/v0.5.13/using-the-compiler.html#using-the-commandline-compiler
-            hash = self.w3.solidityKeccak(['string'], [f'{lib_sol[lib_sol.rfind("/") + 1:]}:{lib_name}'])
-            placeholder = f'__${self.__normalized_hex(hash)[:34]}$__'
-
-            # Retrieve concrete address in deployed code at placeholder offset in local code and verify library contract integrity
-            lib_address_offset = code_with_placeholders.find(placeholder)
-            if lib_address_offset != -1:
-                lib_address = self.w3.toChecksumAddress(actual_code[lib_address_offset:lib_address_offset+40])
-                with cfg.library_compilation_environment():
-                    self._verify_contract_integrity(lib_address, lib_sol, contract_name=lib_name, is_library=True)
-                addresses[lib_name] = lib_address
-        return addresses
+
+        cache_key = self._verification_cache_key('library_links', contract_with_libs_addr, actual_code,
+                                                 sol_with_libs_filename, cname, libraries)
+        lib_addresses = self.verification_cache.lookup(cache_key)
+        if lib_addresses is None:
+            code_with_placeholders = self.__normalized_hex(self.compile_contract(sol_with_libs_filename, cname)['deployed_bin'])
+
+            if len(actual_code) != len(code_with_placeholders):
+                raise IntegrityError(f'Local code of contract {cname} has different length than remote contract')
+
+            lib_addresses = {}
+            for lib_name, lib_sol in libraries:
+                # Compute placeholder according to
+                # https://solidity.readthedocs.io/en/v0.5.13/using-the-compiler.html#using-the-commandline-compiler
+                hash = self.w3.solidityKeccak(['string'], [f'{lib_sol[lib_sol.rfind("/") + 1:]}:{lib_name}'])
+                placeholder = f'__${self.__normalized_hex(hash)[:34]}$__'
+
+                # Retrieve concrete address in deployed code at placeholder offset in local code
+                lib_address_offset = code_with_placeholders.find(placeholder)
+                if lib_address_offset != -1:
+                    lib_addresses[lib_name] = self.w3.toChecksumAddress(actual_code[lib_address_offset:lib_address_offset+40])
+            self.verification_cache.store(cache_key, lib_addresses)
+
+        # Verify library contract integrity
+        lib_sols = dict(libraries)
+        for lib_name, lib_address in lib_addresses.items():
+            with cfg.library_compilation_environment():
+                self._verify_contract_integrity(lib_address, lib_sols[lib_name], contract_name=lib_name, is_library=True)
+        return lib_addresses
 
     def _verify_zkay_contract_integrity(self, address: str, project_dir: str, pki_verifier_addresses: Dict):
+        precompiled = None
+        artifacts = DeploymentArtifacts.load(project_dir)
+        if artifacts is not None:
+            contract_name = get_contract_names(os.path.join(project_dir, 'contract.sol'))[0]
+            precompiled = artifacts.get_contract(contract_name, {name: self.__normalized_hex(addr.val)
+                                                                 for name, addr in pki_verifier_addresses.items()})
         with self.__hardcoded_external_contracts_ctx(project_dir, pki_verifier_addresses) as sol_file:
-            self._verify_contract_integrity(address, sol_file, cwd=project_dir)
+            self._verify_contract_integrity(address, sol_file, cwd=project_dir, precompiled=precompiled, ignore_metadata=True)
+
+    def _verification_cache_key(self, kind: str, address: str, actual_code: str, sol_filename: str, *settings, cwd=None) -> str:
+        return VerificationCache.make_key(kind, self.chain_id, self.__normalized_hex(address),
+                                          hashlib.sha256(actual_code.encode()).hexdigest(),
+                                          get_source_digest(sol_filename, cwd), cfg.solc_version,
+                                          cfg.opt_solc_optimizer_runs, settings)
 
     @contextmanager
     def __hardcoded_external_contracts_ctx(self, contract_dir: str, pki_verifier_addresses):
@@ -260,6 +408,18 @@ class Web3Blockchain(ZkayBlockchainInterface):
         return min(int(estimate * 1.2), limit)
 
 
+class _SynchronizedEthereumTesterProvider(EthereumTesterProvider):
+    """eth-tester is not thread-safe -> serialize requests (e.g. from concurrent integrity checks)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+
+    def make_request(self, method, params):
+        with self._lock:
+            return super().make_request(method, params)
+
+
 class Web3TesterBlockchain(Web3Blockchain):
     def __init__(self) -> None:
         self.eth_tester = None
@@ -277,24 +437,27 @@ class Web3TesterBlockchain(Web3Blockchain):
         # Since eth-tester is not persistent -> always automatically deploy libraries
         with cfg.library_compilation_environment():
             with tempfile.TemporaryDirectory() as tmpdir:
-                with log_context('transaction', 'deploy_pki'):
-                    pki_sol = save_to_file(tmpdir, f'{cfg.pki_contract_name}.sol', library_contracts.get_pki_contract())
-                    self._pki_contract = self._deploy_contract(sender, self.compile_contract(pki_sol, cfg.pki_contract_name))
-                    zk_print(f'Deployed pki contract at address "{self.pki_contract.address}"')
-
-                with log_context('transaction', 'deploy_verify_libs'):
-                    verify_sol = save_to_file(tmpdir, 'verify_libs.sol', library_contracts.get_verify_libs_code())
-                    self._lib_addresses = {}
-                    for lib in cfg.external_crypto_lib_names:
-                        out = self._deploy_contract(sender, self.compile_contract(verify_sol, lib))
-                        self._lib_addresses[lib] = out.address
-                        zk_print(f'Deployed crypto lib {lib} at address "{out.address}"')
+                pki_sol = save_to_file(tmpdir, f'{cfg.pki_contract_name}.sol', library_contracts.get_pki_contract())
+                verify_sol = save_to_file(tmpdir, 'verify_libs.sol', library_contracts.get_verify_libs_code())
+                jobs = [(pki_sol, cfg.pki_contract_name, None)] + [(verify_sol, lib, None) for lib in cfg.external_crypto_lib_names]
+                couts = self.compile_contracts(jobs)
+
+        # Libraries are independent of each other -> deploy all of them at once
+        names = ['pki'] + ['verify_libs'] * len(cfg.external_crypto_lib_names)
+        contracts = self._deploy_contracts(sender, list(zip(names, couts)))
+
+        self._pki_contract = contracts[0]
+        zk_print(f'Deployed pki contract at address "{self.pki_contract.address}"')
+        self._lib_addresses = {}
+        for lib, out in zip(cfg.external_crypto_lib_names, contracts[1:]):
+            self._lib_addresses[lib] = out.address
+            zk_print(f'Deployed crypto lib {lib} at address "{out.address}"')
 
     def _create_w3_instance(self) -> Web3:
         genesis_overrides = {'gas_limit': int(max_gas_limit * 1.2)}
         custom_genesis_params = PyEVMBackend._generate_genesis_params(overrides=genesis_overrides)
         self.eth_tester = EthereumTester(backend=PyEVMBackend(genesis_parameters=custom_genesis_params))
-        w3 = Web3(Web3.EthereumTesterProvider(self.eth_tester))
+        w3 = Web3(_SynchronizedEthereumTesterProvider(self.eth_tester))
         return w3
 
     def create_test_accounts(self, count: int) -> Tuple:
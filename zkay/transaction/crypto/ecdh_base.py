@@ -2,10 +2,9 @@ import os
 import secrets
 
 from zkay.config import cfg
-from zkay.jsnark_interface.jsnark_interface import circuit_builder_jar
+from zkay.jsnark_interface.jsnark_interface import run_java
 from zkay.transaction.interface import PrivateKeyValue, PublicKeyValue, KeyPair
 from zkay.transaction.interface import ZkayCryptoInterface
-from zkay.utils.run_command import run_command
 
 
 class EcdhBase(ZkayCryptoInterface):
@@ -15,13 +14,13 @@ class EcdhBase(ZkayCryptoInterface):
 
     @staticmethod
     def _gen_keypair(rnd: bytes):
-        keys, _ = run_command(['java', '-Xms4096m', '-Xmx16384m', '-cp', f'{circuit_builder_jar}', 'zkay.ZkayECDHGenerator', rnd.hex()])
+        keys, _ = run_java('zkay.ZkayECDHGenerator', [rnd.hex()])
         keys = keys.splitlines()[-2:]
         return int(keys[0], 16), int(keys[1], 16)
 
     @staticmethod
     def _ecdh_sha256(other_pk: int, my_sk: int):
-        ret, _ = run_command(['java', '-Xms4096m', '-Xmx16384m', '-cp', f'{circuit_builder_jar}', 'zkay.ZkayECDHGenerator', hex(my_sk)[2:], hex(other_pk)[2:]])
+        ret, _ = run_java('zkay.ZkayECDHGenerator', [hex(my_sk)[2:], hex(other_pk)[2:]])
         key = ret.splitlines()[-1]
         return int(key, 16).to_bytes(16, byteorder='big')
 
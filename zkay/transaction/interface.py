@@ -9,17 +9,23 @@ It provides high level functions for
 """
 
 import os
+import threading
 from abc import ABCMeta, abstractmethod
 from builtins import type
 from typing import Tuple, List, Optional, Union, Any, Dict, Collection
 
+from zkay.compiler.privacy.deployment_artifacts import DeploymentArtifacts
 from zkay.compiler.privacy.library_contracts import bn128_scalar_field
+from zkay.compiler.privacy.manifest import Manifest
 from zkay.compiler.privacy.proving_scheme.proving_scheme import ProvingScheme
 from zkay.zkay_ast.process_ast import get_verification_contract_names
 from zkay.zkay_frontend import compile_zkay_file
 from zkay.config import cfg, zk_print, zk_print_banner
 from zkay.transaction.types import AddressValue, MsgStruct, BlockStruct, TxStruct, PublicKeyValue, Value, \
     PrivateKeyValue, CipherValue, RandomnessValue, KeyPair
+from zkay.transaction.state_mirror import StateMirror
+from zkay.transaction.verification_cache import VerificationCache
+from zkay.utils.parallel import parallel_map
 from zkay.utils.progress_printer import success_print
 from zkay.utils.timer import time_measure
 
@@ -60,12 +66,17 @@ class ZkayBlockchainInterface(metaclass=ABCMeta):
     (Zkay ensures reproducibility via hard-coded solc versions/settings for global library contracts and by \
     using the version/settings stored in the manifest file for the main and verification contracts)
 
+    Since this verification is expensive, the results of successful checks are cached persistently \
+    (see :py:mod:`zkay.transaction.verification_cache`), set cfg.blockchain_reverify to bypass the cache.
+
     See documentation of :py:meth:`connect` for more information.
     """
 
     def __init__(self):
         self._pki_contract = None
         self._lib_addresses = None
+        self.verification_cache = VerificationCache(os.path.join(cfg.data_dir, 'verification_cache.json'))
+        self.state_mirror = StateMirror(self)
 
     @property
     def pki_contract(self):
@@ -159,10 +170,26 @@ class ZkayBlockchainInterface(metaclass=ABCMeta):
         """
         assert contract_handle is not None
         zk_print(f'Requesting state variable "{name}"', verbosity_level=2)
-        val = self._req_state_var(contract_handle, name, *Value.unwrap_values(list(indices)))
+        if cfg.blockchain_state_mirror:
+            val = self.state_mirror.get(contract_handle, name, *Value.unwrap_values(list(indices)))
+        else:
+            val = self._req_state_var(contract_handle, name, *Value.unwrap_values(list(indices)))
         zk_print(f'Got value {val} for state variable "{name}"', verbosity_level=2)
         return val
 
+    def sync_state_mirror(self, contract_handle):
+        """
+        Synchronize the local state mirror of the given contract with the current head of the chain.
+
+        This has no effect if cfg.blockchain_state_mirror is disabled.
+
+        :param contract_handle: contract whose state should be synchronized
+        :raise BlockChainError: if request fails
+        """
+        assert contract_handle is not None
+        if cfg.blockchain_state_mirror:
+            self.state_mirror.sync(contract_handle, force=True)
+
     def call(self, contract_handle, sender: AddressValue, name: str, *args) -> Union[bool, int, str, bytes, List]:
         """
         Call the specified pure/view function in the given contract with the provided arguments.
@@ -201,7 +228,10 @@ class ZkayBlockchainInterface(metaclass=ABCMeta):
         self.__check_args(actual_args, should_encrypt)
         zk_print(f'Issuing transaction for function "{function}" from account "{sender}"')
         zk_print(Value.collection_to_string(actual_args), verbosity_level=2)
-        ret = self._transact(contract_handle, sender.val, function, *Value.unwrap_values(actual_args), wei_amount=wei_amount)
+        try:
+            ret = self._transact(contract_handle, sender.val, function, *Value.unwrap_values(actual_args), wei_amount=wei_amount)
+        finally:
+            self.state_mirror.invalidate(contract_handle.address)
         zk_print()
         return ret
 
@@ -285,8 +315,7 @@ class ZkayBlockchainInterface(metaclass=ABCMeta):
         if not os.path.exists(os.path.join(project_dir, 'contract.sol')):
             compile_zkay_file(zk_file, project_dir, import_keys=True, verifier_names=verifier_names)
         else:
-            with open(zk_file) as f:
-                verifier_names = get_verification_contract_names(f.read())
+            verifier_names = self._get_verifier_names(project_dir)
 
         zk_print(f'Connecting to contract {contract}@{contract_address}')
         contract_on_chain = self._connect(project_dir, contract, contract_address.val)
@@ -308,17 +337,32 @@ class ZkayBlockchainInterface(metaclass=ABCMeta):
             libs = self._verify_library_integrity(libraries, some_vcontract, os.path.join(project_dir, f'{some_vname}.sol'))
             self._lib_addresses = libs
 
-            for verifier in verifier_names:
+            artifacts = DeploymentArtifacts.load(project_dir)
+
+            def verify_verifier(verifier: str) -> AddressValue:
                 v_address = self._req_state_var(contract_on_chain, f'{verifier}_inst')
-                pki_verifier_addresses[verifier] = AddressValue(v_address)
-                vcontract = self._verify_contract_integrity(v_address, os.path.join(project_dir, f'{verifier}.sol'), libraries=libs)
+                precompiled = None
+                if artifacts is not None and verifier in artifacts.verifier_names:
+                    precompiled = artifacts.get_verifier(verifier, libs)
+                vcontract = self._verify_contract_integrity(v_address, os.path.join(project_dir, f'{verifier}.sol'),
+                                                            libraries=libs, precompiled=precompiled)
 
                 # Verify prover key
                 expected_hash = self._req_state_var(vcontract, cfg.prover_key_hash_name)
-                from zkay.transaction.runtime import Runtime
-                actual_hash = Runtime.prover().get_prover_key_hash(os.path.join(project_dir, cfg.get_circuit_output_dir_name(verifier)))
+                actual_hash = self._get_prover_key_hash(os.path.join(project_dir, cfg.get_circuit_output_dir_name(verifier)))
                 if expected_hash != actual_hash:
                     raise IntegrityError(f'Prover key hash in deployed verification contract does not match local prover key file for "{verifier}"')
+                return AddressValue(v_address)
+
+            # Verification contracts are independent of each other -> check them concurrently
+            results = parallel_map(verify_verifier, verifier_names, cfg.blockchain_verification_workers, return_exceptions=True)
+            failed = [(verifier, res) for verifier, res in zip(verifier_names, results) if isinstance(res, Exception)]
+            for _, e in failed:
+                if not isinstance(e, IntegrityError):
+                    raise e
+            if failed:
+                raise IntegrityError('\n'.join(f'{verifier}: {e}' for verifier, e in failed))
+            pki_verifier_addresses.update(zip(verifier_names, results))
 
         # Check zkay contract integrity
         self._verify_zkay_contract_integrity(contract_on_chain.address, project_dir, pki_verifier_addresses)
@@ -349,9 +393,38 @@ class ZkayBlockchainInterface(metaclass=ABCMeta):
 
     # INTERNAL FUNCTIONALITY
 
+    @staticmethod
+    def _get_verifier_names(project_dir: str) -> List[str]:
+        """Return the names of all verification contracts (from the manifest if possible, otherwise using the zkay frontend)."""
+        verifier_names = Manifest.get_verifier_names(project_dir)
+        if verifier_names is None:
+            with open(os.path.join(project_dir, 'contract.zkay')) as f:
+                verifier_names = get_verification_contract_names(f.read())
+        return verifier_names
+
+    def _get_prover_key_hash(self, verifier_directory: str) -> bytes:
+        """
+        Return the prover key hash of the keys in verifier_directory.
+
+        The hash is cached as long as no file in verifier_directory changes (see VerificationCache.file_stats).
+        """
+        from zkay.transaction.runtime import Runtime
+        prover = Runtime.prover()
+        cache_key = VerificationCache.make_key('prover_key', type(prover).__name__, cfg.proving_scheme,
+                                               os.path.abspath(verifier_directory),
+                                               VerificationCache.file_stats(verifier_directory))
+        cached_hash = self.verification_cache.lookup(cache_key)
+        if cached_hash is not None:
+            return bytes.fromhex(cached_hash)
+
+        key_hash = prover.get_prover_key_hash(verifier_directory)
+        self.verification_cache.store(cache_key, key_hash.hex())
+        return key_hash
+
     @abstractmethod
     def _verify_contract_integrity(self, address: str, sol_filename: str, *,
-                                   libraries: Dict = None, contract_name: str = None, is_library: bool = False) -> Any:
+                                   libraries: Dict = None, contract_name: str = None, is_library: bool = False,
+                                   precompiled: Optional[Dict] = None, ignore_metadata: bool = False) -> Any:
         """
         Check if the bytecode of the contract at address matches the bytecode obtained by locally compiling sol_filename.
 
@@ -360,6 +433,10 @@ class ZkayBlockchainInterface(metaclass=ABCMeta):
         :param libraries: library dict which should be passed during compilation (for linking)
         :param contract_name: contract name, if not specified, the first contract in the file is used
         :param is_library: set to true if this a library instead of a contract
+        :param precompiled: [OPTIONAL] precompiled (and linked) abi and bytecode of sol_filename from the deployment artifacts, \
+                            if the remote bytecode matches, sol_filename does not need to be compiled
+        :param ignore_metadata: if true, the solc metadata hash at the end of the bytecode is not compared \
+                                (required for contracts which may have been deployed from placeholder-patched artifacts)
         :raise IntegrityError: if there is a mismatch
         :return: a contract handle for the remote contract
         """
@@ -413,7 +490,21 @@ class ZkayBlockchainInterface(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def _req_state_var(self, contract_handle, name: str, *indices) -> Union[bool, int, str]:
+    def _req_state_var(self, contract_handle, name: str, *indices, block: Optional[int] = None) -> Union[bool, int, str]:
+        """Request state variable value, at the given block number if block is not None, otherwise at the latest block."""
+        pass
+
+    @abstractmethod
+    def _get_block_number(self) -> int:
+        pass
+
+    @abstractmethod
+    def _storage_modified(self, contract_handle, from_block: int, to_block: int) -> bool:
+        """
+        Check whether the storage of the given contract may have changed between from_block and to_block.
+
+        :return: False only if the storage is guaranteed to be the same at both block numbers
+        """
         pass
 
     @abstractmethod
@@ -512,8 +603,14 @@ class ZkayKeystoreInterface(metaclass=ABCMeta):
 class ZkayCryptoInterface(metaclass=ABCMeta):
     """API to generate cryptographic keys and perform encryption/decryption operations."""
 
+    dec_cache_size = 1 << 16
+    """Maximum number of memoized decryption results, the oldest results are evicted first."""
+
     def __init__(self, keystore: ZkayKeystoreInterface):
         self.keystore = keystore
+        # Results are keyed by the key pair which was used for decryption, so they stay valid when keys are (re)loaded
+        self._dec_cache: Dict[Tuple[CipherValue, AddressValue, PublicKeyValue], Tuple[int, Optional[RandomnessValue]]] = {}
+        self._dec_cache_lock = threading.Lock()
 
     @classmethod
     @abstractmethod
@@ -567,21 +664,32 @@ class ZkayCryptoInterface(metaclass=ABCMeta):
         """
         Decrypt cipher encrypted for my_addr.
 
+        Decryption results are memoized, so that each cipher text is decrypted at most once per process.
+
         :param cipher: encrypted value
         :param my_addr: cipher is encrypted for this address
         :return: if symmetric -> (plain, None), if asymmetric (plain, randomness which was used to encrypt plain)
         """
         assert isinstance(cipher, CipherValue), f"Tried to decrypt value of type {type(cipher).__name__}"
         assert isinstance(my_addr, AddressValue)
+        if cipher == CipherValue():
+            return 0, None if cfg.is_symmetric_cipher() else RandomnessValue()
+
+        cache_key = (cipher, my_addr, self.keystore.pk(my_addr))
+        with self._dec_cache_lock:
+            cached = self._dec_cache.get(cache_key)
+        if cached is not None:
+            return cached
         zk_print(f'Decrypting value {cipher} for {my_addr}', verbosity_level=2)
 
-        if cipher == CipherValue():
-            ret = 0, None if cfg.is_symmetric_cipher() else RandomnessValue()
-        else:
-            sk = self.keystore.sk(my_addr)
-            plain, rnd = self._dec(cipher[:], sk.val)
-            ret = plain, RandomnessValue(rnd) if rnd is not None else None
+        sk = self.keystore.sk(my_addr)
+        plain, rnd = self._dec(cipher[:], sk.val)
+        ret = plain, RandomnessValue(rnd) if rnd is not None else None
 
+        with self._dec_cache_lock:
+            if len(self._dec_cache) >= self.dec_cache_size:
+                self._dec_cache.pop(next(iter(self._dec_cache)), None)
+            self._dec_cache[cache_key] = ret
         return ret
 
     @staticmethod
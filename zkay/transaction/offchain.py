@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import inspect
+import threading
 from contextlib import contextmanager, nullcontext
 from enum import IntEnum
-from typing import Dict, Union, Callable, Any, Optional, List, Tuple, ContextManager
+from typing import Dict, Union, Callable, Any, Optional, List, Tuple, ContextManager, NamedTuple
 
 from zkay.compiler.privacy.library_contracts import bn128_scalar_field
 from zkay.compiler.privacy.manifest import Manifest
@@ -11,9 +12,10 @@ from zkay.config import cfg, zk_print_banner
 from zkay.my_logging.log_context import log_context
 from zkay.transaction.int_casts import __convert as int_cast
 from zkay.transaction.interface import BlockChainError
-from zkay.transaction.runtime import Runtime
+from zkay.transaction.runtime import Runtime, RuntimeContext
 from zkay.transaction.types import AddressValue, RandomnessValue, CipherValue, MsgStruct, BlockStruct, TxStruct, Value, \
     PrivateKeyValue, PublicKeyValue
+from zkay.utils.parallel import parallel_map
 from zkay.utils.progress_printer import fail_print
 
 bn128_scalar_field = bn128_scalar_field
@@ -24,29 +26,101 @@ class RequireException(Exception):
     pass
 
 
+class LazyPlainValue:
+    """
+    Result of a decryption which is only performed when the value is first used.
+
+    Instances are created in pairs (plaintext, randomness) by ApiWrapper.dec_lazy and share the decryption result.
+    """
+
+    def __init__(self, decrypt: Callable[[], Tuple[Any, Optional[RandomnessValue]]], result: List, idx: int):
+        self.__decrypt = decrypt
+        self.__result = result
+        self.__idx = idx
+
+    @staticmethod
+    def create_pair(decrypt: Callable[[], Tuple[Any, Optional[RandomnessValue]]]) -> Tuple['LazyPlainValue', 'LazyPlainValue']:
+        result = []
+        return LazyPlainValue(decrypt, result, 0), LazyPlainValue(decrypt, result, 1)
+
+    @property
+    def is_randomness(self) -> bool:
+        return self.__idx == 1
+
+    def get(self) -> Any:
+        """Return the decrypted value (the decryption is performed on the first call)."""
+        if not self.__result:
+            self.__result.extend(self.__decrypt())
+        return self.__result[self.__idx]
+
+
+class _DeferredPrivValue(NamedTuple):
+    """Placeholder for a serialized private circuit input which depends on a LazyPlainValue."""
+    value: LazyPlainValue
+    bitwidth: int
+    elem_idx: Optional[int]
+    """Index into the randomness value, None for plaintext values"""
+
+
+class PrivateValuesDict(dict):
+    """
+    Dictionary for the private circuit values of a function, which may contain LazyPlainValues.
+
+    LazyPlainValues are replaced by their decrypted value when they are read via [].
+    Iteration (e.g. for serialization) yields the stored values as they are.
+    """
+
+    def __getitem__(self, key):
+        val = super().__getitem__(key)
+        if isinstance(val, LazyPlainValue):
+            val = val.get()
+            super().__setitem__(key, val)
+        return val
+
+
 class StateDict:
-    """Dictionary which wraps access to state variables"""
+    """
+    Dictionary which wraps access to state variables.
+
+    State locations are identified by tuples (var, *indices), where var is either the name or the variable id
+    (as returned by decl) of the state variable and indices are the values of all index keys.
+    Cached values are stored in one dictionary per state variable, which is keyed by the index tuple.
+    The generated offchain code always uses variable ids to avoid name lookups.
+    """
 
     def __init__(self, api) -> None:
         self.api = api
-        self.__state: Dict[str, Any] = {}
-        self.__constructors: Dict[str, Callable] = {}
+        self.__var_ids: Dict[str, int] = {}
+        self.__constructors: List[Tuple[str, bool, Callable]] = []
+        """(name, is_cipher, constructor) for every declared state variable, indexed by variable id"""
+        self.__state: List[Dict[Tuple, Any]] = []
+        """Cached values for every declared state variable, indexed by variable id"""
 
     def clear(self):
-        self.__state.clear()
+        for values in self.__state:
+            values.clear()
 
-    def decl(self, name, constructor: Callable = lambda x: x, *, cipher: bool = False):
-        """Define the wrapper constructor for a state variable."""
-        assert name not in self.__constructors
-        self.__constructors[name] = (cipher, constructor)
+    def decl(self, name, constructor: Callable = lambda x: x, *, cipher: bool = False) -> int:
+        """
+        Define the wrapper constructor for a state variable.
+
+        :return: the variable id, ids are assigned consecutively in declaration order (starting with 0)
+        """
+        assert name not in self.__var_ids
+        var_id = len(self.__constructors)
+        self.__var_ids[name] = var_id
+        self.__constructors.append((name, cipher, constructor))
+        self.__state.append({})
+        return var_id
 
     @property
     def names(self) -> List[str]:
-        return list(self.__constructors.keys())
+        return list(self.__var_ids.keys())
 
     def get_plain(self, name: str, *indices):
-        is_cipher, constr = self.__constructors[name]
-        val = self.__get((name, *indices), cache=False)
+        var_id = self.__var_ids[name]
+        _, is_cipher, constr = self.__constructors[var_id]
+        val = self.__request(var_id, indices)
         if is_cipher:
             ret, _ = self.api.dec(val, constr)
             return ret
@@ -54,55 +128,75 @@ class StateDict:
             return val
 
     def get_raw(self, name: str, *indices):
-        return self.__get((name, *indices), cache=False)
+        return self.__request(self.__var_ids[name], indices)
 
-    def __getitem__(self, key: Union[str, Tuple]):
+    def prefetch(self, keys: List[Tuple]):
+        """
+        Request the values of all given state locations which are not yet cached concurrently and cache them.
+
+        This is used at the beginning of a transaction for all state locations which are statically known to be read.
+        Requests which fail are ignored, the error is reported when the location is actually read.
+
+        :param keys: Tuples with the state variable name or id and all index key values
+        """
+        missing = {}
+        for key in keys:
+            var_id, indices = self.__split_key(key)
+            if indices not in self.__state[var_id]:
+                missing[(var_id, *indices)] = (var_id, indices)
+
+        results = parallel_map(lambda loc: self.__request(*loc), missing.values(),
+                               cfg.blockchain_prefetch_workers, return_exceptions=True)
+        for (var_id, indices), val in zip(missing.values(), results):
+            if not isinstance(val, Exception):
+                self.__state[var_id].setdefault(indices, val)
+
+    def __getitem__(self, key: Union[str, int, Tuple]):
         """
         Return value of the state variable (or index of state variable) key
 
-        :param key: Either a string with the state variable name (primitive variables) or a Tuple with the name and all index key values
+        :param key: Either the state variable name or id (primitive variables) or a Tuple with the name or id and all index key values
         :raise KeyError: if location does not exist on the chain
         :return: The requested value
         """
-        return self.__get(key, cache=True)
+        var_id, indices = self.__split_key(key)
+        values = self.__state[var_id]
+        try:
+            return values[indices]
+        except KeyError:
+            val = self.__request(var_id, indices)
+            values[indices] = val
+            return val
 
-    def __setitem__(self, key, value):
+    def __setitem__(self, key: Union[str, int, Tuple], value):
         """
         Assign value to state variable (or to index of state variable)
 
-        :param key: Either a string with the state variable name (primitive variables) or a Tuple with the name and all index key values
+        :param key: Either the state variable name or id (primitive variables) or a Tuple with the name or id and all index key values
         :param value: Correctly wrapped value which should be assigned to the specified state location
         """
+        var_id, indices = self.__split_key(key)
+        self.__state[var_id][indices] = value
 
-        if not isinstance(key, Tuple):
-            key = (key, )
-        var = key[0]
-        loc = var + ''.join(f'[{k}]' for k in key[1:])
-
-        # Write to state
-        self.__state[loc] = value
-
-    def __get(self, key: Union[str, Tuple], cache: bool):
-        if not isinstance(key, Tuple):
-            key = (key, )
-        var, indices = key[0], key[1:]
-        loc = var + ''.join(f'[{k}]' for k in key[1:])
-
-        # Retrieve from state scope
-        if cache and loc in self.__state:
-            return self.__state[loc]
+    def __split_key(self, key: Union[str, int, Tuple]) -> Tuple[int, Tuple]:
+        if type(key) is tuple:
+            var, indices = key[0], key[1:]
         else:
-            is_cipher, constr = self.__constructors[var]
-            try:
-                if is_cipher:
-                    val = CipherValue(self.api._req_state_var(var, *indices, count=cfg.cipher_len))
-                else:
-                    val = constr(self.api._req_state_var(var, *indices))
-            except BlockChainError:
-                raise KeyError(key)
-            if cache:
-                self.__state[loc] = val
-            return val
+            var, indices = key, ()
+        if type(var) is not int:
+            var = self.__var_ids[var]
+        return var, indices
+
+    def __request(self, var_id: int, indices: Tuple):
+        """Request the value of the given state location from the chain."""
+        name, is_cipher, constr = self.__constructors[var_id]
+        try:
+            if is_cipher:
+                return CipherValue(self.api._req_state_var(name, *indices, count=cfg.cipher_len))
+            else:
+                return constr(self.api._req_state_var(name, *indices))
+        except BlockChainError:
+            raise KeyError((name, *indices))
 
 
 class LocalsDict:
@@ -155,15 +249,21 @@ class LocalsDict:
 
 class ContractSimulator:
     tidx: Dict[str, int] = {}
+    _tidx_lock = threading.Lock()
+
+    print_transaction_errors: bool = True
+    """If false, errors which occur during external transactions are always raised instead of only being printed"""
 
-    def __init__(self, project_dir: str, user_addr: AddressValue, contract_name: str):
+    def __init__(self, project_dir: str, user_addr: AddressValue, contract_name: str, runtime: Optional[RuntimeContext] = None):
         """
         Create new contract simulator instance.
 
         :param project_dir: Directory where the zkay contract, the manifest and the prover/verification key files are located
         :param user_addr: From address for all transactions which are issued by this ContractSimulator
+        :param runtime: [OPTIONAL] runtime context whose backends should be used (defaults to the currently active context)
         """
-        self.api = ApiWrapper(project_dir, contract_name, user_addr)
+        self.runtime = Runtime.current() if runtime is None else runtime
+        self.api = ApiWrapper(project_dir, contract_name, user_addr, self.runtime)
 
         # Transaction instance values (reset between transactions)
 
@@ -262,8 +362,10 @@ class ContractSimulator:
                 zk_print_banner(f'Calling {name}')
                 assert self.locals is None
                 self.state.clear()
-                t_idx = self.tidx.get(name, 0)
-                self.tidx[name] = t_idx + 1
+                self.api.sync_state()
+                with self._tidx_lock:
+                    t_idx = self.tidx.get(name, 0)
+                    self.tidx[name] = t_idx + 1
 
             with nullcontext() if not is_external else log_context('transaction', f'{name}_{t_idx}'):
                 prev_locals = self.locals
@@ -272,7 +374,7 @@ class ContractSimulator:
                 try:
                     yield is_external
                 except (ValueError, BlockChainError, RequireException) as e:
-                    if is_external and not cfg.is_unit_test:
+                    if is_external and not cfg.is_unit_test and self.print_transaction_errors:
                         # uncomment to raise errors instead of just printing message (for debugging)
                         # raise e
                         with fail_print():
@@ -286,12 +388,13 @@ class ContractSimulator:
 
 
 class ApiWrapper:
-    def __init__(self, project_dir, contract_name, user_addr) -> None:
+    def __init__(self, project_dir, contract_name, user_addr, runtime: Optional[RuntimeContext] = None) -> None:
         super().__init__()
-        self.__conn = Runtime.blockchain()
-        self.__keystore = Runtime.keystore()
-        self.__crypto = Runtime.crypto()
-        self.__prover = Runtime.prover()
+        runtime = Runtime.current() if runtime is None else runtime
+        self.__conn = runtime.blockchain()
+        self.__keystore = runtime.keystore()
+        self.__crypto = runtime.crypto()
+        self.__prover = runtime.prover()
 
         self.__project_dir = project_dir
         self.__contract_name = contract_name
@@ -370,6 +473,11 @@ class ApiWrapper:
     def connect(self, address: AddressValue):
         self.__contract_handle = self.__conn.connect(self.__project_dir, self.__contract_name, address, self.user_address)
 
+    def sync_state(self):
+        """Synchronize the local state mirror (if enabled) with the current chain state."""
+        if self.__contract_handle is not None:
+            self.__conn.sync_state_mirror(self.__contract_handle)
+
     def transact(self, fname: str, args: List, should_encrypt: List[bool], wei_amount: Optional[int] = None) -> Any:
         return self.__conn.transact(self.__contract_handle, self.__user_addr, fname, args, should_encrypt, wei_amount=wei_amount)
 
@@ -402,6 +510,10 @@ class ApiWrapper:
         res = self.__crypto.dec(cipher, self.__user_addr)
         return constr(res[0]), res[1]
 
+    def dec_lazy(self, cipher: CipherValue, constr: Callable[[int], Any]) -> Tuple[LazyPlainValue, LazyPlainValue]:
+        """Return lazy (plain, randomness) values, cipher is only decrypted when one of them is first used."""
+        return LazyPlainValue.create_pair(lambda: self.dec(cipher, constr))
+
     def _req_state_var(self, name: str, *indices, count=0) -> Any:
         if self.__contract_handle is None:
             # TODO check this statically in the type checker
@@ -432,25 +544,63 @@ class ApiWrapper:
     def __serialize_circuit_array(data: dict, target_array: List, target_out_start_idx: int, elem_bitwidths: List[int]):
         idx = target_out_start_idx
         for (name, val), bitwidth in zip(data.items(), elem_bitwidths):
-            if isinstance(val, (list, Value)) and not isinstance(val, AddressValue):
+            if isinstance(val, LazyPlainValue):
+                # Serialization is deferred until the value is needed for proof generation
+                if val.is_randomness:
+                    target_array[idx:idx + cfg.randomness_len] = [_DeferredPrivValue(val, bitwidth, i) for i in range(cfg.randomness_len)]
+                    idx += cfg.randomness_len
+                else:
+                    target_array[idx] = _DeferredPrivValue(val, bitwidth, None)
+                    idx += 1
+            elif isinstance(val, (list, Value)) and not isinstance(val, AddressValue):
                 target_array[idx:idx + len(val)] = val[:cfg.cipher_payload_len] if isinstance(val, CipherValue) else val[:]
                 idx += len(val)
             else:
                 target_array[idx] = ApiWrapper.__serialize_val(val, bitwidth)
                 idx += 1
 
-    def serialize_circuit_outputs(self, zk_data: dict, out_elem_bitwidths: List[int]) -> List[int]:
+    def serialize_circuit_outputs(self, zk_data: dict, out_elem_bitwidths: List[int],
+                                  out_packing: Optional[List[Tuple[int, Optional[int]]]] = None) -> List[int]:
+        """
+        Serialize all circuit outputs in zk_data.
+
+        :param zk_data: zk data dict of the current function
+        :param out_elem_bitwidths: bitwidths of all outputs (0 for non-primitive types)
+        :param out_packing: if packing is enabled, (offset, bit offset) of every output (bit offset is None for unpacked outputs)
+        :return: serialized out array
+        """
         out_vals = {name: val for name, val in zk_data.items() if name.startswith(cfg.zk_out_name)} # TODO don't depend on out var names for correctness
-        count = sum([len(val) if isinstance(val, (Tuple, list)) else 1 for val in out_vals.values()])
-        zk_out = [None for _ in range(count)]
-        self.__serialize_circuit_array(out_vals, zk_out, 0, out_elem_bitwidths)
+        if out_packing is None:
+            count = sum([len(val) if isinstance(val, (Tuple, list)) else 1 for val in out_vals.values()])
+            zk_out = [None for _ in range(count)]
+            self.__serialize_circuit_array(out_vals, zk_out, 0, out_elem_bitwidths)
+        else:
+            count = max(offset + (len(val) if isinstance(val, (Tuple, list)) else 1)
+                        for val, (offset, _) in zip(out_vals.values(), out_packing))
+            zk_out = [0 for _ in range(count)]
+            for (name, val), bitwidth, (offset, bit_offset) in zip(out_vals.items(), out_elem_bitwidths, out_packing):
+                if bit_offset is None:
+                    self.__serialize_circuit_array({name: val}, zk_out, offset, [bitwidth])
+                else:
+                    # Small values share a single uint
+                    zk_out[offset] |= ApiWrapper.__serialize_val(val, bitwidth) << bit_offset
         return zk_out
 
     def serialize_private_inputs(self, zk_priv: dict, priv_elem_bitwidths: List[int]):
         self.__serialize_circuit_array(zk_priv, self.all_priv_values, self.current_all_index, priv_elem_bitwidths)
 
     def gen_proof(self, fname: str, in_vals: List, out_vals: List[Union[int, CipherValue]]) -> List[int]:
-        return self.__prover.generate_proof(self.__project_dir, self.__contract_name, fname, self.all_priv_values, in_vals, out_vals)
+        priv_values = [self.__resolve_deferred(val) if isinstance(val, _DeferredPrivValue) else val for val in self.all_priv_values]
+        return self.__prover.generate_proof(self.__project_dir, self.__contract_name, fname, priv_values, in_vals, out_vals)
+
+    @staticmethod
+    def __resolve_deferred(deferred: _DeferredPrivValue):
+        """Decrypt and serialize a private input whose serialization was deferred by __serialize_circuit_array."""
+        val = deferred.value.get()
+        if deferred.elem_idx is None:
+            return ApiWrapper.__serialize_val(val, deferred.bitwidth)
+        else:
+            return val[deferred.elem_idx]
 
     @contextmanager
     def __call_ctx(self, sec_offset) -> ContextManager:
@@ -1,3 +1,8 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Dict, Tuple, Callable, Any, ContextManager
+
 from zkay.config import cfg
 from zkay.transaction.crypto.ecdh_chaskey import EcdhChaskeyCrypto
 from zkay.transaction.interface import ZkayBlockchainInterface, ZkayCryptoInterface, ZkayKeystoreInterface, ZkayProverInterface
@@ -31,18 +36,97 @@ _blockchain_classes = {
 }
 
 
+class RuntimeContext:
+    """
+    Set of runtime API backend instances which is used by the contract simulators created within this context.
+
+    Every context has its own keystore and crypto backend (i.e. its own local key pairs, public key cache and
+    decryption cache). The expensive blockchain and prover backends are shared between all contexts which use the
+    same backend configuration, unless a context is created with explicit backend instances.
+
+    All backends are created lazily (and thread-safely) on first use.
+    Note that the zkay configuration (cfg) is shared by all contexts.
+
+    Usage::
+
+        ctx = RuntimeContext()
+        with ctx.activate():
+            # all simulators created here use the backends of ctx (also when they are used in a different thread later on)
+            c = connect(address, user)
+    """
+
+    def __init__(self, *, blockchain: Optional[ZkayBlockchainInterface] = None, prover: Optional[ZkayProverInterface] = None):
+        """
+        Create a new runtime context.
+
+        :param blockchain: [OPTIONAL] blockchain backend instance to use instead of the shared one
+        :param prover: [OPTIONAL] prover backend instance to use instead of the shared one
+        """
+        self._lock = threading.RLock()
+        self.__blockchain = blockchain
+        self.__keystore = None
+        self.__crypto = None
+        self.__prover = prover
+
+    @contextmanager
+    def activate(self) -> ContextManager['RuntimeContext']:
+        """Return a context manager which makes this the current runtime context (of the current thread/task) during its lifetime."""
+        token = _current_context.set(self)
+        try:
+            yield self
+        finally:
+            _current_context.reset(token)
+
+    def blockchain(self) -> ZkayBlockchainInterface:
+        """Return object which implements ZkayBlockchainInterface."""
+        if self.__blockchain is None:
+            with self._lock:
+                if self.__blockchain is None:
+                    self.__blockchain = Runtime.shared_blockchain()
+        return self.__blockchain
+
+    def keystore(self) -> ZkayKeystoreInterface:
+        """Return object which implements ZkayKeystoreInterface."""
+        if self.__keystore is None:
+            with self._lock:
+                if self.__keystore is None:
+                    self.__keystore = SimpleKeystore(self.blockchain())
+        return self.__keystore
+
+    def crypto(self) -> ZkayCryptoInterface:
+        """Return object which implements ZkayCryptoInterface."""
+        if self.__crypto is None:
+            with self._lock:
+                if self.__crypto is None:
+                    self.__crypto = _crypto_classes[cfg.crypto_backend](self.keystore())
+        return self.__crypto
+
+    def prover(self) -> ZkayProverInterface:
+        """Return object which implements ZkayProverInterface."""
+        if self.__prover is None:
+            with self._lock:
+                if self.__prover is None:
+                    self.__prover = Runtime.shared_prover()
+        return self.__prover
+
+
+_current_context: ContextVar[Optional[RuntimeContext]] = ContextVar('zkay_runtime_context', default=None)
+
+
 class Runtime:
     """
-    Provides global access to singleton runtime API backend instances.
+    Provides global access to runtime API backend instances.
     See interface.py for more information.
 
     The global configuration in config.py determines which backends are made available via the Runtime class.
+
+    The backends are provided by the current RuntimeContext (see RuntimeContext.activate).
+    If no context is active, a process-wide default context is used.
     """
 
-    __blockchain = None
-    __crypto = None
-    __keystore = None
-    __prover = None
+    __default_context = RuntimeContext()
+    __shared_backends: Dict[Tuple, Any] = {}
+    __shared_lock = threading.RLock()
 
     @staticmethod
     def reset():
@@ -50,38 +134,57 @@ class Runtime:
         Reboot the runtime.
 
         When a new backend is selected in the configuration, it will only be loaded after a runtime reset.
+        This discards the default context and all shared backend instances
+        (contexts which already created their backends continue to use them).
         """
-        Runtime.__blockchain = None
-        Runtime.__crypto = None
-        Runtime.__keystore = None
-        Runtime.__prover = None
+        with Runtime.__shared_lock:
+            Runtime.__shared_backends.clear()
+            Runtime.__default_context = RuntimeContext()
+
+    @staticmethod
+    def current() -> RuntimeContext:
+        """Return the currently active runtime context."""
+        ctx = _current_context.get()
+        return Runtime.__default_context if ctx is None else ctx
 
     @staticmethod
     def blockchain() -> ZkayBlockchainInterface:
-        """Return singleton object which implements ZkayBlockchainInterface."""
-        if Runtime.__blockchain is None:
-            Runtime.__blockchain = _blockchain_classes[cfg.blockchain_backend]()
-            from zkay.transaction.types import AddressValue
-            AddressValue.get_balance = Runtime.__blockchain.get_balance
-        return Runtime.__blockchain
+        """Return object which implements ZkayBlockchainInterface (of the current context)."""
+        return Runtime.current().blockchain()
 
     @staticmethod
     def keystore() -> ZkayKeystoreInterface:
-        """Return singleton object which implements ZkayKeystoreInterface."""
-        if Runtime.__keystore is None:
-            Runtime.__keystore = SimpleKeystore(Runtime.blockchain())
-        return Runtime.__keystore
+        """Return object which implements ZkayKeystoreInterface (of the current context)."""
+        return Runtime.current().keystore()
 
     @staticmethod
     def crypto() -> ZkayCryptoInterface:
-        """Return singleton object which implements ZkayCryptoInterface."""
-        if Runtime.__crypto is None:
-            Runtime.__crypto = _crypto_classes[cfg.crypto_backend](Runtime.keystore())
-        return Runtime.__crypto
+        """Return object which implements ZkayCryptoInterface (of the current context)."""
+        return Runtime.current().crypto()
 
     @staticmethod
     def prover() -> ZkayProverInterface:
-        """Return singleton object which implements ZkayProverInterface."""
-        if Runtime.__prover is None:
-            Runtime.__prover = _prover_classes[cfg.snark_backend]()
-        return Runtime.__prover
+        """Return object which implements ZkayProverInterface (of the current context)."""
+        return Runtime.current().prover()
+
+    @staticmethod
+    def shared_blockchain() -> ZkayBlockchainInterface:
+        """Return the blockchain backend instance which is shared by all contexts using the configured blockchain backend and node."""
+        def create():
+            conn = _blockchain_classes[cfg.blockchain_backend]()
+            from zkay.transaction.types import AddressValue
+            AddressValue.get_balance = conn.get_balance
+            return conn
+        return Runtime.__get_shared(('blockchain', cfg.blockchain_backend, str(cfg.blockchain_node_uri)), create)
+
+    @staticmethod
+    def shared_prover() -> ZkayProverInterface:
+        """Return the prover backend instance which is shared by all contexts using the configured snark backend."""
+        return Runtime.__get_shared(('prover', cfg.snark_backend), lambda: _prover_classes[cfg.snark_backend]())
+
+    @staticmethod
+    def __get_shared(key: Tuple, create: Callable[[], Any]) -> Any:
+        with Runtime.__shared_lock:
+            if key not in Runtime.__shared_backends:
+                Runtime.__shared_backends[key] = create()
+            return Runtime.__shared_backends[key]
@@ -0,0 +1,354 @@
+"""
+This module implements the zkay transaction server (zkay serve).
+
+The server loads the offchain simulation code of one or more compiled zkay contracts once and keeps the runtime
+backends (blockchain connection, crypto backend, prover) and all connected contract instances alive between requests.
+This avoids paying for imports, manifest loading, integrity verification and prover warmup on every transaction.
+
+The server speaks JSON-RPC 2.0 over HTTP POST requests (path /). The following methods are supported
+(parameters are passed by name):
+
+* contracts(): Return all served contracts, together with their externally callable functions
+* deploy(contract, user, args=[], wei_amount=None): Deploy a new contract instance, returns its address
+* connect(contract, address, user): Connect to the contract instance at address, returns the address
+* transact(contract, address, user, function, args=[], wei_amount=None): Issue a transaction, returns the return value
+* call(contract, address, user, function, args=[]): Like transact, but only for functions which do not modify state
+* get_plain(contract, address, user, name, indices=[]): Return the (decrypted) value of a state variable location
+
+Addresses are 0x-prefixed hex strings. Contract instances are created lazily when an unknown (contract, address, user) combination
+is used in transact, call or get_plain.
+
+Every HTTP request must carry the server's access token in an 'Authorization: Bearer <token>' header.
+Optionally, the accounts on whose behalf the server acts can be restricted to a fixed set of users.
+
+Requests for the same contract instance and user are processed sequentially, all other requests are processed
+concurrently (at most max_concurrent_requests at a time).
+Since the zkay configuration is global, all served contracts must have been compiled with the same compiler settings.
+"""
+
+import hmac
+import importlib.util
+import inspect
+import json
+import os
+import secrets
+import threading
+from enum import IntEnum
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple, Any, Optional, Type
+
+from zkay.compiler.privacy.deployment_artifacts import DeploymentArtifacts
+from zkay.compiler.privacy.manifest import Manifest
+from zkay.config import cfg
+from zkay.transaction.interface import ZkayBlockchainInterface
+from zkay.transaction.offchain import ContractSimulator
+from zkay.transaction.runtime import Runtime, RuntimeContext
+from zkay.transaction.types import AddressValue, Value
+
+
+class RpcError(Exception):
+    """Error which is reported to the client as a JSON-RPC error object."""
+
+    # JSON-RPC 2.0 error codes
+    parse_error = -32700
+    invalid_request = -32600
+    method_not_found = -32601
+    invalid_params = -32602
+    execution_error = -32000
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class ServedContract:
+    def __init__(self, project_dir: str, cls: Type[ContractSimulator], mutability: Dict[str, str]):
+        self.project_dir = project_dir
+        self.cls = cls
+
+        self.functions: Dict[str, str] = {}
+        """Maps the names of all externally callable functions to their state mutability (or '?' if unknown)"""
+
+        for name, fct in inspect.getmembers(cls, inspect.isfunction):
+            if name != 'constructor' and getattr(fct, '_can_be_external', False):
+                if name in mutability:
+                    self.functions[name] = mutability[name]
+                elif hasattr(fct, '_has_side_effects'):
+                    # No abi available, fall back to the information from the offchain simulation code
+                    self.functions[name] = 'nonpayable' if fct._has_side_effects else 'view'
+                else:
+                    self.functions[name] = '?'
+
+    @property
+    def name(self) -> str:
+        return self.cls.__name__
+
+    def modifies_state(self, function: str) -> bool:
+        """Return true if function may modify state (i.e. if it is not known to be view or pure)."""
+        return self.functions[function] not in ['view', 'pure']
+
+
+class ZkayServer:
+    def __init__(self, contract_dirs: List[str], max_concurrent_requests: int = 8, *,
+                 token: Optional[str] = None, users: Optional[List[str]] = None):
+        """
+        Load the transaction interfaces of all contracts in contract_dirs.
+
+        The configuration of the first contract's manifest is imported, all other manifests must be compatible with it.
+
+        :param contract_dirs: compilation output directories of the contracts which should be served
+        :param max_concurrent_requests: maximum number of requests which are processed at the same time
+        :param token: access token which clients must present, a random token is generated if None
+        :param users: if not None, only these accounts can be used as transaction senders
+        :raise ValueError: if the manifests are incompatible or if multiple contracts have the same name
+        """
+        if not contract_dirs:
+            raise ValueError('At least one contract directory is required')
+        if max_concurrent_requests < 1:
+            raise ValueError('Maximum number of concurrent requests must be positive')
+
+        manifests = [Manifest.load(d) for d in contract_dirs]
+        Manifest.import_manifest_config(manifests[0])
+        for d, manifest in zip(contract_dirs[1:], manifests[1:]):
+            if manifest[Manifest.solc_version] != manifests[0][Manifest.solc_version] or \
+                    manifest[Manifest.zkay_options] != manifests[0][Manifest.zkay_options]:
+                raise ValueError(f'Contract in "{d}" was compiled with different settings than contract in "{contract_dirs[0]}"')
+        Runtime.reset()
+
+        self.runtime = RuntimeContext()
+        self.contracts: Dict[str, ServedContract] = {}
+        for idx, d in enumerate(contract_dirs):
+            d = os.path.realpath(d)
+            for cls in _load_contract_classes(d, f'zkay_served_contract_{idx}'):
+                if cls.__name__ in self.contracts:
+                    raise ValueError(f'Multiple served contracts are named "{cls.__name__}"')
+                artifacts = DeploymentArtifacts.load(d)
+                mutability = {}
+                if artifacts is not None:
+                    mutability = {e['name']: e.get('stateMutability', '?') for e in artifacts.get_contract_abi(cls.__name__)
+                                  if e.get('type') == 'function'}
+                self.contracts[cls.__name__] = ServedContract(d, cls, mutability)
+
+        self.token = secrets.token_hex(16) if token is None else token
+        self.users = None if users is None else {_normalize_address(u) for u in users}
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrent_requests)
+        self._lock = threading.Lock()
+        self._instances: Dict[Tuple[str, str, str], Tuple[ContractSimulator, threading.Lock]] = {}
+
+        # Errors must be reported to the client instead of being printed
+        ContractSimulator.print_transaction_errors = False
+
+    def warm_up(self):
+        """Create all runtime backends and load the prover key hashes of all served contracts."""
+        with self.runtime.activate():
+            blockchain = self.runtime.blockchain()
+            self.runtime.crypto()
+            self.runtime.prover()
+            for contract in self.contracts.values():
+                for vname in ZkayBlockchainInterface._get_verifier_names(contract.project_dir):
+                    verifier_dir = os.path.join(contract.project_dir, cfg.get_circuit_output_dir_name(vname))
+                    blockchain._get_prover_key_hash(verifier_dir)
+
+    def is_authorized(self, authorization: Optional[str]) -> bool:
+        """Return true if the value of an HTTP Authorization header contains the server's access token."""
+        if authorization is None or not authorization.startswith('Bearer '):
+            return False
+        return hmac.compare_digest(authorization[len('Bearer '):].encode(), self.token.encode())
+
+    def handle(self, method: str, params: Dict) -> Any:
+        """
+        Execute a single rpc request.
+
+        :param method: name of the rpc method
+        :param params: named rpc parameters
+        :raise RpcError: if the request is invalid or fails
+        :return: json serializable result
+        """
+        fct = getattr(self, f'rpc_{method}', None) if isinstance(method, str) else None
+        if fct is None:
+            raise RpcError(RpcError.method_not_found, f'Unknown method {method}')
+        if not isinstance(params, dict):
+            raise RpcError(RpcError.invalid_params, 'Parameters must be passed by name')
+        try:
+            inspect.signature(fct).bind(**params)
+        except TypeError as e:
+            raise RpcError(RpcError.invalid_params, str(e))
+
+        with self._semaphore, self.runtime.activate():
+            try:
+                return _to_json(fct(**params))
+            except RpcError:
+                raise
+            except Exception as e:
+                raise RpcError(RpcError.execution_error, f'{type(e).__name__}: {e}')
+
+    def rpc_contracts(self) -> Dict:
+        return {name: {'functions': c.functions} for name, c in self.contracts.items()}
+
+    def rpc_deploy(self, contract: str, user: str, args: Optional[List] = None, wei_amount: Optional[int] = None) -> str:
+        c = self._get_contract(contract)
+        self._check_user(user)
+        kwargs = {} if wei_amount is None else {'wei_amount': wei_amount}
+        sim = c.cls.deploy(*(args or []), user=user, project_dir=c.project_dir, **kwargs)
+        with self._lock:
+            self._instances[(contract, str(sim.address), _normalize_address(user))] = (sim, threading.Lock())
+        return _to_json(sim.address)
+
+    def rpc_connect(self, contract: str, address: str, user: str) -> str:
+        sim, _ = self._get_instance(contract, address, user)
+        return _to_json(sim.address)
+
+    def rpc_transact(self, contract: str, address: str, user: str, function: str,
+                     args: Optional[List] = None, wei_amount: Optional[int] = None) -> Any:
+        c = self._get_contract(contract)
+        if function not in c.functions:
+            raise RpcError(RpcError.invalid_params, f'Contract {contract} has no external function {function}')
+        kwargs = {} if wei_amount is None else {'wei_amount': wei_amount}
+        sim, lock = self._get_instance(contract, address, user)
+        with lock:
+            return getattr(sim, function)(*(args or []), **kwargs)
+
+    def rpc_call(self, contract: str, address: str, user: str, function: str, args: Optional[List] = None) -> Any:
+        c = self._get_contract(contract)
+        if function in c.functions and c.modifies_state(function):
+            if c.functions[function] == '?':
+                raise RpcError(RpcError.invalid_params, f'State mutability of function {function} is unknown, use transact instead')
+            raise RpcError(RpcError.invalid_params, f'Function {function} may modify state, use transact instead')
+        return self.rpc_transact(contract, address, user, function, args)
+
+    def rpc_get_plain(self, contract: str, address: str, user: str, name: str, indices: Optional[List] = None) -> Any:
+        sim, lock = self._get_instance(contract, address, user)
+        if name not in sim.state.names:
+            raise RpcError(RpcError.invalid_params, f'Contract {contract} has no state variable {name}')
+        with lock:
+            return sim.state.get_plain(name, *(indices or []))
+
+    def _get_contract(self, contract: str) -> ServedContract:
+        try:
+            return self.contracts[contract]
+        except KeyError:
+            raise RpcError(RpcError.invalid_params, f'Unknown contract {contract}')
+
+    def _check_user(self, user: str):
+        if self.users is not None and _normalize_address(user) not in self.users:
+            raise RpcError(RpcError.invalid_params, f'User {user} is not served by this server')
+
+    def _get_instance(self, contract: str, address: str, user: str) -> Tuple[ContractSimulator, threading.Lock]:
+        """Return the simulator (and its lock) for the given contract instance and user, connect if necessary."""
+        c = self._get_contract(contract)
+        self._check_user(user)
+        key = (contract, _normalize_address(address), _normalize_address(user))
+        with self._lock:
+            entry = self._instances.get(key)
+            if entry is None:
+                # Connecting is not done while holding the registry lock, concurrent requests wait for the instance lock
+                entry = (None, threading.Lock())
+                self._instances[key] = entry
+        sim, lock = entry
+        if sim is None:
+            with lock:
+                sim = self._instances.get(key, (None, None))[0]
+                if sim is None:
+                    try:
+                        sim = c.cls.connect(address, user=user, project_dir=c.project_dir)
+                    except Exception:
+                        with self._lock:
+                            self._instances.pop(key, None)
+                        raise
+                    with self._lock:
+                        self._instances[key] = (sim, lock)
+        return sim, lock
+
+    def serve_forever(self, host: str = 'localhost', port: int = 8550):
+        """Listen for rpc requests on host:port until interrupted."""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if not server.is_authorized(self.headers.get('Authorization')):
+                    self.send_response(HTTPStatus.UNAUTHORIZED)
+                    self.send_header('WWW-Authenticate', 'Bearer')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    request = json.loads(self.rfile.read(length))
+                except ValueError:
+                    self._respond(_error_response(None, RpcError(RpcError.parse_error, 'Invalid json')))
+                    return
+
+                if isinstance(request, list):
+                    response = [server._dispatch(r) for r in request]
+                else:
+                    response = server._dispatch(request)
+                self._respond(response)
+
+            def _respond(self, response):
+                body = json.dumps(response).encode()
+                self.send_response(HTTPStatus.OK)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                if cfg.verbosity >= 2:
+                    super().log_message(format, *args)
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        print(f'Serving {", ".join(self.contracts.keys())} on http://{host}:{httpd.server_address[1]}')
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
+
+    def _dispatch(self, request: Any) -> Dict:
+        req_id = request.get('id') if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' or 'method' not in request:
+                raise RpcError(RpcError.invalid_request, 'Invalid JSON-RPC 2.0 request')
+            result = self.handle(request['method'], request.get('params', {}))
+            return {'jsonrpc': '2.0', 'id': req_id, 'result': result}
+        except RpcError as e:
+            return _error_response(req_id, e)
+
+
+def _load_contract_classes(contract_dir: str, module_name: str) -> List[Type[ContractSimulator]]:
+    """Load the transaction interface in contract_dir as a separate module and return all contract classes."""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(contract_dir, 'contract.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return [cls for cls in vars(module).values()
+            if isinstance(cls, type) and issubclass(cls, ContractSimulator) and cls is not ContractSimulator]
+
+
+def _normalize_address(address: str) -> str:
+    return str(AddressValue(address))
+
+
+def _to_json(val: Any) -> Any:
+    """Convert a value returned by the offchain simulation into a json serializable value."""
+    if isinstance(val, (bool, str)) or val is None:
+        return val
+    elif isinstance(val, (int, IntEnum)):
+        return int(val)
+    elif isinstance(val, AddressValue):
+        return f'0x{val}'
+    elif isinstance(val, Value):
+        return [_to_json(v) for v in val]
+    elif isinstance(val, bytes):
+        return val.hex()
+    elif isinstance(val, (list, tuple)):
+        return [_to_json(v) for v in val]
+    elif isinstance(val, dict):
+        return {str(k): _to_json(v) for k, v in val.items()}
+    else:
+        return str(val)
+
+
+def _error_response(req_id: Any, e: RpcError) -> Dict:
+    return {'jsonrpc': '2.0', 'id': req_id, 'error': {'code': e.code, 'message': str(e)}}
@@ -0,0 +1,113 @@
+"""
+This module provides a local mirror of the public storage of deployed zkay contracts.
+
+Without the mirror, every state variable read of the offchain simulation results in a request to the blockchain node.
+When cfg.blockchain_state_mirror is enabled, state variable values are instead served from a local store, which is
+always consistent with a specific block height of the chain:
+
+* Every mirrored contract is synchronized to a block number. Values which are not yet mirrored are requested from the
+  node at exactly that block, so all values of a contract which are served by the mirror belong to the same chain state.
+* When the mirror is synchronized to a newer block, the backend determines whether the storage of the contract
+  may have been modified in the meantime (by comparing storage roots if the node supports it, otherwise the storage
+  is only considered unchanged if no transactions were included in the meantime). Only if it may have been modified,
+  the mirrored values of that contract are discarded.
+* Transactions issued via the local blockchain interface always invalidate the mirror of the target contract.
+
+Synchronization is forced at the beginning of every simulated transaction. Other reads (e.g. state queries by the user)
+synchronize at most once every cfg.blockchain_state_mirror_sync_interval milliseconds.
+"""
+
+import threading
+import time
+from typing import Dict, Any, Tuple
+
+from zkay.config import cfg
+
+
+class _MirroredContract:
+    def __init__(self, block: int):
+        self.block = block
+        """Block number to which the mirrored values correspond"""
+
+        self.last_sync = time.monotonic()
+        self.generation = 0
+        """Incremented whenever values are discarded, used to prevent storing values of outdated requests"""
+
+        self.values: Dict[Tuple, Any] = {}
+
+
+class StateMirror:
+    """Block-height consistent local store of contract state variable values."""
+
+    def __init__(self, conn: 'ZkayBlockchainInterface'):
+        self.conn = conn
+        self._lock = threading.RLock()
+        self._contracts: Dict[str, _MirroredContract] = {}
+
+    def sync(self, contract_handle, force: bool = False) -> int:
+        """
+        Synchronize the mirror of the given contract with the current head of the chain.
+
+        :param contract_handle: contract whose state should be synchronized
+        :param force: if true, synchronize even if the last synchronization was less than cfg.blockchain_state_mirror_sync_interval ago
+        :raise BlockChainError: if a blockchain request fails
+        :return: the block number to which the mirror of the contract corresponds
+        """
+        address = contract_handle.address
+        with self._lock:
+            mc = self._contracts.get(address)
+            now = time.monotonic()
+            if mc is not None and not force and (now - mc.last_sync) * 1000 < cfg.blockchain_state_mirror_sync_interval:
+                return mc.block
+
+            block = self.conn._get_block_number()
+            if mc is None:
+                mc = _MirroredContract(block)
+                self._contracts[address] = mc
+            elif block != mc.block:
+                if block < mc.block or self.conn._storage_modified(contract_handle, mc.block, block):
+                    mc.values.clear()
+                    mc.generation += 1
+                mc.block = block
+            mc.last_sync = now
+            return block
+
+    def get(self, contract_handle, name: str, *indices) -> Any:
+        """
+        Return the value of state variable name[indices[0]][indices[1]][...] at the block to which the mirror is synchronized.
+
+        :param contract_handle: contract from which to read state
+        :param name: name of the state variable
+        :param indices: unwrapped values of all index keys
+        :raise BlockChainError: if the value is not mirrored yet and the request fails
+        :return: the value
+        """
+        key = (name, *indices)
+        with self._lock:
+            # Sync under the same lock, so the entry cannot be invalidated before it is looked up
+            block = self.sync(contract_handle)
+            mc = self._contracts[contract_handle.address]
+            if key in mc.values:
+                return mc.values[key]
+            generation = mc.generation
+
+        val = self.conn._req_state_var(contract_handle, name, *indices, block=block)
+
+        with self._lock:
+            if mc.generation == generation:
+                mc.values[key] = val
+        return val
+
+    def invalidate(self, address: str):
+        """Discard all mirrored values of the contract at address."""
+        with self._lock:
+            mc = self._contracts.pop(address, None)
+            if mc is not None:
+                mc.generation += 1
+
+    def clear(self):
+        """Discard all mirrored values."""
+        with self._lock:
+            for mc in self._contracts.values():
+                mc.generation += 1
+            self._contracts.clear()
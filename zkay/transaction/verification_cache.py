@@ -0,0 +1,119 @@
+"""
+This module provides a persistent cache for the results of successful contract integrity checks.
+
+Verifying the integrity of a remote zkay contract requires compiling the main contract, the pki contract,
+the library contracts and all verification contracts and hashing the (potentially very large) prover keys.
+Since the outcome of such a check is fully determined by the remote bytecode, the local source files
+and the compiler configuration, it can safely be reused as long as none of these inputs change.
+
+Entries are therefore keyed by a digest over all of these inputs (see :py:meth:`VerificationCache.make_key`).
+Only successful checks are recorded, a failing check is always re-evaluated.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Optional
+
+from zkay.config import cfg
+
+
+class VerificationCache:
+    """Json-file-backed key value store for contract integrity verification results."""
+
+    max_entries = 4096
+    """Maximum number of entries, the oldest entries are evicted first."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._entries = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(*components) -> str:
+        """
+        Return a cache key for the given key components.
+
+        :param components: json-serializable values which uniquely determine the verification result
+        :return: hex digest of the serialized components
+        """
+        return hashlib.sha256(json.dumps(components, sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def file_stats(directory: str) -> list:
+        """
+        Return (name, size, device, inode, modification time, status change time) for all regular files in directory, sorted by name.
+
+        Unlike the modification time, the status change time cannot be reset by the user, so any in-place rewrite of a file
+        changes its stats.
+        """
+        stats = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                st = os.stat(path)
+                stats.append((name, st.st_size, st.st_dev, st.st_ino, st.st_mtime_ns, st.st_ctime_ns))
+        return stats
+
+    def lookup(self, key: str) -> Optional[Any]:
+        """
+        Return the value stored for key.
+
+        :param key: cache key obtained via make_key
+        :return: the stored value or None if there is no entry for key or if cfg.blockchain_reverify is set
+        """
+        if cfg.blockchain_reverify:
+            return None
+        with self._lock:
+            return self._load().get(key)
+
+    def store(self, key: str, value: Any):
+        """
+        Record value for key and persist the cache to disk.
+
+        :param key: cache key obtained via make_key
+        :param value: json-serializable value
+        """
+        with self._lock:
+            # Re-read the file to not lose entries written by other processes in the meantime
+            self._entries = None
+            entries = self._load()
+            entries.pop(key, None)
+            entries[key] = value
+            for old_key in list(entries.keys())[:max(0, len(entries) - self.max_entries)]:
+                del entries[old_key]
+            self._save()
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries = {}
+            self._save()
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self.filename) as f:
+                    self._entries = json.load(f)
+                if not isinstance(self._entries, dict):
+                    self._entries = {}
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to temporary file first and then atomically replace the cache file
+        fd, tmp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_filename, self.filename)
+        except OSError:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
@@ -6,6 +6,7 @@ Submodules
 ==========
 * :py:mod:`.helpers`: Miscellaneous operations (file reading, hashing, ...)
 * :py:mod:`.multiline_formatter`: Helper class which makes heavy use of operator overloading to facilitate building multiline strings with different indentation levels.
+* :py:mod:`.parallel`: Thread pool based parallel map (for IO or subprocess bound tasks).
 * :py:mod:`.progress_printer`: Context managers for printing before and after context execution, and for colored terminal output.
 * :py:mod:`.run_command`: Wrapper for executing arbitrary commands with captured output
 * :py:mod:`.timer`: Context manager for measuring elapsed (wall clock) time
@@ -40,6 +40,14 @@ def hash_file(filename: str, chunk_size: int = 1 << 27) -> bytes:
     return digest[:32]
 
 
+def get_physical_memory() -> Optional[int]:
+    """Return the amount of physical memory (in bytes) or None if it cannot be determined."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
 def without_extension(filename: str) -> str:
     ext_idx = filename.rfind('.')
     ext_idx = len(filename) if ext_idx == -1 else ext_idx
@@ -0,0 +1,117 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, List, Optional, TypeVar, Any
+
+T = TypeVar('T')
+
+
+def parallel_map(fct: Callable[[Any], T], items: Iterable, max_workers: Optional[int] = None,
+                 return_exceptions: bool = False) -> List:
+    """
+    Apply fct to all items using a thread pool and wait until all invocations are finished.
+
+    This is intended for functions which spend most of their time waiting for IO or subprocesses
+    (e.g. solc invocations or blockchain requests).
+
+    :param fct: function to apply
+    :param items: function arguments
+    :param max_workers: maximum number of concurrently running invocations (None -> default thread pool size)
+    :param return_exceptions: if true, exceptions raised by fct are returned in place of the corresponding result
+                              instead of being raised
+    :raise Exception: if return_exceptions is false, the first exception (in item order) raised by fct
+    :return: results in the same order as items
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers == 1:
+        # Avoid thread overhead
+        results = []
+        for item in items:
+            try:
+                results.append(fct(item))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fct, item) for item in items]
+
+    results = []
+    for future in futures:
+        exc = future.exception()
+        if exc is not None:
+            if not return_exceptions:
+                raise exc
+            results.append(exc)
+        else:
+            results.append(future.result())
+    return results
+
+
+def memory_bounded_map(fct: Callable[[Any], T], items: Iterable, memory_estimates: Iterable[int], memory_budget: int,
+                       max_workers: Optional[int] = None, on_finished: Optional[Callable[[Any, int], None]] = None) -> List:
+    """
+    Apply fct to all items using a thread pool, such that the estimated memory usage of all running invocations stays within memory_budget.
+
+    This is intended for functions which start memory hungry subprocesses (e.g. snark key generation).
+    Items are started in order of decreasing memory estimate (largest first, so that the longest running jobs do not
+    end up running last). An item whose estimate exceeds the whole budget runs alone.
+
+    :param fct: function to apply
+    :param items: function arguments
+    :param memory_estimates: estimated peak memory usage (in bytes) of fct for each item
+    :param memory_budget: maximum sum of the memory estimates of all concurrently running invocations (in bytes)
+    :param max_workers: maximum number of concurrently running invocations (None -> number of cpus)
+    :param on_finished: [OPTIONAL] callback which is invoked (in the calling thread) with every item and the number of \
+                        finished items, after the invocation for that item finished successfully
+    :raise Exception: the first exception raised by fct (no new invocations are started after an exception)
+    :return: results in the same order as items
+    """
+    items = list(items)
+    memory_estimates = list(memory_estimates)
+    assert len(items) == len(memory_estimates)
+    max_workers = os.cpu_count() if max_workers is None else max_workers
+
+    pending = sorted(range(len(items)), key=lambda i: memory_estimates[i], reverse=True)
+    results = [None] * len(items)
+    running = {}
+    used_memory = 0
+    finished_count = 0
+    error = None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while running or (pending and error is None):
+            # Admit as many jobs as possible, always try the largest remaining job first
+            while pending and error is None and len(running) < max_workers:
+                head = pending[0]
+                if not running or used_memory + memory_estimates[head] <= memory_budget:
+                    idx = head
+                elif memory_estimates[head] > memory_budget:
+                    # Oversized job, wait until it can run alone
+                    break
+                else:
+                    # Fill the remaining budget with smaller jobs
+                    idx = next((i for i in pending if used_memory + memory_estimates[i] <= memory_budget), None)
+                    if idx is None:
+                        break
+                pending.remove(idx)
+                used_memory += memory_estimates[idx]
+                running[executor.submit(fct, items[idx])] = idx
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx = running.pop(future)
+                used_memory -= memory_estimates[idx]
+                exc = future.exception()
+                if exc is not None:
+                    error = exc if error is None else error
+                else:
+                    results[idx] = future.result()
+                    finished_count += 1
+                    if on_finished is not None:
+                        on_finished(items[idx], finished_count)
+
+    if error is not None:
+        raise error
+    return results
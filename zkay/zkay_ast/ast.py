@@ -205,6 +205,9 @@ class Expression(AST):
     def binop(self, op: str, rhs: Expression) -> FunctionCallExpr:
         return FunctionCallExpr(BuiltinFunction(op), [self, rhs])
 
+    def parenthesized(self) -> FunctionCallExpr:
+        return FunctionCallExpr(BuiltinFunction('parenthesis'), [self]).as_type(self.annotated_type)
+
     def ite(self, e_true: Expression, e_false: Expression) -> FunctionCallExpr:
         return FunctionCallExpr(BuiltinFunction('ite').override(is_private=self.annotated_type.is_private), [self, e_true, e_false])
 
@@ -650,6 +653,12 @@ class HybridArgumentIdf(Identifier):
         self.corresponding_priv_expression = corresponding_priv_expression
         self.serialized_loc: SliceExpr = SliceExpr(IdentifierExpr(''), None, -1, -1)
 
+        self.io_offset: int = -1
+        """Offset (in # uints) of this idf within the in/out array segment of its circuit (only for public circuit arguments)"""
+
+        self.packed_bit_offset: Optional[int] = None
+        """If not None, this idf shares the uint at io_offset with other small values and occupies the bits starting at this offset"""
+
     def get_loc_expr(self, parent=None) -> Union[LocationExpr, NumberLiteralExpr, BooleanLiteralExpr]:
         if self.arg_type == HybridArgType.TMP_CIRCUIT_VAL and isinstance(self.corresponding_priv_expression.annotated_type.type_name, BooleanLiteralType):
             return BooleanLiteralExpr(self.corresponding_priv_expression.annotated_type.type_name.value)
@@ -667,6 +676,7 @@ class HybridArgumentIdf(Identifier):
     def clone(self) -> HybridArgumentIdf:
         ha = HybridArgumentIdf(self.name, self.t, self.arg_type, self.corresponding_priv_expression)
         ha.serialized_loc = self.serialized_loc
+        ha.io_offset, ha.packed_bit_offset = self.io_offset, self.packed_bit_offset
         return ha
 
     def _set_serialized_loc(self, idf, base, start_offset):
@@ -682,10 +692,14 @@ class HybridArgumentIdf(Identifier):
         src = IdentifierExpr(source_idf).as_type(Array(AnnotatedTypeName.uint_all()))
         if isinstance(self.t, Array):
             return SliceExpr(self.get_loc_expr(), None, 0, self.t.size_in_uints).assign(self.serialized_loc)
-        elif base is not None:
-            return self.get_loc_expr().assign(src.index(base.binop('+', NumberLiteralExpr(start_offset))).explicitly_converted(self.t))
-        else:
-            return self.get_loc_expr().assign(src.index(start_offset).explicitly_converted(self.t))
+
+        val = src.index(start_offset if base is None else base.binop('+', NumberLiteralExpr(start_offset)))
+        if self.packed_bit_offset is not None:
+            # Extract bits of packed value
+            if self.packed_bit_offset > 0:
+                val = val.binop('>>', NumberLiteralExpr(self.packed_bit_offset)).as_type(TypeName.uint_type()).parenthesized()
+            val = val.binop('&', NumberLiteralExpr((1 << self.t.elem_bitwidth) - 1)).as_type(TypeName.uint_type()).parenthesized()
+        return self.get_loc_expr().assign(val.explicitly_converted(self.t))
 
     def serialize(self, target_idf: str, base: Optional[Expression], start_offset: int) -> AssignmentStatement:
         self._set_serialized_loc(target_idf, base, start_offset)
@@ -703,10 +717,14 @@ class HybridArgumentIdf(Identifier):
             else:
                 expr = expr.explicitly_converted(TypeName.uint_type())
 
-            if base is not None:
-                return tgt.clone().index(base.binop('+', NumberLiteralExpr(start_offset))).assign(expr)
-            else:
-                return tgt.clone().index(start_offset).assign(expr)
+            def get_loc():
+                return tgt.clone().index(start_offset if base is None else base.binop('+', NumberLiteralExpr(start_offset)))
+
+            if self.packed_bit_offset:
+                # Add value to the bits of the packed uint which are reserved for this idf
+                expr = expr.parenthesized().binop('<<', NumberLiteralExpr(self.packed_bit_offset)).as_type(TypeName.uint_type())
+                expr = get_loc().binop('|', expr.parenthesized()).as_type(TypeName.uint_type())
+            return get_loc().assign(expr)
 
 
 class EncryptionExpression(ReclassifyExpr):
@@ -62,7 +62,8 @@ class PythonCodeVisitor(CodeVisitor):
         params = self.handle_function_params(ast, ast.parameters)
         body = self.handle_function_body(ast)
         name = self.sanitized(ast.name)
-        return f'def {name}({params}):\n{indent(body)}\n{name}._can_be_external = {ast.can_be_external}'
+        return f'def {name}({params}):\n{indent(body)}\n{name}._can_be_external = {ast.can_be_external}\n' \
+               f'{name}._has_side_effects = {ast.has_side_effects}'
 
     def visitStatementList(self, ast: StatementList):
         b = self.visit_list(ast.statements)
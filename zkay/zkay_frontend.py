@@ -14,17 +14,19 @@ from copy import deepcopy
 from typing import Tuple, List, Type, Dict, Optional, Any, ContextManager
 
 from zkay import my_logging
-from zkay.compiler.privacy import library_contracts
+from zkay.compiler.privacy import library_contracts, stage_cache
 from zkay.compiler.privacy.circuit_generation.backends.jsnark_generator import JsnarkGenerator
+from zkay.compiler.privacy.circuit_generation.circuit_cost import CircuitCost
 from zkay.compiler.privacy.circuit_generation.circuit_generator import CircuitGenerator
 from zkay.compiler.privacy.circuit_generation.circuit_helper import CircuitHelper
+from zkay.compiler.privacy.deployment_artifacts import DeploymentArtifacts
 from zkay.compiler.privacy.manifest import Manifest
 from zkay.compiler.privacy.offchain_compiler import PythonOffchainVisitor
 from zkay.compiler.privacy.proving_scheme.backends.gm17 import ProvingSchemeGm17
 from zkay.compiler.privacy.proving_scheme.backends.groth16 import ProvingSchemeGroth16
 from zkay.compiler.privacy.proving_scheme.proving_scheme import ProvingScheme
 from zkay.compiler.privacy.transformation.zkay_contract_transformer import transform_ast
-from zkay.compiler.solidity.compiler import check_compilation
+from zkay.compiler.solidity.compiler import check_compilation, check_compilations
 from zkay.config import cfg
 from zkay.utils.helpers import read_file, lines_of_code, without_extension
 from zkay.utils.progress_printer import print_step
@@ -95,32 +97,38 @@ def compile_zkay(code: str, output_dir: str, import_keys: bool = False, **kwargs
     elif not import_keys:
         _dump_to_output(code, output_dir, zkay_filename)
 
+    # Stages whose inputs did not change since a previous compilation are loaded from the stage cache
+    cache_key = stage_cache.get_key(code) if stage_cache.is_enabled() else None
+
     # Type checking
-    zkay_ast = get_processed_ast(code)
+    zkay_ast = stage_cache.cached(cache_key, 'processed_ast', lambda: get_processed_ast(code))
 
     # Contract transformation
     with print_step("Transforming zkay -> public contract"):
-        ast, circuits = transform_ast(deepcopy(zkay_ast))
+        ast, circuits = stage_cache.cached(cache_key, 'transformed_ast', lambda: transform_ast(deepcopy(zkay_ast)))
 
     # Dump libraries
     with print_step("Write library contract files"):
         with cfg.library_compilation_environment():
             # Write pki contract
-            _dump_to_output(library_contracts.get_pki_contract(), output_dir, f'{cfg.pki_contract_name}.sol', dryrun_solc=True)
+            _dump_to_output(library_contracts.get_pki_contract(), output_dir, f'{cfg.pki_contract_name}.sol')
 
             # Write library contract
-            _dump_to_output(library_contracts.get_verify_libs_code(), output_dir, ProvingScheme.verify_libs_contract_filename, dryrun_solc=True)
+            _dump_to_output(library_contracts.get_verify_libs_code(), output_dir, ProvingScheme.verify_libs_contract_filename)
+        library_solidity_files = [os.path.join(output_dir, f'{cfg.pki_contract_name}.sol'),
+                                  os.path.join(output_dir, ProvingScheme.verify_libs_contract_filename)]
 
     # Write public contract file
     with print_step('Write public solidity code'):
         output_filename = 'contract.sol'
-        solidity_code_output = _dump_to_output(to_solidity(ast), output_dir, output_filename)
+        solidity_code = stage_cache.cached(cache_key, 'solidity', lambda: to_solidity(ast))
+        solidity_code_output = _dump_to_output(solidity_code, output_dir, output_filename)
 
     # Get all circuit helpers for the transformed contract
     circuits: List[CircuitHelper] = list(circuits.values())
 
     # Generate offchain simulation code (transforms transactions, interface to deploy and access the zkay contract)
-    offchain_simulation_code = PythonOffchainVisitor(circuits).visit(ast)
+    offchain_simulation_code = stage_cache.cached(cache_key, 'offchain', lambda: PythonOffchainVisitor(circuits).visit(ast))
     _dump_to_output(offchain_simulation_code, output_dir, 'contract.py')
 
     # Instantiate proving scheme and circuit generator
@@ -148,14 +156,54 @@ def compile_zkay(code: str, output_dir: str, import_keys: bool = False, **kwargs
     # Generate circuits and corresponding verification contracts
     cg.generate_circuits(import_keys=import_keys)
 
-    # Check that all verification contracts and the main contract compile
-    main_solidity_files = cg.get_verification_contract_filenames() + [os.path.join(output_dir, output_filename)]
-    for f in main_solidity_files:
-        check_compilation(f, show_errors=False)
+    # Record verifier metadata in manifest (allows runtime to obtain verifier names without running the frontend)
+    # Only the verification key is hashed, since prover keys can be very large
+    if not import_keys:
+        manifest.update(Manifest.get_verifier_metadata(output_dir, cg.circuits_to_prove, [cg.get_vk_and_pk_filenames()[0]]))
+        _dump_to_output(json.dumps(manifest), output_dir, 'manifest.json')
+
+    # If the deployment artifacts are up to date, all solidity files are unchanged and known to compile
+    verifier_names = [cc.get_verification_contract_name() for cc in cg.circuits_to_prove]
+    artifacts = DeploymentArtifacts.load(output_dir)
+    if artifacts is None or sorted(artifacts.verifier_names) != sorted(verifier_names):
+        # Check that all library contracts, verification contracts and the main contract compile
+        # (as few solc invocations as possible, libraries are checked separately if they require a different solc version)
+        main_solidity_files = cg.get_verification_contract_filenames() + [os.path.join(output_dir, output_filename)]
+        if cfg.solc_version.lstrip('v') == cfg.library_solc_version.lstrip('v'):
+            check_compilations(library_solidity_files + main_solidity_files, show_errors=False)
+        else:
+            with cfg.library_compilation_environment():
+                check_compilations(library_solidity_files, show_errors=False)
+            check_compilations(main_solidity_files, show_errors=False)
+
+        # Precompile contracts, so that deployment and integrity checks do not need to invoke solc
+        with print_step('Write deployment artifacts'):
+            DeploymentArtifacts.generate(output_dir, verifier_names).save(output_dir)
 
     return cg, solidity_code_output
 
 
+def estimate_circuit_costs(code: str) -> Dict[str, CircuitCost]:
+    """
+    Parse, type-check and transform the given zkay code and statically estimate the cost of all resulting circuits.
+
+    No circuits are generated and no files are written.
+
+    :param code: zkay code to analyze
+    :raise ZkayCompilerError: if type-checking or transformation fails
+    :return: dictionary which maps verification contract names to the estimated cost of the corresponding circuit
+    """
+    cache_key = stage_cache.get_key(code) if stage_cache.is_enabled() else None
+    zkay_ast = stage_cache.cached(cache_key, 'processed_ast', lambda: get_processed_ast(code))
+    with print_step("Transforming zkay -> public contract"):
+        _, circuits = stage_cache.cached(cache_key, 'transformed_ast', lambda: transform_ast(deepcopy(zkay_ast)))
+
+    # The circuit generator optimizes the circuits exactly as during compilation (its output directory is never used)
+    ps = proving_scheme_classes[cfg.proving_scheme]()
+    cg = generator_classes[cfg.snark_backend](list(circuits.values()), ps, os.getcwd())
+    return {circ.get_verification_contract_name(): cost for circ, cost in cg.estimate_circuit_costs().items()}
+
+
 def use_configuration_from_manifest(contract_dir: str) -> Any:
     from zkay.transaction.runtime import Runtime
     manifest = Manifest.load(contract_dir)
@@ -277,8 +325,10 @@ def _collect_package_contents(contract_dir: str, check_all_files: bool) -> List[
     manifest = Manifest.load(contract_dir)
 
     files = ['contract.zkay', 'manifest.json']
-    with open(zkay_filename) as f:
-        verifier_names = get_verification_contract_names(f.read())
+    verifier_names = Manifest.get_verifier_names(contract_dir, manifest)
+    if verifier_names is None:
+        with open(zkay_filename) as f:
+            verifier_names = get_verification_contract_names(f.read())
     with Manifest.with_manifest_config(manifest):
         gen_cls = generator_classes[cfg.snark_backend]
         files += [os.path.join(cfg.get_circuit_output_dir_name(v), k)
@@ -357,8 +407,10 @@ def _dump_to_output(content: str, output_dir: str, filename: str, dryrun_solc=Fa
     """
 
     path = os.path.join(output_dir, filename)
-    with open(path, 'w') as f:
-        f.write(content)
+    # Unchanged files are not rewritten, so that their modification times (which are used by caches) stay the same
+    if not os.path.exists(path) or read_file(path) != content:
+        with open(path, 'w') as f:
+            f.write(content)
     if dryrun_solc:
         check_compilation(path, show_errors=False)
     return content